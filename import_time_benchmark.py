@@ -0,0 +1,103 @@
+'''
+Measures the cold start cost of the first process_3 call, as a Lambda container pays it on its first invocation:
+importing the pipeline, building the Sgcn instance (and its ScienceBase session) and looking up a record's taxonomic
+summary. Each measurement runs in a fresh interpreter. The network calls are stubbed out: the ScienceBase root item is
+served from the in-process item cache and the ITIS and WoRMS searches find nothing, so the time is spent loading and
+running code rather than waiting on remote services. "eager" imports the heavy dependencies up front (as pysgcn did
+before they were loaded lazily); "lazy" leaves them to be loaded when the call first uses them. Also reports which
+heavy modules the lazy first call actually loaded.
+
+Usage: python import_time_benchmark.py [runs]
+'''
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "pysppin", "sciencebasepy", "jsonschema", "pkg_resources"]
+
+SCENARIOS = {
+    "eager": "import {}".format(", ".join(HEAVY_MODULES)),
+    "lazy": "",
+}
+
+# Sgcn.sgcn_root_item, the ScienceBase item Sgcn reads when it is created
+SGCN_ROOT_ITEM = "56d720ece4b015c306f442d5"
+
+RECORD = {
+    "id": "import_time_benchmark",
+    "sppin_key": "Scientific Name:Typhlatya monae",
+    "scientific name": "Typhlatya monae",
+    "common name": "Cave shrimp",
+    "taxonomic category": "Invertebrates/Crustaceans",
+    "state": "Puerto Rico",
+    "year": "2015",
+    "sciencebase_item_id": "import_time_benchmark",
+    "source_file_url": "import_time_benchmark",
+    "source_file_date": "2015-01-01",
+}
+
+FIRST_CALL = '''
+import time
+start = time.perf_counter()
+{imports}
+import sys, types
+from pysgcn import bis_pipeline, sgcn
+
+
+class CacheManager:
+    def __init__(self):
+        self.cache = dict()
+
+    def get_from_cache(self, key):
+        return self.cache.get(key)
+
+    def add_to_cache(self, key, value):
+        self.cache.setdefault(key, value)
+
+
+def not_found(self, sppin_key, **kwargs):
+    return {{"sppin_key": sppin_key, "processing_metadata": {{"status": "failure"}}}}
+
+
+sgcn._sb_item_cache[{root_item!r}] = (time.time(), {{"files": []}})
+# Getting at the search methods loads pysppin, as a real lookup does
+sgcn.pysppin.itis.ItisApi.search = not_found
+sgcn.pysppin.worms.Worms.search = not_found
+
+bis_pipeline.process_3(None, None, lambda record: None, None, {record!r}, CacheManager())
+print(time.perf_counter() - start)
+
+# Lazily imported modules are an instance of a ModuleType subclass until their first attribute access loads them
+print(",".join(m for m in {modules!r} if m in sys.modules and type(sys.modules[m]) is types.ModuleType))
+'''
+
+
+def first_call(imports):
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            FIRST_CALL.format(imports=imports, root_item=SGCN_ROOT_ITEM, record=RECORD, modules=HEAVY_MODULES)
+        ],
+        check=True, capture_output=True, text=True, env={**os.environ, "SGCN_METRICS_SINK": "null"}
+    )
+    seconds, loaded = result.stdout.splitlines()[-2:]
+    return float(seconds), loaded
+
+
+def main(runs=5):
+    medians = dict()
+    loaded = ""
+    for name, imports in SCENARIOS.items():
+        results = [first_call(imports) for i in range(runs)]
+        medians[name] = statistics.median(seconds for seconds, modules in results)
+        print("{:>6}: median {:.3f}s over {} runs".format(name, medians[name], runs))
+        if name == "lazy":
+            loaded = results[-1][1]
+
+    print("saved: {:.3f}s per cold start".format(medians["eager"] - medians["lazy"]))
+    print("heavy modules loaded by the lazy first call: {}".format(loaded or "none"))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -1,7 +1,12 @@
+import functools
 import json
+import os
 from dotenv import load_dotenv, find_dotenv
 from pysgcn import bis_pipeline
-import pysppin
+from pysgcn.cache import get_write_behind_cache
+from pysgcn.local_executor import LocalPipelineExecutor
+from pysgcn.sgcn import get_sgcn
+from pysgcn.metrics import JsonLinesSink, metrics
 import time
 import sys
 
@@ -10,6 +15,15 @@ load_dotenv(find_dotenv())
 ch_ledger = 'ledger'
 cache_root = 'mydatabase'
 
+def final_result_sender(cache_manager):
+    # Final records from stage 3 (and those carried forward by stage 1 for unchanged source files) go to the cache
+    def send_final_result(data):
+        species = data["data"]
+        row_id = data["row_id"]
+        cache_manager.add_to_cache("final_res:{}".format(species["sppin_key"]), species)
+        # cache_manager.add_to_cache(row_id, species)
+    return send_final_result
+
 def lambda_handler_4(event, context):
     message_in = json.loads(event["body"])
     run_id = message_in["run_id"]
@@ -38,11 +52,7 @@ def lambda_handler_3(event, context):
         }
         lambda_handler_4({"body": json.dumps(json_doc)}, {})
 
-    def send_final_result(data):
-        species = data["data"]
-        row_id = data["row_id"]
-        cache_manager.add_to_cache("final_res:{}".format(species["sppin_key"]), species)
-        # cache_manager.add_to_cache(row_id, species)
+    send_final_result = final_result_sender(cache_manager)
 
     bis_pipeline.process_3(download_uri, ch_ledger, send_final_result, send_to_stage, message_in["payload"], cache_manager)
 
@@ -66,14 +76,14 @@ def lambda_handler_2(event, context):
 
     start_time = time.time()
     num_species = bis_pipeline.process_2(download_uri, ch_ledger, send_final_result, send_to_stage, message_in["payload"], cache_manager)
-    elapsed_time = "{:.2f}".format(time.time() - start_time)
-    print('Species count: {} ({} seconds)'.format(num_species, elapsed_time))
+    metrics.event("species_count", species=num_species, seconds=round(time.time() - start_time, 2))
 
 def lambda_handler(event, context):
     run_id = event["run_id"]
     sb_item_id = event["sb_item_id"]
     download_uri = event["download_uri"]
     cache_manager = CacheManager(download_uri)
+    send_final_result = final_result_sender(cache_manager)
 
     def send_to_stage(data, stage):
         json_doc = {
@@ -84,29 +94,105 @@ def lambda_handler(event, context):
         }
         lambda_handler_2({"body": json.dumps(json_doc)}, {})
 
-    send_final_result = None
-
     num_process_files = bis_pipeline.process_1(download_uri, ch_ledger, send_final_result, send_to_stage, sb_item_id, cache_manager)
+    cache_manager.flush()
+    metrics.emit_totals(run_id=run_id)
+
+def lambda_handler_parallel(event, context):
+    # Local only: collect every processable item from stage 1 and extract the source files in parallel worker
+    # processes before handing records on to stage 3
+    run_id = event["run_id"]
+    sb_item_id = event["sb_item_id"]
+    download_uri = event["download_uri"]
+    cache_manager = CacheManager(download_uri)
+    send_final_result = final_result_sender(cache_manager)
+
+    items = list()
+
+    def collect_item(data, stage):
+        items.append(data)
+
+    def send_to_stage(data, stage):
+        json_doc = {
+            'run_id': run_id,
+            'sb_item_id': sb_item_id,
+            'download_uri': download_uri,
+            'payload': data
+        }
+        lambda_handler_3({"body": json.dumps(json_doc)}, {})
+
+    bis_pipeline.process_1(download_uri, ch_ledger, send_final_result, collect_item, sb_item_id, cache_manager)
+
+    start_time = time.time()
+    max_workers = int(os.getenv("SGCN_EXTRACT_WORKERS")) if os.getenv("SGCN_EXTRACT_WORKERS") else None
+    num_species = bis_pipeline.process_2_batch(download_uri, ch_ledger, send_final_result, send_to_stage, items, cache_manager, max_workers)
+    metrics.event("species_count", species=num_species, seconds=round(time.time() - start_time, 2))
+    cache_manager.flush()
+    metrics.emit_totals(run_id=run_id)
+
+def lambda_handler_executor(event, context):
+    # Local only: runs stages 2-4 as thread pools connected by bounded queues instead of chaining the handlers.
+    # SGCN_STAGE2_WORKERS, SGCN_STAGE3_WORKERS and SGCN_STAGE4_WORKERS set the threads per stage and
+    # SGCN_STAGE_QUEUE_SIZE the number of messages that can wait for a stage before senders block.
+    # Set SGCN_STAGE2_PROCESSES to read and harmonize the stage 2 source files in that many worker processes.
+    download_uri = event["download_uri"]
+    cache_manager = CacheManager(download_uri)
+
+    prepare = None
+    if os.getenv("SGCN_STAGE2_PROCESSES"):
+        sgcn = get_sgcn(operation_mode='pipeline', cache_root=download_uri, cache_manager=cache_manager)
+        metadata_index = sgcn.build_metadata_index(sgcn.cache_sgcn_metadata(return_data=True))
+        prepare = {2: functools.partial(bis_pipeline.prepare_2, sgcn, metadata_index)}
+
+    executor = LocalPipelineExecutor(
+        stages={
+            1: bis_pipeline.process_1,
+            2: bis_pipeline.process_2,
+            3: bis_pipeline.process_3,
+            4: bis_pipeline.process_4,
+        },
+        path=download_uri,
+        ch_ledger=ch_ledger,
+        cache_manager=cache_manager,
+        send_final_result=final_result_sender(cache_manager),
+        workers={
+            2: int(os.getenv("SGCN_STAGE2_WORKERS", 2)),
+            3: int(os.getenv("SGCN_STAGE3_WORKERS", 16)),
+            4: int(os.getenv("SGCN_STAGE4_WORKERS", 4)),
+        },
+        queue_size=int(os.getenv("SGCN_STAGE_QUEUE_SIZE", 1000)),
+        prepare=prepare,
+        processes=int(os.getenv("SGCN_STAGE2_PROCESSES")) if prepare else None
+    )
+
+    start_time = time.time()
+    run_metrics = executor.run(event["sb_item_id"])
+    metrics.event(
+        "species_count", species=run_metrics.get("stage_2.records_sent", 0), seconds=round(time.time() - start_time, 2)
+    )
+    cache_manager.flush()
+    metrics.emit_totals(run_id=event["run_id"])
 
 class CacheManager:
     def __init__(self, cache_root):
         self.cache_folder = "sppin"
         self.cache_path = f"{cache_root}/{self.cache_folder}"
-        self.sql_cache = pysppin.utils.Sql(cache_location=self.cache_path)
         self.table_name = 'cache'
-    
+        os.makedirs(self.cache_path, exist_ok=True)
+        # Every CacheManager for the same cache_root shares one connection and write-behind buffer
+        self.sql_cache = get_write_behind_cache(f"{self.cache_path}/cache.db", self.table_name)
+        # Carry over the cache kept in sppin.db before cache.db (taxonomic lookups and final_res: records); this only
+        # copies anything the first time
+        self.sql_cache.import_table(f"{self.cache_path}/sppin.db", self.table_name)
+
     def get_from_cache(self, key):
-        res = self.sql_cache.get_select_records(self.cache_folder, self.table_name, 'key = ?', key)
-        return res[0]["value"] if res else None
+        return self.sql_cache.get_from_cache(key)
 
     def add_to_cache(self, key, value):
+        return self.sql_cache.add_to_cache(key, value)
 
-        res = self.get_from_cache(key)
-        if res:
-            return res;
-
-        data = {"key": key, "value": value}
-        return self.sql_cache.insert_record(self.cache_folder, self.table_name, data)
+    def flush(self):
+        return self.sql_cache.flush()
 
 class Logger(object):
     def __init__(self):
@@ -123,13 +209,28 @@ class Logger(object):
         #you might want to specify some extra behavior here.
         pass
 
-sys.stdout = Logger()
-lambda_handler({
-    "run_id": "705da83c-de64-11ea-a3a1-023f40fa784e",
-    # This item_id gives all 112 state/year combos to process
-    "sb_item_id": "56d720ece4b015c306f442d5",
-
-    # This item_id is our test location that gives just a few state/year combos
-    #"sb_item_id": "5ef51d8082ced62aaae69f05",  OBSOLETE, Don't use.
-    "download_uri": cache_root
-}, {})
\ No newline at end of file
+if __name__ == "__main__":
+    sys.stdout = Logger()
+    # Metric events go to a file next to the cache rather than into the console output, unless SGCN_METRICS_SINK is set
+    if not os.getenv("SGCN_METRICS_SINK"):
+        os.makedirs(cache_root, exist_ok=True)
+        metrics.set_sink(JsonLinesSink(path=os.path.join(cache_root, "metrics.jsonl")))
+
+    event = {
+        "run_id": "705da83c-de64-11ea-a3a1-023f40fa784e",
+        # This item_id gives all 112 state/year combos to process
+        "sb_item_id": "56d720ece4b015c306f442d5",
+
+        # This item_id is our test location that gives just a few state/year combos
+        #"sb_item_id": "5ef51d8082ced62aaae69f05",  OBSOLETE, Don't use.
+        "download_uri": cache_root
+    }
+
+    # Set SGCN_PARALLEL_EXTRACT to extract all state/year source files in parallel worker processes
+    # Set SGCN_LOCAL_EXECUTOR to run the stages concurrently with per-stage worker pools
+    if os.getenv("SGCN_LOCAL_EXECUTOR"):
+        lambda_handler_executor(event, {})
+    elif os.getenv("SGCN_PARALLEL_EXTRACT"):
+        lambda_handler_parallel(event, {})
+    else:
+        lambda_handler(event, {})
@@ -1,14 +1,19 @@
 # pysgcn package
 
-import pkg_resources
-
 from . import sgcn
 
-__version__ = pkg_resources.require("pysgcn")[0].version
+
+def __getattr__(name):
+    # pkg_resources is slow to import, so the version is only looked up when asked for
+    if name == "__version__":
+        import pkg_resources
+        return pkg_resources.require("pysgcn")[0].version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_package_metadata():
+    import pkg_resources
+
     d = pkg_resources.get_distribution('pysgcn')
     for i in d._get_metadata(d.PKG_INFO):
         print(i)
-
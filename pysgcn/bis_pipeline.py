@@ -1,13 +1,17 @@
 import json
-import hashlib
+import os
 from . import sgcn as pysgcn
-import pysppin
 from pysgcn import validate_sgcn_input
+from pysgcn.dedup import Deduplicator
+from pysgcn.hashing import record_id, record_ids
+from pysgcn.lookup import LookupPlanner
+from pysgcn.metrics import metrics
 
 json_schema = None
 
 # This architecture and process is based on the pipeline documentation here: https://code.chs.usgs.gov/fort/bcb/pipeline/docs
 
+@metrics.timed("stage_1.seconds")
 def process_1(
     path,
     ch_ledger,
@@ -16,10 +20,18 @@ def process_1(
     previous_stage_result,
     cache_manager,
 ):
-    sgcn = pysgcn.Sgcn(operation_mode='pipeline', cache_manager=cache_manager)
+    sgcn = pysgcn.get_sgcn(operation_mode='pipeline', cache_root=path, cache_manager=cache_manager)
 
     # Stage 1 Get Processable SGCN Items
-    process_items = sgcn.get_processable_items()
+    # Every item is checked against the processing ledger: files whose source_file_date hasn't changed since they were
+    # processed with the current metadata have their previous final records carried forward; new or changed files go
+    # on to stage 2.
+    source_items = sgcn.get_sgcn_source_items()
+    sgcn_meta = sgcn.cache_sgcn_metadata(return_data=True)
+    ledger = sgcn.get_ledger(
+        sgcn.build_metadata_index(sgcn_meta).version,
+        sgcn.taxogroupings_version(sgcn.taxonomic_group_classes(sgcn_meta))
+    )
 
     test_data = list()
     # This is to allow the test data set to be reduced to targeted State/year
@@ -27,8 +39,11 @@ def process_1(
     # to work properly due to python's interpretation of a list...
     #test_data = (("placeholder", "1000"), ("Puerto Rico", "2015"), ("xNorth Dakota", "2015"), ("xOhio", "2015"), ("xOklahoma", "2015"), ("xOregon", "2015"))
 
-    for item in process_items:
+    for item in source_items:
         if not test_data or in_test_data(item, test_data):
+            if send_final_result is not None and carry_forward(sgcn, ledger, item, send_final_result):
+                continue
+            metrics.incr("stage_1.files_to_process")
             send_to_stage(item, 2)
 
     if not test_data:
@@ -38,9 +53,31 @@ def process_1(
         data['totals'] = rawdata['totals']
         data['states'] = rawdata['states']
 
-        print('Adding validation results for: {} : {}'.format(pipeline_id, json.dumps(data)))
+        metrics.event("stage_1.validation_results", pipeline_id=pipeline_id, **data)
         cache_manager.add_to_cache(pipeline_id, json.dumps(data))
 
+def carry_forward(sgcn, ledger, item, send_final_result):
+    '''
+    Re-sends the final records from a previous run for an item whose source file is unchanged.
+
+    :return: True if the item's records were carried forward; False if the item needs to be processed
+    '''
+    entry = sgcn.check_source_url(item["source_file_url"], item["source_file_date"], ledger)
+    if entry is None:
+        return False
+
+    records = ledger.previous_records(entry)
+    if records is None:
+        return False
+
+    for sgcn_record in records:
+        send_final_result(sgcn_record)
+
+    metrics.incr("stage_1.files_carried_forward")
+    metrics.incr("stage_1.records_carried_forward", len(records))
+
+    return True
+
 def in_test_data(item, test_data):
     state = item['state']
     year = item['year']
@@ -49,6 +86,7 @@ def in_test_data(item, test_data):
             return True
     return False
 
+@metrics.timed("stage_2.seconds")
 def process_2(
     path,
     ch_ledger,
@@ -57,26 +95,140 @@ def process_2(
     previous_stage_result,
     cache_manager,
 ):
-    sgcn = pysgcn.Sgcn(operation_mode='pipeline', cache_manager=cache_manager)
+    sgcn = pysgcn.get_sgcn(operation_mode='pipeline', cache_root=path, cache_manager=cache_manager)
 
-    record_count = 0
     # Stage 2 Cache Metadata and Document Schemas
     sgcn_meta = sgcn.cache_sgcn_metadata(return_data=True)
+    metadata_index = sgcn.build_metadata_index(sgcn_meta)
 
     # BCB-1556
-    class_list = list()
-    for mapping in sgcn_meta["Taxonomic Group Mappings"]:
-        if mapping['rank'].lower() == "class":
-            taxodata = {'taxoname' : mapping['name'], 'taxogroup' : mapping['sgcntaxonomicgroup']}
-            class_list.append(taxodata)
+    taxogroupings_version = sgcn.publish_taxogroupings(sgcn.taxonomic_group_classes(sgcn_meta))
+
+    # Stage 3 Extract Source Data
+    # The source file is read and sent on a chunk at a time so only one chunk of records is in memory; duplicates
+    # are tracked across the whole file
+    dedup = new_deduplicator()
+    record_ids_sent = list()
+    processing_metadata = dict()
+    record_count = 0
+    source_chunks = sgcn.iter_source_chunks(
+        previous_stage_result, metadata_index, processing_metadata=processing_metadata
+    )
+    for df_chunk in source_chunks:
+        record_count += send_source_records(
+            sgcn, df_chunk, taxogroupings_version, send_to_stage, record_ids_sent, dedup
+        )
+
+    # processing_metadata holds the encoding the file was read with (nothing when read from the columnar cache)
+    sgcn.get_ledger(metadata_index.version, taxogroupings_version).record_entry(
+        previous_stage_result, record_ids_sent, **processing_metadata
+    )
+
+    metrics.incr("stage_2.files_processed")
+    metrics.event(
+        "stage_2.file",
+        state=previous_stage_result["state"],
+        year=previous_stage_result["year"],
+        records_sent=record_count,
+        **processing_metadata
+    )
 
-    # species extracted from the source file to process
-    species = []
+    # return the number of species for this process file
+    return record_count
 
-    print("processing {} {}".format(previous_stage_result["state"], previous_stage_result["year"]))
+def prepare_2(sgcn, metadata_index, previous_stage_result):
+    '''
+    Reads and harmonizes a stage 2 source file into the columnar cache. The local executor runs this in a worker
+    process ahead of process_2, so the CPU bound part of stage 2 isn't held to one core by the GIL; process_2 then
+    reads the harmonized data from the cache. Nothing is done for the csv extraction engine, which doesn't use the
+    cache.
+    '''
+    if pysgcn.EXTRACT_ENGINE != "csv":
+        sgcn.fill_columnar_cache(previous_stage_result, metadata_index)
 
-    # Stage 3 Extract Source Data
-    res = sgcn.process_sgcn_source_item(previous_stage_result, metadata_cache=sgcn_meta)
+    return previous_stage_result
+
+@metrics.timed("stage_2_batch.seconds")
+def process_2_batch(
+    path,
+    ch_ledger,
+    send_final_result,
+    send_to_stage,
+    previous_stage_result,
+    cache_manager,
+    max_workers=None,
+    plan_lookups=True,
+):
+    '''
+    Runs stage 2 for a list of processable items at once, extracting the source files in parallel worker processes
+    and then sending their records on in the order of the items. A file that fails to process is reported and
+    skipped without affecting the others. With plan_lookups, the taxonomic summary for each distinct sppin_key in
+    the run is looked up once up front and shared by every record with that key.
+    '''
+    sgcn = pysgcn.get_sgcn(operation_mode='pipeline', cache_root=path, cache_manager=cache_manager)
+
+    sgcn_meta = sgcn.cache_sgcn_metadata(return_data=True)
+    metadata_index = sgcn.build_metadata_index(sgcn_meta)
+
+    # BCB-1556
+    taxogroupings_version = sgcn.publish_taxogroupings(sgcn.taxonomic_group_classes(sgcn_meta))
+
+    extracted = list()
+    for item, df_src, error in sgcn.extract_source_items(previous_stage_result, metadata_index, max_workers):
+        if error is not None:
+            metrics.incr("stage_2.file_errors")
+            metrics.event("stage_2.file_error", state=item["state"], year=item["year"], error=error)
+            continue
+        extracted.append((item, df_src))
+
+    # Resolve each distinct sppin_key across the whole run once, before any records reach stage 3. The plan is
+    # attached to the shared Sgcn instance so process_3 (running in this process) fans the results out.
+    planner = None
+    if plan_lookups:
+        planner = LookupPlanner(sgcn)
+        for item, df_src in extracted:
+            planner.add_dataframe(df_src)
+        planner.resolve()
+        metrics.incr("stage_2.planned_records", planner.record_count)
+        metrics.incr("stage_2.planned_sppin_keys", len(planner.messages))
+        sgcn.taxa_summary_plan = planner
+
+    ledger = sgcn.get_ledger(metadata_index.version, taxogroupings_version)
+    record_count = 0
+    try:
+        for item, df_src in extracted:
+            record_ids_sent = list()
+            file_record_count = send_source_records(sgcn, df_src, taxogroupings_version, send_to_stage, record_ids_sent)
+            ledger.record_entry(item, record_ids_sent)
+            record_count += file_record_count
+
+            metrics.incr("stage_2.files_processed")
+            metrics.event("stage_2.file", state=item["state"], year=item["year"], records_sent=file_record_count)
+    finally:
+        if planner is not None:
+            sgcn.taxa_summary_plan = None
+
+    return record_count
+
+def new_deduplicator():
+    # hashes of the species extracted from the source file, used to drop duplicates. Set SGCN_DEDUP_BLOOM_CAPACITY
+    # to switch to a fixed size Bloom filter when memory matters more than exactness.
+    return Deduplicator(bloom_capacity=os.getenv("SGCN_DEDUP_BLOOM_CAPACITY"))
+
+def send_source_records(sgcn, df_src, taxogroupings_version, send_to_stage, record_ids_sent=None, dedup=None):
+    # dedup is passed in when a file is sent in several chunks
+    if dedup is None:
+        dedup = new_deduplicator()
+    record_count = 0
+
+    # create a hash of each species record so we don't add duplicates from the same file. Chunks from the csv
+    # extraction engine are already lists of records.
+    if isinstance(df_src, list):
+        res = df_src
+        ids = [record_id(record) for record in res]
+    else:
+        ids = record_ids(df_src)
+        res = df_src.to_dict("records")
 
     # Test species set that tests ITIS and WoRMS searches without having to run entire
     # data set even on the pared down TEST data site we use.
@@ -84,37 +236,44 @@ def process_2(
     testSpecies = None
     #testSpecies = ["Typhlatya monae", "Megaptera novaeangliae", "Orbicella annularis", "Plectomerus sloatianus"]
 
+    metrics.incr("stage_2.records_in", len(res))
+
     # Stage 4 Process Source Data
-    for spec in res:
+    # validate data against the json schema
+    valid_mask = sgcn.validate_many(res)
+
+    for spec, valid, hsh in zip(res, valid_mask, ids):
         if testSpecies is not None and spec['scientific name'] not in testSpecies:
             continue
 
         #if spec['scientific name'] != "Typhlatya monae" and spec['scientific name'] != "Megaptera novaeangliae" and spec['scientific name'] != "Orbicella annularis" and spec['scientific name'] != "Plectomerus sloatianus":
         #    continue
         try:
-            # validate data against the json schema
-            valid = sgcn.validate_data(spec)
-            # create a hash of the species record so we don't add duplicates from the same file
-            hsh = hashlib.sha1(repr(json.dumps(spec, sort_keys=True)).encode('utf-8')).hexdigest()
             # make sure we don't add duplicates by comparing hashs
-            if valid and hsh not in map(lambda species_tup: species_tup[0], species):
-                species.append((hsh, spec))
+            if not valid:
+                metrics.incr("stage_2.invalid_records")
+                metrics.event("stage_2.invalid_record", scientific_name=spec["scientific name"])
+            elif not dedup.add(hsh):
+                metrics.incr("stage_2.duplicate_records")
+            else:
                 # use the hash as an id for the rest of the processing
                 species_result = {"id": hsh, **spec}
-                # BCB-1556
-                species_result["taxogroupings"] = class_list
+                # BCB-1556 - stage 3 looks the published mappings up by version
+                species_result["taxogroupings_version"] = taxogroupings_version
                 # send onto the next stage
                 send_to_stage(species_result, 3)
                 record_count += 1
-            else:
-                print('Invalid or Duplicate species found: ', spec["scientific name"])
+                if record_ids_sent is not None:
+                    record_ids_sent.append(hsh)
         except Exception as e:
-            print('Error (process_1): Species: "{}"'.format(spec["scientific name"]))
-            print("Error (process_1): ", e)
+            metrics.incr("stage_2.record_errors")
+            metrics.event("stage_2.record_error", scientific_name=spec["scientific name"], error=str(e))
+
+    metrics.incr("stage_2.records_sent", record_count)
 
-    # return the number of species for this process file
     return record_count
 
+@metrics.timed("stage_3.seconds")
 def process_3(
     path,
     ch_ledger,
@@ -123,15 +282,10 @@ def process_3(
     previous_stage_result,
     cache_manager,
 ):
-    sgcn = pysgcn.Sgcn(operation_mode='pipeline', cache_manager=cache_manager)
+    sgcn = pysgcn.get_sgcn(operation_mode='pipeline', cache_root=path, cache_manager=cache_manager)
 
     # Stage 5 ITIS, WoRMS
     taxa_summary_msg, name_queue = sgcn.gather_taxa_summary(previous_stage_result)
-    if taxa_summary_msg and 'commonname' in taxa_summary_msg.keys(): 
-        common_name = taxa_summary_msg['commonname']
-    else:
-        common_name = previous_stage_result['common name']
-    print('--- species {} ({})  '.format(previous_stage_result["scientific name"],common_name), end='')
 
     # BCB-1556
     class_name = "none"
@@ -139,7 +293,10 @@ def process_3(
         if "class_name" in taxa_summary_msg.keys():
             class_name = taxa_summary_msg['class_name']
 
-    taxo_group = next((tg["taxogroup"] for tg in previous_stage_result["taxogroupings"] if tg["taxoname"] == class_name), None)
+    # Messages queued before the mappings were published carry the mapping list itself
+    taxogroupings_version = previous_stage_result.pop("taxogroupings_version", None)
+    taxogroupings = sgcn.get_taxogroupings(taxogroupings_version, previous_stage_result.get("taxogroupings"))
+    taxo_group = taxogroupings.get(class_name)
 
     # Erase all the taxogroupings data so it doesn't go into the DB
     previous_stage_result["taxogroupings"] = None
@@ -153,7 +310,6 @@ def process_3(
         if taxo_group:
             sgcn_record["data"]["taxonomic category"] = taxo_group
 
-    print('     class({})  taxogroup({})  sgcnTaxoGroup({})'.format(class_name, taxo_group, sgcn_record["data"]["taxonomic category"]))
 
     sgcn_record['data']['nationallist'] = False
     if "taxonomic_authority_url" in sgcn_record['data'].keys():
@@ -164,7 +320,15 @@ def process_3(
         if sgcn_record["data"]["historic_list"] == True:
             sgcn_record['data']['nationallist'] = True
 
+    metrics.incr("stage_3.records")
+    metrics.incr("stage_3.taxa_summaries_found" if taxa_summary_msg else "stage_3.taxa_summaries_missing")
+    if sgcn_record['data']['nationallist']:
+        metrics.incr("stage_3.national_list_records")
+    metrics.incr(f"stage_3.taxonomic_categories.{sgcn_record['data']['taxonomic category']}")
+
     validateSGCNRecord(sgcn_record)
+    # keep the final record so later runs can carry it forward while the source file is unchanged
+    sgcn.get_ledger(taxogroupings_version=taxogroupings_version).store_record(sgcn_record)
     # send the final result to the database
     send_final_result(sgcn_record)
 
@@ -201,15 +365,17 @@ def validateSGCNRecord(record):
     check(data, keys, "nationallist", badFields)
 
     if badFields:
-        print('    Warning: SGCN Record: {}'.format(data['id']))
-        print('       missing fields: {}'.format(badFields))
+        metrics.incr("stage_3.records_missing_fields")
+        for name in badFields:
+            metrics.incr(f"stage_3.missing_fields.{name}")
     if data["nationallist"] == False:
-        print('    Warning: SGCN Record: {} NOT on NationalList'.format(data['id']))
+        metrics.incr("stage_3.records_not_on_national_list")
 
 def check(data, keys, name, badFields):
     if name not in keys or data[name] == "":
         badFields.append(name)
 
+@metrics.timed("stage_4.seconds")
 def process_4(
     path,
     ch_ledger,
@@ -218,6 +384,6 @@ def process_4(
     previous_stage_result,
     cache_manager,
 ):
-    sgcn = pysgcn.Sgcn(operation_mode='pipeline', cache_manager=cache_manager)
+    sgcn = pysgcn.get_sgcn(operation_mode='pipeline', cache_root=path, cache_manager=cache_manager)
     # ECOS TESS, IUCN, NatureServe, GBIF
     sgcn.gather_additional_cache_resources(previous_stage_result["name_queue"], previous_stage_result["sppin_source"])
@@ -0,0 +1,251 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class WriteBehindCache:
+    '''
+    Key/value cache in a SQLite file (WAL mode) with write-behind puts. add_to_cache buffers records in memory and
+    they are written in batched executemany transactions once flush_size records are pending (or on flush/close), using
+    INSERT ... ON CONFLICT DO NOTHING against the key primary key so the first value stored for a key is kept. Reads
+    see buffered records before they reach the database. Records are buffered as JSON text, so a caller that changes
+    a value it put or got doesn't change what is stored.
+    '''
+    def __init__(self, db_path, table_name="cache", flush_size=500):
+        self.db_path = db_path
+        self.table_name = table_name
+        self.flush_size = flush_size
+
+        self._pending = dict()
+        self._lock = threading.RLock()
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table_name} (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_imports (source TEXT PRIMARY KEY, records INTEGER, imported TEXT)"
+        )
+        self.connection.commit()
+
+    def get_from_cache(self, key):
+        with self._lock:
+            value = self._pending.get(key)
+            if value is None:
+                row = self.connection.execute(
+                    f"SELECT value FROM {self.table_name} WHERE key = ?", (key,)
+                ).fetchone()
+                value = row[0] if row else None
+
+        return json.loads(value) if value is not None else None
+
+    def add_to_cache(self, key, value):
+        value = json.dumps(value)
+        with self._lock:
+            self._pending.setdefault(key, value)
+            if len(self._pending) >= self.flush_size:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+
+            records = list(self._pending.items())
+            with self.connection:
+                self.connection.executemany(
+                    f"INSERT INTO {self.table_name} (key, value) VALUES (?, ?) ON CONFLICT(key) DO NOTHING",
+                    records
+                )
+            self._pending.clear()
+
+            return len(records)
+
+    def import_table(self, db_path, table_name="cache"):
+        '''
+        Copies the key/value rows of a cache table in another SQLite file into this cache, keeping any value already
+        stored here for a key. This carries over the cache the local CacheManager kept through the pysppin Sql helper
+        (the cache table of <cache_root>/sppin/sppin.db). Each table is only imported once; imports are recorded in
+        the cache_imports table.
+
+        :param db_path: Path to the SQLite file to import from
+        :param table_name: Table with key and value columns
+        :return: Number of rows copied
+        '''
+        if not os.path.isfile(db_path):
+            return 0
+
+        source = f"{os.path.abspath(db_path)}|{table_name}"
+
+        with self._lock:
+            if self.connection.execute("SELECT 1 FROM cache_imports WHERE source = ?", (source,)).fetchone():
+                return 0
+
+            records = list()
+            legacy = sqlite3.connect(db_path)
+            try:
+                exists = legacy.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+                ).fetchone()
+                if exists:
+                    records = [
+                        (key, _json_text(value))
+                        for key, value in legacy.execute(f'SELECT key, value FROM "{table_name}"')
+                        if key is not None
+                    ]
+            finally:
+                legacy.close()
+
+            self.flush()
+            with self.connection:
+                cursor = self.connection.executemany(
+                    f"INSERT INTO {self.table_name} (key, value) VALUES (?, ?) ON CONFLICT(key) DO NOTHING",
+                    records
+                )
+                self.connection.execute(
+                    "INSERT INTO cache_imports (source, records, imported) VALUES (?, ?, datetime('now'))",
+                    (source, len(records))
+                )
+
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.connection.close()
+
+
+def _json_text(value):
+    # The pysppin Sql helper stored dictionaries and lists as JSON text; anything else is stored as a JSON value
+    if isinstance(value, str):
+        try:
+            json.loads(value)
+            return value
+        except ValueError:
+            pass
+    return json.dumps(value)
+
+
+class LRUCache:
+    '''
+    Bounded in-memory LRU cache used as a first tier in front of a persistent cache. Entries are evicted least recently
+    used first once max_entries or max_bytes (estimated from the JSON size of each value) is exceeded. Failed lookups
+    can be stored as negative entries that expire after negative_ttl seconds so they are not retried for every record.
+    Hit, miss, negative hit and eviction counts are kept for reporting.
+    '''
+    MISSING = object()
+
+    def __init__(self, max_entries=20000, max_bytes=64 * 1024 * 1024, negative_ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+
+    def get(self, key):
+        '''
+        :param key: Cache key
+        :return: Cached value, or LRUCache.MISSING if the key is not cached (or its negative entry has expired)
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.time():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return self.MISSING
+
+            self._entries.move_to_end(key)
+            if entry[1] is not None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+
+            return entry[0]
+
+    def put(self, key, value, negative=False, ttl=None):
+        '''
+        :param key: Cache key
+        :param value: Value to cache
+        :param negative: Store as a negative (failed lookup) entry that expires after negative_ttl seconds
+        :param ttl: Seconds a negative entry is kept for instead of negative_ttl
+        '''
+        size = len(json.dumps(value, default=str))
+        expires = time.time() + (self.negative_ttl if ttl is None else ttl) if negative else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, expires, size)
+            self._bytes += size
+
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "evictions": self.evictions
+            }
+
+
+_caches = dict()
+_caches_lock = threading.Lock()
+
+
+def get_write_behind_cache(db_path, table_name="cache", flush_size=500):
+    '''
+    Returns the process-wide WriteBehindCache for a database file so every handler shares one connection and write
+    buffer. Buffers are flushed when the process exits.
+
+    :param db_path: Path to the SQLite file
+    :param table_name: Cache table name
+    :param flush_size: Number of buffered records that triggers a flush
+    :return: WriteBehindCache
+    '''
+    db_path = os.path.abspath(db_path)
+
+    with _caches_lock:
+        if (db_path, table_name) not in _caches:
+            _caches[(db_path, table_name)] = WriteBehindCache(db_path, table_name, flush_size)
+        return _caches[(db_path, table_name)]
+
+
+@atexit.register
+def _flush_caches():
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.flush()
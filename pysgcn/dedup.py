@@ -0,0 +1,56 @@
+import math
+
+
+class BloomFilter:
+    '''
+    Fixed size Bloom filter over hex digest strings. Memory stays constant regardless of how many records are added,
+    at the cost of a small false positive rate (a unique record reported as already seen).
+    '''
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, hsh):
+        # Double hashing from two halves of the digest, which is already uniformly distributed
+        h1 = int(hsh[:16], 16)
+        h2 = int(hsh[16:32], 16) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, hsh):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(hsh))
+
+    def add(self, hsh):
+        for p in self._positions(hsh):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+
+class Deduplicator:
+    '''
+    Streaming duplicate detection over record hashes. Uses a hash set by default, or a bounded BloomFilter when
+    bloom_capacity is supplied and memory matters more than exactness.
+    '''
+    def __init__(self, bloom_capacity=None, error_rate=0.001):
+        if bloom_capacity:
+            self.seen = BloomFilter(int(bloom_capacity), error_rate)
+        else:
+            self.seen = set()
+        self.unique = 0
+        self.duplicates = 0
+
+    def add(self, hsh):
+        '''
+        Registers a record hash.
+
+        :param hsh: Record id from pysgcn.hashing
+        :return: True if the hash has not been seen before, False if it is a duplicate
+        '''
+        if hsh in self.seen:
+            self.duplicates += 1
+            return False
+
+        self.seen.add(hsh)
+        self.unique += 1
+        return True
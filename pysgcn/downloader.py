@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pysgcn.metrics import metrics
+
+
+class Downloader:
+    '''
+    Shared HTTP client for ScienceBase file downloads. All requests go through one requests.Session connection pool,
+    concurrent requests to the same host are capped by per_host_limit, and failed requests are retried with
+    exponential backoff.
+    '''
+    def __init__(self, max_workers=8, per_host_limit=4, retries=5, chunk_size=1024 * 64):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_semaphores = dict()
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+
+    def _with_retries(self, url, request):
+        '''
+        Runs request() with retries and exponential backoff. Each attempt holds the host's semaphore for as long as
+        request() runs; the backoff between attempts does not.
+
+        :param url: URL being fetched (for the host limit and error messages)
+        :param request: Function making one attempt, raising on failure
+        :return: Result of request()
+        '''
+        exception = None
+        start_time = time.time()
+        for this_try in range(1, self.retries):
+            backoff = math.pow(2, this_try-1)
+            try:
+                metrics.incr("remote.download.calls")
+                with self._host_semaphore(url), metrics.timer("remote.download.seconds"):
+                    return request()
+            except Exception as e:
+                metrics.incr("remote.download.retries")
+                metrics.event(
+                    "remote.download.retry", url=url, retries_left=self.retries - this_try, backoff=backoff, error=str(e)
+                )
+                time.sleep(backoff)
+                exception = e
+        elapsed_time = "{:.2f}".format(time.time() - start_time)
+        raise Exception("({} seconds) error trying to fetch : {} : {}".format(elapsed_time, url, exception))
+
+    def _send(self, url, stream=False, headers=None):
+        response = self.session.get(url, stream=stream, headers=headers)
+        if response.status_code not in (200, 304):
+            reason = "code ({}) {}".format(response.status_code, response.reason)
+            response.close()
+            raise Exception(reason)
+        return response
+
+    def get(self, url, stream=False, headers=None):
+        '''
+        GET a URL with retries. A 304 response is returned as-is so conditional requests can be handled by the caller.
+        With stream, the body is read after the host's concurrency slot has been given back; download() holds the
+        slot for the whole transfer.
+
+        :param url: URL to fetch
+        :param stream: Passed through to requests so large bodies can be read in chunks
+        :param headers: Optional request headers
+        :return: requests.Response
+        '''
+        return self._with_retries(url, lambda: self._send(url, stream=stream, headers=headers))
+
+    def _transfer(self, url, file_path, temp_path, headers):
+        # One download attempt: the request and the body, so the whole transfer counts against the host limit
+        response = self._send(url, stream=True, headers=headers)
+        try:
+            if response.status_code == 304:
+                return "in_cache", response.headers.get("ETag")
+
+            with open(temp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+            os.replace(temp_path, file_path)
+
+            return "written", response.headers.get("ETag")
+        finally:
+            response.close()
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+    def download(self, url, file_path, source_file_date=None):
+        '''
+        Downloads a file to a local path unless the cached copy is current. A sidecar file (file_path.meta.json)
+        records the ScienceBase upload date and ETag of the cached copy; a matching upload date skips the request and
+        a stored ETag turns the request into a conditional GET. The body is streamed to a temporary file and renamed
+        into place so readers never see a partial file. The host's concurrency slot is held until the body has been
+        written, and a transfer that fails part way is retried.
+
+        :param url: File URL
+        :param file_path: Local destination path
+        :param source_file_date: ScienceBase dateUploaded for the file, used to decide whether the cache is current
+        :return: "in_cache" if the cached copy was kept, "written" if the file was downloaded
+        '''
+        meta_path = f"{file_path}.meta.json"
+        meta = None
+        if os.path.isfile(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+
+        if os.path.isfile(file_path):
+            # Files cached before sidecars existed are trusted as they are
+            if meta is None or (source_file_date is not None and meta.get("source_file_date") == source_file_date):
+                return "in_cache"
+
+        headers = None
+        if meta is not None and meta.get("etag") and os.path.isfile(file_path):
+            headers = {"If-None-Match": meta["etag"]}
+
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        status, etag = self._with_retries(url, lambda: self._transfer(url, file_path, temp_path, headers))
+
+        with open(meta_path, "w") as f:
+            json.dump({
+                "url": url,
+                "source_file_date": source_file_date,
+                "etag": etag or (meta.get("etag") if meta else None)
+            }, f)
+
+        return status
+
+    def download_many(self, jobs):
+        '''
+        Runs download() for a batch of files on a bounded thread pool.
+
+        :param jobs: List of dictionaries with url, file_path and source_file_date
+        :return: List of (job, status, exception) tuples in the same order as jobs; status is None on error
+        '''
+        def run(job):
+            try:
+                return job, self.download(job["url"], job["file_path"], job.get("source_file_date")), None
+            except Exception as e:
+                return job, None, e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(run, jobs))
+
+
+_downloader = None
+_downloader_lock = threading.Lock()
+
+
+def get_downloader():
+    '''
+    Returns the process-wide Downloader so every caller shares one connection pool.
+    '''
+    global _downloader
+
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = Downloader(
+                max_workers=int(os.getenv("SGCN_DOWNLOAD_WORKERS", 8)),
+                per_host_limit=int(os.getenv("SGCN_DOWNLOAD_PER_HOST", 4))
+            )
+        return _downloader
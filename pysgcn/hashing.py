@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+# Fields that identify an SGCN source record, in hashing order. record_processed is left out on purpose: it changes
+# on every run and would otherwise stop the same record from matching itself across reruns.
+RECORD_ID_FIELDS = (
+    "scientific name",
+    "common name",
+    "taxonomic category",
+    "state",
+    "sciencebase_item_id",
+    "source_file_date",
+    "source_file_url",
+    "year",
+    "clean_scientific_name",
+    "historic_list",
+    "itis_override_id",
+    "sppin_key"
+)
+
+FIELD_SEPARATOR = "\x1f"
+
+# legacy (the default) reproduces the original sha1 of the full sorted JSON record so ids match results cached by
+# earlier runs; canonical hashes the RECORD_ID_FIELDS tuple and has to be opted into, since it changes every id
+CANONICAL = "canonical"
+LEGACY = "legacy"
+
+RECORD_ID_MODE = os.getenv("SGCN_RECORD_ID_MODE", LEGACY)
+
+
+def legacy_record_id(record):
+    '''
+    Creates the original record id: a sha1 of the repr of the full record serialized as sorted JSON.
+
+    :param record: Source record dictionary
+    :return: Hex digest string
+    '''
+    return hashlib.sha1(repr(json.dumps(record, sort_keys=True)).encode('utf-8')).hexdigest()
+
+
+def _canonical_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value)
+
+
+def canonical_record_id(record):
+    '''
+    Creates a record id from the fixed RECORD_ID_FIELDS tuple.
+
+    :param record: Source record dictionary
+    :return: Hex digest string
+    '''
+    key = FIELD_SEPARATOR.join(_canonical_value(record.get(field)) for field in RECORD_ID_FIELDS)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def record_id(record, mode=None):
+    '''
+    Creates the id for a single source record.
+
+    :param record: Source record dictionary
+    :param mode: legacy or canonical, defaults to RECORD_ID_MODE (SGCN_RECORD_ID_MODE environment variable)
+    :return: Hex digest string
+    '''
+    if (mode or RECORD_ID_MODE) == CANONICAL:
+        return canonical_record_id(record)
+    return legacy_record_id(record)
+
+
+def record_ids(df, mode=None):
+    '''
+    Creates ids for every record in a harmonized source dataframe. In canonical mode the key strings are built with
+    column operations and only the sha1 step runs per row; legacy mode has to serialize each record.
+
+    :param df: Dataframe returned by Sgcn.process_sgcn_source_item(output_type="dataframe")
+    :param mode: legacy or canonical, defaults to RECORD_ID_MODE (SGCN_RECORD_ID_MODE environment variable)
+    :return: List of hex digest strings aligned to the dataframe rows
+    '''
+    if (mode or RECORD_ID_MODE) != CANONICAL:
+        return [legacy_record_id(record) for record in df.to_dict("records")]
+
+    key = None
+    for field in RECORD_ID_FIELDS:
+        if field in df.columns:
+            column = df[field].astype(object)
+            column = column.where(column.notna(), "").astype(str)
+        else:
+            column = ""
+
+        key = column if key is None else key + FIELD_SEPARATOR + column
+
+    if isinstance(key, str):
+        key = [key] * len(df)
+
+    return [hashlib.sha1(k.encode('utf-8')).hexdigest() for k in key]
@@ -0,0 +1,176 @@
+from datetime import datetime
+
+import requests
+
+from pysgcn.metrics import metrics
+
+ITIS_SOLR_URL = "https://services.itis.gov/"
+
+# Taxonomic authority URL recorded in ITIS summaries, as pysppin's ItisApi writes it
+ITIS_REPORT_URL = "https://www.itis.gov/servlet/SingleRpt/SingleRpt?search_topic=TSN&search_value={}"
+
+
+def _solr_phrase(value):
+    return '"{}"'.format(str(value).replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def parse_sppin_key(sppin_key):
+    sppin_key_type, sppin_key_value = sppin_key.split(":", 1)
+    return sppin_key_type, sppin_key_value
+
+
+def package_itis_doc(doc):
+    '''
+    Converts an ITIS Solr document into the structure used in ITIS results: names, usage and rank plus the
+    biological_taxonomy list parsed from hierarchySoFarWRanks and the common names parsed from vernacular.
+
+    :param doc: Document from the ITIS Solr response
+    :return: Dictionary for the data list of an ITIS result
+    '''
+    biological_taxonomy = list()
+    for hierarchy in doc.get("hierarchySoFarWRanks", [])[:1]:
+        for part in hierarchy.split("$")[1:]:
+            if ":" in part:
+                rank, name = part.split(":", 1)
+                biological_taxonomy.append({"rank": rank, "name": name})
+
+    commonnames = list()
+    for vernacular in doc.get("vernacular", []):
+        parts = vernacular.split("$")
+        if len(parts) > 2:
+            commonnames.append({"name": parts[1], "language": parts[2]})
+
+    return {
+        "tsn": doc.get("tsn"),
+        "nameWInd": doc.get("nameWInd"),
+        "nameWOInd": doc.get("nameWOInd"),
+        "usage": doc.get("usage"),
+        "rank": doc.get("rank"),
+        "acceptedTSN": doc.get("acceptedTSN", []),
+        "biological_taxonomy": biological_taxonomy,
+        "commonnames": commonnames
+    }
+
+
+class ItisBatchResolver:
+    '''
+    Resolves many sppin_keys against the ITIS Solr service with OR'ed multi-term queries (nameWOInd for scientific
+    names, tsn for TSN keys), chunk_size keys per request, and splits the response back out per key. Invalid names
+    are followed to their accepted TSN with one more batched query. Keys with no exact match are left out of the
+    results so the caller can fall back to the single-name pysppin search, which also does fuzzy matching.
+
+    Summaries follow pysppin's ItisApi.search: the taxonomic_authority_url is the ITIS report URL for the TSN, the
+    match_method is "Exact Match" for a single document, "Found multiple matches" when the name matched several, or
+    "Followed Accepted TSN", and commonname (the English vernacular) is always present, None when there is none.
+    '''
+    def __init__(self, base_url=ITIS_SOLR_URL, chunk_size=25, session=None):
+        self.base_url = base_url
+        self.chunk_size = chunk_size
+        self.session = session if session is not None else requests.Session()
+
+    def query(self, clauses):
+        params = {
+            "wt": "json",
+            "rows": max(100, len(clauses) * 10),
+            "q": " OR ".join(clauses)
+        }
+        metrics.incr("remote.itis_batch.calls")
+        with metrics.timer("remote.itis_batch.seconds"):
+            r = self.session.get(self.base_url, params=params)
+            r.raise_for_status()
+        return r.json()["response"]["docs"]
+
+    def get_docs_by_tsn(self, tsns):
+        docs = dict()
+        tsns = list(tsns)
+        for i in range(0, len(tsns), self.chunk_size):
+            for doc in self.query([f"tsn:{tsn}" for tsn in tsns[i:i + self.chunk_size]]):
+                docs[str(doc["tsn"])] = doc
+        return docs
+
+    def resolve(self, sppin_keys, name_source=None, source_date=None):
+        '''
+        :param sppin_keys: List of sppin_key strings (Scientific Name:<name> or TSN:<tsn>)
+        :param name_source: Source of the names, recorded in processing_metadata
+        :param source_date: Date of the name source, recorded in processing_metadata
+        :return: Dictionary of sppin_key to ITIS result (sppin_key, processing_metadata, data, summary) in the shape
+        expected by Sgcn.process_itis_result, for keys with a match
+        '''
+        sppin_keys = list(dict.fromkeys(sppin_keys))
+        matches = {key: list() for key in sppin_keys}
+
+        for i in range(0, len(sppin_keys), self.chunk_size):
+            chunk = sppin_keys[i:i + self.chunk_size]
+            by_name = dict()
+            by_tsn = dict()
+            clauses = list()
+            for key in chunk:
+                sppin_key_type, sppin_key_value = parse_sppin_key(key)
+                if sppin_key_type == "TSN":
+                    by_tsn[sppin_key_value] = key
+                    clauses.append(f"tsn:{sppin_key_value}")
+                else:
+                    by_name[sppin_key_value] = key
+                    clauses.append(f"nameWOInd:{_solr_phrase(sppin_key_value)}")
+
+            for doc in self.query(clauses):
+                if doc.get("nameWOInd") in by_name:
+                    matches[by_name[doc["nameWOInd"]]].append(doc)
+                if str(doc.get("tsn")) in by_tsn:
+                    matches[by_tsn[str(doc["tsn"])]].append(doc)
+
+        # Follow invalid names to their accepted TSN in one more set of batched queries
+        accepted_tsns = set()
+        for docs in matches.values():
+            if docs and not any(doc.get("usage") in ["valid", "accepted"] for doc in docs):
+                accepted_tsns.update(str(tsn) for doc in docs for tsn in doc.get("acceptedTSN", []))
+        accepted_docs = self.get_docs_by_tsn(accepted_tsns) if accepted_tsns else dict()
+
+        results = dict()
+        for key, docs in matches.items():
+            if not docs:
+                continue
+
+            match_method = "Exact Match" if len(docs) == 1 else "Found multiple matches"
+            valid_doc = next((doc for doc in docs if doc.get("usage") in ["valid", "accepted"]), None)
+            if valid_doc is None:
+                valid_doc = next(
+                    (accepted_docs[str(tsn)] for doc in docs for tsn in doc.get("acceptedTSN", [])
+                     if str(tsn) in accepted_docs),
+                    None
+                )
+                if valid_doc is not None:
+                    match_method = "Followed Accepted TSN"
+                    docs = docs + [valid_doc]
+
+            results[key] = self.package_result(key, docs, valid_doc, match_method, name_source, source_date)
+
+        return results
+
+    def package_result(self, sppin_key, docs, valid_doc, match_method, name_source, source_date):
+        result = {
+            "sppin_key": sppin_key,
+            "processing_metadata": {
+                "status": "success",
+                "api": self.base_url,
+                "date_processed": datetime.utcnow().isoformat(),
+                "name_source": name_source,
+                "source_date": source_date
+            },
+            "data": [package_itis_doc(doc) for doc in docs]
+        }
+
+        if valid_doc is not None:
+            valid_itis_doc = package_itis_doc(valid_doc)
+            summary = {
+                "scientificname": valid_itis_doc["nameWOInd"],
+                "taxonomicrank": valid_itis_doc["rank"],
+                "taxonomic_authority_url": ITIS_REPORT_URL.format(valid_itis_doc["tsn"]),
+                "match_method": match_method,
+                "commonname": next(
+                    (n["name"] for n in valid_itis_doc["commonnames"] if n["language"] == "English"), None
+                )
+            }
+            result["summary"] = summary
+
+        return result
@@ -0,0 +1,28 @@
+import importlib
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    '''
+    Imports a module lazily: the module object is created right away but its code only runs the first time one of
+    its attributes is used. Pipeline stages that never touch pandas, numpy, pysppin or sciencebasepy therefore don't
+    pay for loading them on a cold start.
+
+    :param name: Module name
+    :return: Module (loaded on first attribute access)
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
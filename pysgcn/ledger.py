@@ -0,0 +1,98 @@
+from datetime import datetime
+
+
+class ProcessingLedger:
+    '''
+    Records which version of each SGCN source file has been processed, and the ids of the records it produced, in the
+    pipeline's cache_manager. A source file version is identified by its source_file_url and source_file_date, so a
+    file that is re-uploaded to ScienceBase gets a new entry and is processed again. Entries are also keyed by the
+    versions of the metadata the file was processed with (the MetadataIndex version of the historic list and ITIS
+    overrides, and the taxogroupings version of the taxonomic group mappings), so a change to any of those metadata
+    files reprocesses every source file. Final records are stored by row_id so the results of unchanged files can be
+    carried forward into a new run without reprocessing them. They are keyed by the taxogroupings version as well,
+    since the taxonomic group mappings change the final record but not its row_id (the metadata in MetadataIndex
+    feeds into the row_id already).
+
+    Entries are never updated in place (the cache keeps the first value written for a key); each file version and
+    each record id has its own key.
+    '''
+    def __init__(self, cache_manager, metadata_version=None, taxogroupings_version=None):
+        '''
+        :param cache_manager: Pipeline cache manager
+        :param metadata_version: MetadataIndex.version of the metadata in use
+        :param taxogroupings_version: Version of the taxonomic group mappings in use (see Sgcn.publish_taxogroupings)
+        '''
+        self.cache_manager = cache_manager
+        self.metadata_version = metadata_version
+        self.taxogroupings_version = taxogroupings_version
+
+    @staticmethod
+    def entry_key(source_file_url, source_file_date, metadata_version=None, taxogroupings_version=None):
+        return f"ledger:{source_file_url}|{source_file_date}|{metadata_version}|{taxogroupings_version}"
+
+    @staticmethod
+    def record_key(row_id, taxogroupings_version=None):
+        return f"sgcn_record:{row_id}|{taxogroupings_version}"
+
+    def get_entry(self, source_file_url, source_file_date):
+        '''
+        :param source_file_url: URL of the source file
+        :param source_file_date: Upload date of the source file
+        :return: Ledger entry for this version of the file and metadata, or None if it has not been processed
+        '''
+        return self.cache_manager.get_from_cache(
+            self.entry_key(source_file_url, source_file_date, self.metadata_version, self.taxogroupings_version)
+        )
+
+    def record_entry(self, item, record_ids, **processing_metadata):
+        '''
+        Adds a ledger entry for a processed source item.
+
+        :param item: Summarized item dictionary from get_processable_items
+        :param record_ids: Ids of the records sent on for the item
+        :param processing_metadata: Additional details about how the file was processed
+        :return: The ledger entry
+        '''
+        entry = {
+            "source_file_url": item["source_file_url"],
+            "source_file_date": item["source_file_date"],
+            "sciencebase_item_id": item["sciencebase_item_id"],
+            "state": item["state"],
+            "year": item["year"],
+            "record_ids": list(record_ids),
+            "metadata_version": self.metadata_version,
+            "taxogroupings_version": self.taxogroupings_version,
+            "processed": datetime.utcnow().isoformat(),
+            **processing_metadata
+        }
+        self.cache_manager.add_to_cache(
+            self.entry_key(
+                item["source_file_url"], item["source_file_date"], self.metadata_version, self.taxogroupings_version
+            ),
+            entry
+        )
+
+        return entry
+
+    def store_record(self, sgcn_record):
+        '''
+        Stores a final SGCN record so later runs can carry it forward.
+
+        :param sgcn_record: Final record with row_id and data
+        '''
+        self.cache_manager.add_to_cache(self.record_key(sgcn_record["row_id"], self.taxogroupings_version), sgcn_record)
+
+    def previous_records(self, entry):
+        '''
+        :param entry: Ledger entry
+        :return: List of the final records produced for the entry, or None if any of them is missing (e.g. a run
+        that stopped before stage 3 finished), in which case the file needs to be processed again
+        '''
+        records = list()
+        for row_id in entry["record_ids"]:
+            record = self.cache_manager.get_from_cache(self.record_key(row_id, self.taxogroupings_version))
+            if record is None:
+                return None
+            records.append(record)
+
+        return records
@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pysgcn.metrics import metrics
+
+_STOP = object()
+
+
+class LocalPipelineExecutor:
+    '''
+    Runs the bis_pipeline process_N stages on one machine the way the Lambda deployment fans them out: each stage after
+    the first is a pool of worker threads reading from its own bounded queue, and a stage's send_to_stage puts the
+    message on the next stage's queue. A full queue blocks the sender, so a fast stage can't run arbitrarily far ahead
+    of a slow one. Messages are handed over as Python objects rather than being serialized between stages.
+
+    The first stage runs in the calling thread; after it returns, the stage queues are drained in order, so every
+    message has been processed when run returns. A message that raises is reported and counted in the metrics
+    (executor.stage_N.errors) without stopping the run.
+
+    Threads suit the stages that mostly wait on the network and the caches (3 and 4), but stage 2 reads and harmonizes
+    source files, which is CPU bound. A stage can be given a prepare function that runs in a pool of worker processes
+    as soon as a message is sent to the stage; the stage's thread waits for it and processes the message it returns.
+    For stage 2, bis_pipeline.prepare_2 fills the columnar cache in the worker process and process_2 then reads it.
+    '''
+    def __init__(
+        self, stages, path, ch_ledger, cache_manager, send_final_result=None, workers=None, queue_size=1000,
+        prepare=None, processes=None
+    ):
+        '''
+        :param stages: Dictionary of stage number to process function (taking the bis_pipeline stage arguments)
+        :param path: Path (download_uri) passed to every stage
+        :param ch_ledger: Ledger name passed to every stage
+        :param cache_manager: Cache manager passed to every stage
+        :param send_final_result: Function receiving final records
+        :param workers: Dictionary of stage number to number of worker threads (default 4 per stage)
+        :param queue_size: Maximum number of messages waiting for each stage
+        :param prepare: Dictionary of stage number to a picklable function taking a message and returning the message
+        to process, run in a worker process; a failure is reported and the original message is processed
+        :param processes: Number of worker processes for prepare functions (defaults to the number of CPUs)
+        '''
+        self.stages = dict(sorted(stages.items()))
+        self.path = path
+        self.ch_ledger = ch_ledger
+        self.cache_manager = cache_manager
+        self.send_final_result = send_final_result
+        self.workers = workers or dict()
+        self.prepare = prepare or dict()
+        self.processes = processes
+        self.process_pool = None
+
+        self.first_stage = next(iter(self.stages))
+        self.queues = {n: queue.Queue(maxsize=queue_size) for n in self.stages if n != self.first_stage}
+        self.threads = list()
+
+    def send_to_stage(self, data, stage):
+        if stage not in self.queues:
+            raise ValueError(f"No stage {stage} is configured in the executor")
+        if stage in self.prepare:
+            data = _Prepared(data, self.process_pool.submit(self.prepare[stage], data))
+        self.queues[stage].put(data)
+
+    def _worker(self, stage):
+        process = self.stages[stage]
+        stage_queue = self.queues[stage]
+
+        while True:
+            message = stage_queue.get()
+            try:
+                if message is _STOP:
+                    return
+                if isinstance(message, _Prepared):
+                    message = message.result(stage)
+                self._run_stage(stage, process, message)
+            finally:
+                stage_queue.task_done()
+
+    def _run_stage(self, stage, process, message):
+        start = time.perf_counter()
+        try:
+            process(self.path, self.ch_ledger, self.send_final_result, self.send_to_stage, message, self.cache_manager)
+            metrics.incr(f"executor.stage_{stage}.messages")
+        except Exception as e:
+            metrics.incr(f"executor.stage_{stage}.errors")
+            metrics.event(f"executor.stage_{stage}.error", error="{}: {}".format(type(e).__name__, e))
+        finally:
+            metrics.observe(f"executor.stage_{stage}.seconds", time.perf_counter() - start)
+
+    def run(self, payload):
+        '''
+        Runs the first stage with payload and waits for every message it produces to work through the later stages.
+
+        :param payload: previous_stage_result for the first stage
+        :return: Metrics snapshot for the run
+        '''
+        if self.prepare:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.processes)
+
+        for stage in self.queues:
+            for i in range(self.workers.get(stage, 4)):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"stage_{stage}_{i}", daemon=True)
+                thread.start()
+                self.threads.append((stage, thread))
+
+        try:
+            self._run_stage(self.first_stage, self.stages[self.first_stage], payload)
+
+            # Stages only send to later stages, so once a stage's queue is drained nothing more can arrive in it
+            for stage, stage_queue in self.queues.items():
+                stage_queue.join()
+        finally:
+            for stage, thread in self.threads:
+                self.queues[stage].put(_STOP)
+            for stage, thread in self.threads:
+                thread.join()
+            self.threads = list()
+            if self.process_pool is not None:
+                self.process_pool.shutdown()
+                self.process_pool = None
+
+        return metrics.snapshot()
+
+
+class _Prepared:
+    '''A message sent to a stage with a prepare function, along with the future of its prepare call.'''
+    def __init__(self, message, future):
+        self.message = message
+        self.future = future
+
+    def result(self, stage):
+        try:
+            return self.future.result()
+        except Exception as e:
+            metrics.incr(f"executor.stage_{stage}.prepare_errors")
+            metrics.event(f"executor.stage_{stage}.prepare_error", error="{}: {}".format(type(e).__name__, e))
+            return self.message
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket rate limiter. acquire() blocks until a token is available, so calls through the same
+    bucket never exceed rate per second on average or capacity in a burst.
+    '''
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Requests per second allowed against each taxonomic authority from one process. WoRMS will block us above two
+# requests per second and the pipeline lambdas run at a concurrency of 2, so the default is 1 per second per process.
+AUTHORITY_RATES = {
+    "itis": (float(os.getenv("SGCN_ITIS_RATE", 10)), int(os.getenv("SGCN_ITIS_BURST", 5))),
+    "worms": (float(os.getenv("SGCN_WORMS_RATE", 1)), int(os.getenv("SGCN_WORMS_BURST", 1)))
+}
+
+# Set SGCN_BATCH_ITIS to prefetch ITIS results with batched Solr queries (itis_batch) before planned lookups. Off by
+# default: the batch resolver only does exact name matching and builds its results itself, so they are not
+# guaranteed to be identical to pysppin's, and they are cached permanently under itis:<sppin_key>.
+BATCH_ITIS = bool(os.getenv("SGCN_BATCH_ITIS"))
+
+_rate_limiters = dict()
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(authority):
+    '''
+    Returns the process-wide TokenBucket for a taxonomic authority, or None if the authority is not rate limited.
+
+    :param authority: sppin source name (itis, worms)
+    :return: TokenBucket or None
+    '''
+    if authority not in AUTHORITY_RATES:
+        return None
+
+    with _rate_limiters_lock:
+        if authority not in _rate_limiters:
+            rate, capacity = AUTHORITY_RATES[authority]
+            _rate_limiters[authority] = TokenBucket(rate, capacity)
+        return _rate_limiters[authority]
+
+
+class SingleFlight:
+    '''
+    Coalesces concurrent calls for the same key: the first caller runs the function and every caller that arrives
+    while it is in flight waits for and shares that result.
+    '''
+    def __init__(self):
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if leader:
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+
+        return future.result()
+
+
+# Shared by every Sgcn instance so concurrent lookups of one sppin_key in a process hit the authorities once
+taxa_single_flight = SingleFlight()
+
+
+class TaxonomicLookupEngine:
+    '''
+    Runs Sgcn.gather_taxa_summary (or another lookup function) for many messages at once on a bounded thread pool.
+    Each remote call still goes through Sgcn.create_or_return_cache, so the itis:<sppin_key> and worms:<sppin_key>
+    cache keys are unchanged and every call waits on the per-authority rate limiter. The threads share the
+    process-wide pysppin ItisApi and Worms clients. This only helps where many records are resolved together
+    (LookupPlanner in process_2_batch, Sgcn.gather_taxa_summaries); process_3 looks up the one record it is given.
+    '''
+    def __init__(self, sgcn, max_concurrency=8, lookup=None):
+        self.sgcn = sgcn
+        self.max_concurrency = max_concurrency
+        self.lookup = lookup if lookup is not None else sgcn.gather_taxa_summary
+
+    def _lookup(self, message):
+        try:
+            return self.lookup(message)
+        except Exception as e:
+            return e
+
+    def gather(self, messages):
+        '''
+        Looks up the taxonomic summaries for a list of source record messages.
+
+        :param messages: List of source record dictionaries (each with sppin_key and source file details)
+        :return: List aligned to messages of (taxa_summary_msg, name_queue) tuples, or the exception raised for that
+        message
+        '''
+        if not messages:
+            return list()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(self._lookup, messages))
+
+
+class LookupPlanner:
+    '''
+    Run-level plan for taxonomic lookups. Records from every extracted source file are added, the distinct sppin_key
+    set is resolved once (one representative record per key, optionally with ITIS names prefetched in batches, and
+    then looked up on the TaxonomicLookupEngine thread pool), and the results are fanned back out to every record with
+    that key. Attach the planner to an Sgcn instance as taxa_summary_plan so gather_taxa_summary uses the resolved
+    results in the same process. The planner is used by process_2_batch (SGCN_PARALLEL_EXTRACT).
+    '''
+    def __init__(self, sgcn, max_concurrency=8, batch_itis=None):
+        self.sgcn = sgcn
+        self.max_concurrency = max_concurrency
+        self.batch_itis = BATCH_ITIS if batch_itis is None else batch_itis
+        self.messages = dict()
+        self.results = dict()
+        self.record_count = 0
+
+    def add(self, records):
+        '''
+        Adds source records to the plan; only the first record seen for each sppin_key is kept for the lookup.
+
+        :param records: Iterable of source record dictionaries with sppin_key and source file details
+        '''
+        for record in records:
+            self.record_count += 1
+            if record["sppin_key"] not in self.messages:
+                self.messages[record["sppin_key"]] = record
+
+    def add_dataframe(self, df_src):
+        '''
+        Adds a harmonized source dataframe to the plan.
+
+        :param df_src: Dataframe from Sgcn.process_sgcn_source_item(output_type="dataframe")
+        '''
+        self.record_count += len(df_src) - df_src["sppin_key"].nunique()
+        self.add(df_src.drop_duplicates("sppin_key").to_dict("records"))
+
+    def resolve(self):
+        '''
+        Looks up every sppin_key in the plan that has not been resolved yet. Keys whose lookup raised are left out and
+        fall back to a normal lookup when their records are processed.
+
+        :return: Number of sppin_keys resolved by this call
+        '''
+        pending = [key for key in self.messages if key not in self.results]
+
+        # Warm the ITIS cache with batched multi-name queries so most of the lookups below are cache hits
+        if self.batch_itis and pending:
+            self.sgcn.prefetch_itis([self.messages[key] for key in pending])
+
+        engine = TaxonomicLookupEngine(self.sgcn, self.max_concurrency, lookup=self.sgcn.lookup_taxa_summary)
+
+        resolved = 0
+        for key, result in zip(pending, engine.gather([self.messages[key] for key in pending])):
+            if not isinstance(result, Exception):
+                self.results[key] = result
+                resolved += 1
+
+        return resolved
+
+    def get(self, sppin_key):
+        '''
+        :param sppin_key: sppin_key of a source record
+        :return: (taxa_summary_msg, name_queue) resolved for the key, or None if the key was not resolved
+        '''
+        return self.results.get(sppin_key)
+
+    def summary_for(self, record):
+        '''
+        Fans a resolved result back out to one record, filling in the common name from that record as
+        gather_taxa_summary does.
+
+        :param record: Source record dictionary
+        :return: (taxa_summary_msg, name_queue) for the record, or None if its sppin_key was not resolved
+        '''
+        result = self.get(record["sppin_key"])
+        if result is None:
+            return None
+
+        return self.sgcn.infuse_common_name(result[0], record), result[1]
@@ -0,0 +1,182 @@
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket holds everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    '''
+    Fixed bucket histogram of observed values (latencies in seconds) with count, sum, min and max.
+    '''
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {
+                **{f"le_{bound}": n for bound, n in zip(self.buckets, self.counts)},
+                "inf": self.counts[-1]
+            }
+        }
+
+
+class NullSink:
+    '''Discards metric events.'''
+    def emit(self, record):
+        pass
+
+
+class JsonLinesSink:
+    '''
+    Writes each metric event as one JSON line to a stream (stdout by default) or appends it to a file.
+    '''
+    def __init__(self, path=None, stream=None):
+        self.path = path
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+            else:
+                stream = self.stream or sys.stdout
+                stream.write(line + "\n")
+                stream.flush()
+
+
+def sink_from_env(value=None):
+    '''
+    Builds the sink named by SGCN_METRICS_SINK: null (default), stdout, or a file path for JSON lines.
+    '''
+    value = value if value is not None else os.getenv("SGCN_METRICS_SINK", "null")
+    if value == "stdout":
+        return JsonLinesSink()
+    if value in ("null", "none", ""):
+        return NullSink()
+    return JsonLinesSink(path=value)
+
+
+class Metrics:
+    '''
+    Process-wide counters and latency histograms for pipeline processing, plus structured events. Names carry a stage
+    or source prefix (e.g. stage_2.duplicate_records, cache.itis.hits, remote.worms.seconds). Counters can be read back
+    with snapshot() at the end of a stage or run, and report() adds the histogram summaries. Events and the per-run
+    totals from emit_totals() go to a pluggable sink, any object with an emit(record) method, configured from
+    SGCN_METRICS_SINK by default.
+    '''
+    def __init__(self, sink=None):
+        self.counters = Counter()
+        self.histograms = dict()
+        self.sink = sink if sink is not None else sink_from_env()
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def get(self, name):
+        with self._lock:
+            return self.counters[name]
+
+    def observe(self, name, value):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        '''
+        Times a block into the name histogram (seconds), counting name.errors when the block raises.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incr(f"{name}.errors")
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        '''
+        Decorator form of timer.
+        '''
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def event(self, name, **fields):
+        '''
+        Emits a structured event to the sink.
+
+        :param name: Event name
+        :param fields: Event properties
+        '''
+        self.sink.emit({"event": name, "time": datetime.utcnow().isoformat(), **fields})
+
+    def set_sink(self, sink):
+        self.sink = sink
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def report(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: h.summary() for name, h in self.histograms.items()}
+            }
+
+    def emit_totals(self, **fields):
+        '''
+        Emits the counters and histogram summaries accumulated so far as a run_totals event.
+
+        :param fields: Additional properties for the event (e.g. run_id)
+        :return: The report that was emitted
+        '''
+        report = self.report()
+        self.event("run_totals", **fields, **report)
+        return report
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+metrics = Metrics()
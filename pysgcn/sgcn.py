@@ -1,18 +1,284 @@
-from sciencebasepy import SbSession
-import pandas as pd
 import requests
 from datetime import datetime
-import pysppin
 import os
+from pysgcn.lazy import lazy_import
+from pysgcn.cache import LRUCache
+from pysgcn.downloader import get_downloader
+from pysgcn.itis_batch import ItisBatchResolver
+from pysgcn.ledger import ProcessingLedger
+from pysgcn.metrics import metrics
+from pysgcn.lookup import TaxonomicLookupEngine, get_rate_limiter, taxa_single_flight
+from pysgcn.sppin_index import get_sppin_index
+from pysgcn import tsv_engine
+from pysgcn.work_queue import get_work_queue
 import json
-import pkg_resources
 import time
 import math
+import threading
+import hashlib
+import tempfile
+import sqlite3
+import io
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Heavy dependencies are only loaded when first used, so stages that never build a dataframe or call pysppin start
+# faster
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+pysppin = lazy_import("pysppin")
+sciencebasepy = lazy_import("sciencebasepy")
+jsonschema = lazy_import("jsonschema")
+pkg_resources = lazy_import("pkg_resources")
+
+# pysppin helpers built on first use; common_utils, itis_api, worms and pysppin_utils are still available as module
+# attributes through __getattr__
+_pysppin_helpers = {
+    "common_utils": lambda: pysppin.utils.Utils(),
+    "itis_api": lambda: pysppin.itis.ItisApi(),
+    "worms": lambda: pysppin.worms.Worms(),
+    "pysppin_utils": lambda: pysppin.utils.Utils(),
+}
+_pysppin_helper_instances = dict()
+
+
+def get_pysppin_helper(name):
+    if name not in _pysppin_helper_instances:
+        _pysppin_helper_instances[name] = _pysppin_helpers[name]()
+    return _pysppin_helper_instances[name]
+
+
+def __getattr__(name):
+    if name in _pysppin_helpers:
+        return get_pysppin_helper(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ScienceBase state shared by every Sgcn instance in the process. Pipeline stages run many times in the same (warm)
+# container, so the session and the root collection item are reused for SB_ITEM_TTL seconds instead of being
+# rebuilt and refetched for every invocation.
+SB_ITEM_TTL = float(os.getenv("SGCN_SB_ITEM_TTL", 3600))
+
+_sb_session = None
+_sb_item_cache = dict()
+_sgcn_registry = dict()
+_registry_lock = threading.Lock()
+
+# In-process first tier in front of the cache_manager for taxonomic lookups (itis:<sppin_key>, worms:<sppin_key>, ...)
+lookup_cache = LRUCache(
+    max_entries=int(os.getenv("SGCN_LRU_ENTRIES", 20000)),
+    max_bytes=int(os.getenv("SGCN_LRU_BYTES", 64 * 1024 * 1024)),
+    negative_ttl=float(os.getenv("SGCN_NEGATIVE_TTL", 3600))
+)
+# Lookups that errored (timeouts, server errors) rather than finding nothing are only remembered briefly
+LOOKUP_ERROR_TTL = float(os.getenv("SGCN_ERROR_TTL", 60))
+
+# Set SGCN_FULL_REBUILD to ignore the processing ledger and reprocess every source file in the pipeline
+FULL_REBUILD = bool(os.getenv("SGCN_FULL_REBUILD"))
+
+# Engine used to extract source files in stage 2: pandas, or csv for the pandas-free reader in tsv_engine
+EXTRACT_ENGINE = os.getenv("SGCN_EXTRACT_ENGINE", "pandas")
+
+# Class to SGCN taxonomic group mappings by published version (see publish_taxogroupings)
+_taxogroupings_cache = dict()
+
+# Rows per chunk when source files are streamed (process_sgcn_source_item output_type="iter")
+SOURCE_CHUNK_SIZE = int(os.getenv("SGCN_CHUNK_SIZE", 5000))
+
+# Parsed SGCN metadata files keyed by a hash of file URL and ScienceBase upload date
+_metadata_file_cache = dict()
+
+# MetadataIndex built for each of the last few metadata dictionaries passed to build_metadata_index, keyed by id()
+# and kept with the dictionary itself so the id can't be reused while it is cached
+_metadata_indexes = dict()
+METADATA_INDEXES_MAX = 8
+
+# UPDATE ... FROM joins need SQLite 3.33; older versions apply taxa summaries with one prepared UPDATE per sppin_key
+SQLITE_UPDATE_FROM = sqlite3.sqlite_version_info >= (3, 33, 0)
+
+
+def get_sb_session():
+    '''
+    Returns the process-wide ScienceBase session, creating it on first use.
+    '''
+    global _sb_session
+
+    with _registry_lock:
+        if _sb_session is None:
+            _sb_session = sciencebasepy.SbSession()
+        return _sb_session
+
+
+def get_sgcn(operation_mode="local", cache_root=None, cache_manager=None):
+    '''
+    Factory for Sgcn instances that hands back the same instance for a given operation_mode and cache_root for the
+    life of the process. The cache_manager is rebound on every call since pipeline handlers create a new one for each
+    message.
+
+    :param operation_mode: local or pipeline, passed through to Sgcn
+    :param cache_root: Local cache location, passed through to Sgcn
+    :param cache_manager: Cache manager used in pipeline mode, passed through to Sgcn
+    :return: Shared Sgcn instance
+    '''
+    key = (operation_mode, cache_root)
+
+    with _registry_lock:
+        sgcn = _sgcn_registry.get(key)
+
+    if sgcn is None:
+        sgcn = Sgcn(operation_mode=operation_mode, cache_root=cache_root, cache_manager=cache_manager)
+        with _registry_lock:
+            sgcn = _sgcn_registry.setdefault(key, sgcn)
+
+    sgcn.cache_manager = cache_manager
+
+    return sgcn
+
+
+
+class MetadataIndex:
+    '''
+    Hash-based lookup structures built once from the metadata returned by Sgcn.cache_sgcn_metadata(return_data=True)
+    so that source records can be checked against the historic national list and ITIS overrides with set/dict lookups
+    instead of scanning the metadata lists for every record.
+    '''
+    def __init__(self, metadata_cache):
+        self.historic_names = set(
+            spec["scientific_name"] for spec in metadata_cache["Historic 2005 SWAP National List"]
+        )
+
+        # The first override listed for a name wins, which matches the original list scan
+        self.itis_overrides = dict()
+        for spec in metadata_cache["SGCN ITIS Overrides"]:
+            if spec["ScientificName_original"] not in self.itis_overrides:
+                self.itis_overrides[spec["ScientificName_original"]] = spec["taxonomicAuthorityID"]
+
+        # Content hash of the index, used to key cached outputs that depend on this metadata
+        self.version = hashlib.sha1(json.dumps(
+            [sorted(self.historic_names, key=str), sorted(self.itis_overrides.items(), key=str)],
+            default=str
+        ).encode('utf-8')).hexdigest()
+
+    def is_historic(self, scientific_name):
+        return scientific_name in self.historic_names
+
+    def itis_override(self, scientific_name):
+        return self.itis_overrides.get(scientific_name)
+
+
+def load_schema(schema):
+    '''
+    Loads one of the JSON schema documents packaged in pysgcn/resources.
+
+    :param schema: Name of the schema file without the .json extension
+    :return: Schema dictionary
+    '''
+    schema_file = pkg_resources.resource_filename('pysgcn', f'resources/{schema}.json')
+
+    with open(schema_file, "r") as f:
+        schema = json.load(f)
+        f.close()
+
+    return schema
+
+
+class RecordValidator:
+    '''
+    Wraps a jsonschema validator compiled once for a schema so that records can be checked without reloading or
+    recompiling the schema for every record.
+    '''
+    def __init__(self, schema):
+        self.schema = schema
+        self.validator = jsonschema.validators.validator_for(schema)(schema)
+
+    def is_valid(self, record):
+        return self.validator.is_valid(record)
+
+    def validate_many(self, records):
+        '''
+        Validates a batch of records.
+
+        :param records: Iterable of record dictionaries
+        :return: List of booleans (a mask) aligned to the input records, True where the record matches the schema
+        '''
+        return [self.validator.is_valid(record) for record in records]
+
+
+@functools.lru_cache(maxsize=None)
+def get_record_validator(schema="sgcn_source_records_schema"):
+    '''
+    Returns the process-wide RecordValidator for a packaged schema, loading and compiling it on first use.
+
+    :param schema: Name of the schema file without the .json extension
+    :return: RecordValidator
+    '''
+    return RecordValidator(load_schema(schema))
+
+
+def _import_feather():
+    # pyarrow is optional; without it the columnar cache of harmonized source data is skipped
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return None
+    return feather
+
+
+def _import_arrow():
+    # pyarrow (with its IPC writer) is optional, as for _import_feather
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _copy_records(records):
+    return [dict(record) if isinstance(record, dict) else record for record in records]
+
+
+def _sql_value(value):
+    # Nested summary values are stored as JSON text
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _taxogroupings_version(taxogroupings):
+    return hashlib.sha1(json.dumps(taxogroupings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _taxogroupings_dict(class_list):
+    taxogroupings = dict()
+    for tg in class_list:
+        # The first mapping listed for a class wins, as it did when stage 3 scanned the list
+        taxogroupings.setdefault(tg["taxoname"], tg["taxogroup"])
+    return taxogroupings
+
+
+def _columnar_frame(table, record_processed):
+    df_src = table.to_pandas()
+
+    # The cached file holds the processing date of the run that wrote it
+    df_src["record_processed"] = record_processed
+
+    # Arrow returns missing overrides as NaN; harmonization leaves them as None
+    df_src["itis_override_id"] = df_src["itis_override_id"].astype(object).where(
+        df_src["itis_override_id"].notna(), None
+    )
+
+    return df_src
+
+
+def _extract_source_item(sgcn, item, metadata_index):
+    # Worker for Sgcn.extract_source_items. Errors are returned rather than raised so one bad file does not take down
+    # the rest of the batch.
+    try:
+        return sgcn.process_sgcn_source_item(item, output_type="dataframe", metadata_cache=metadata_index), None
+    except Exception as e:
+        return None, "{}: {}".format(type(e).__name__, e)
 
-common_utils = pysppin.utils.Utils()
-itis_api = pysppin.itis.ItisApi()
-worms = pysppin.worms.Worms()
-pysppin_utils = pysppin.utils.Utils()
 
 class Sgcn:
     def __init__(self, operation_mode="local", cache_root=None, cache_manager=None):
@@ -24,9 +290,10 @@ class Sgcn:
         #self.sgcn_root_item = '5ef51d8082ced62aaae69f05'  OBSOLETE Don't use
 
         self.resources_path = 'resources/'
+        self.operation_mode = operation_mode
         self.cache_manager = cache_manager
 
-        self.sb = SbSession()
+        self.sb = get_sb_session()
         self.sgcn_base_item = self.get_sb_item_with_retry(self.sgcn_root_item)
 
         self.historic_national_list_file = next(
@@ -34,6 +301,9 @@ class Sgcn:
         self.sgcn_itis_overrides_file = next((f["url"] for f in self.sgcn_base_item["files"]
                                               if f["title"] == "SGCN ITIS Overrides"), None)
 
+        # Optional run-level LookupPlanner holding taxonomic summaries already resolved for this run's sppin_keys
+        self.taxa_summary_plan = None
+
         self.sppin_collections = [
             "itis",
             "worms",
@@ -66,6 +336,8 @@ class Sgcn:
             self.mq_path = f"{self.cache_base}/{self.mq_folder}"
             self.sppin_path = f"{self.cache_base}/{self.sppin_folder}"
             self.raw_data_path = f"{self.cache_base}/{self.raw_data_folder}"
+            self.metadata_files_path = f"{self.cache_base}/{self.source_metadata_folder}/files"
+            self.columnar_cache_path = f"{self.cache_base}/{self.source_data_folder}/columnar"
 
             try:
                 os.makedirs(self.cache_base)
@@ -97,31 +369,76 @@ class Sgcn:
             except FileExistsError:
                 pass
 
+            try:
+                os.makedirs(self.metadata_files_path)
+            except FileExistsError:
+                pass
+
+            try:
+                os.makedirs(self.columnar_cache_path)
+            except FileExistsError:
+                pass
+
             self.sql_metadata = pysppin.utils.Sql(cache_location=self.source_metadata_path)
             self.sql_data = pysppin.utils.Sql(cache_location=self.source_data_path)
-            self.sql_mq = pysppin.utils.Sql(cache_location=self.mq_path)
+            self.work_queue = get_work_queue(f"{self.mq_path}/work_queue.db")
+            # Messages still waiting in the queues kept by the pysppin Sql helper carry over once
+            self.work_queue.import_queues(f"{self.mq_path}/mq.db")
+            self.sppin_index = get_sppin_index(f"{self.sppin_path}/sppin_index.db")
+            # Records cached before the index existed are indexed once
+            self.sppin_index.backfill(f"{self.sppin_path}/sppin.db", self.sppin_collections)
             self.sql_sppin = pysppin.utils.Sql(cache_location=self.sppin_path)
         else:
             if self.cache_manager is None:
                 raise ValueError("When operating this system you must supply cache_manager")
             self.raw_data_path = ""
+            self.work_queue = None
+            self.sppin_index = None
+            self.metadata_files_path = os.getenv(
+                "SGCN_METADATA_CACHE",
+                os.path.join(tempfile.gettempdir(), "sgcn_meta")
+            )
+            os.makedirs(self.metadata_files_path, exist_ok=True)
+            # Pipeline stages pass their download_uri as the cache_root
+            self.columnar_cache_path = os.getenv(
+                "SGCN_COLUMNAR_CACHE",
+                os.path.join(cache_root or tempfile.gettempdir(), "sgcn_columnar")
+            )
+            os.makedirs(self.columnar_cache_path, exist_ok=True)
+
+    def __getstate__(self):
+        # Sgcn instances are shipped to extraction worker processes; the ScienceBase session and cache manager hold
+        # connections, so workers pick up their own process-wide session instead
+        state = self.__dict__.copy()
+        state["sb"] = None
+        state["cache_manager"] = None
+        state["work_queue"] = None
+        state["sppin_index"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.sb = get_sb_session()
+        if "mq_path" in state:
+            self.work_queue = get_work_queue(f"{self.mq_path}/work_queue.db")
+            self.sppin_index = get_sppin_index(f"{self.sppin_path}/sppin_index.db")
 
     def testWormsAndITISConnections(self):
-        print('Testing connection to WoRMS and ITIS...')
         try:
             res = requests.get("http://www.marinespecies.org/rest/AphiaRecordsByName/Typhlatya monae?like=false&marine_only=false&offset=")
-            print('    http GET http://www.marinespecies.org...: {}'.format(res))
+            metrics.event("remote.connection_test", source="worms", status_code=res.status_code)
             res = requests.get("https://services.itis.gov/?wt=json&rows=10&q=nameWOInd:Megaptera novaeangliae")
-            print('    http GET https://services.itis.gov...: {}'.format(res))
+            metrics.event("remote.connection_test", source="itis", status_code=res.status_code)
         except Exception as e:
-            print('    exception on http GET: {}'.format(e))
+            metrics.event("remote.connection_test", error=str(e))
 
     def cache_sgcn_metadata(self, return_data=False):
         '''
         The SGCN collection item contains a number of metadata files that help to control and augment the process of
         building the SGCN integrated database. For running this process locally, it is more efficient to cache these
         data in a Sqlite database that can be referenced rather than having to retrieve them from ScienceBase every
-        time they need to be consulted.
+        time they need to be consulted. The files themselves are read through get_metadata_file, which only downloads
+        a file when it is not already in the local metadata file cache for its current ScienceBase upload date.
 
         :param return_data: Set to true to return the actual data structures instead of just a list of tables
         :return: List of table names created in caching process
@@ -134,38 +451,17 @@ class Sgcn:
             table_list = list()
 
         for file in sgcn_collection["files"]:
-            exception = None
-            retries = 5
-            start_time = time.time()
-            for this_try in range(1, retries):
-                backoff = math.pow(2, this_try-1)
-                try:
-                    r_file = requests.get(file["url"])
-                    if r_file.status_code != 200:
-                        reason = "code ({}) {}".format(r_file.status_code, r_file.reason)
-                        raise Exception(reason)
-                    exception = None
-                    break
-                except Exception as e:
-                    print('failure to fetch : {}. Will retry {} more times...Sleeping ({})'.format(file["url"], retries - this_try, backoff))
-                    time.sleep(backoff)
-                    exception = e
-            if exception:
-                elapsed_time = "{:.2f}".format(time.time() - start_time)
-                raise Exception("({} seconds) error trying to fetch : {} : {}".format(elapsed_time, file["url"], exception))
-
-            if file["contentType"] == "text/plain":
-                data_content = list()
-                for item in r_file.text.split("\n"):
-                    data_content.append({
-                        "scientific_name": item
-                    })
-            else:
-                data_content = r_file.json()
+            data_content = self.get_metadata_file(file)
 
             if return_data:
                 table_list[file["title"]] = data_content
 
+            # Only local runs keep the metadata in sqlite; the pipeline reads it from the metadata file cache
+            if self.operation_mode != "local":
+                if not return_data:
+                    table_list.append(file["title"])
+                continue
+
             try:
                 self.sql_metadata.bulk_insert("sgcn_meta", file["title"], data_content)
                 if not return_data:
@@ -176,32 +472,174 @@ class Sgcn:
 
         return table_list
 
+    def get_metadata_file(self, file):
+        '''
+        Returns the parsed content of one of the metadata files on the SGCN collection item. Files are cached by a hash
+        of their URL and ScienceBase upload date, both in memory for the life of the process and as JSON in the
+        metadata file cache folder, so they are only downloaded again when a new version is uploaded.
+
+        :param file: File dictionary from the ScienceBase item
+        :return: List of records from the file, copied so callers can't change the cached records
+        '''
+        cache_key = hashlib.sha1(f'{file["url"]}|{file.get("dateUploaded", "")}'.encode('utf-8')).hexdigest()
+
+        if cache_key in _metadata_file_cache:
+            return _copy_records(_metadata_file_cache[cache_key])
+
+        cache_file = os.path.join(self.metadata_files_path, f"{cache_key}.json")
+
+        if os.path.isfile(cache_file):
+            with open(cache_file, "r") as f:
+                data_content = json.load(f)
+        else:
+            r_file = self.get_file_with_retry(file["url"])
+
+            if file["contentType"] == "text/plain":
+                data_content = list()
+                for item in r_file.text.split("\n"):
+                    data_content.append({
+                        "scientific_name": item
+                    })
+            else:
+                data_content = r_file.json()
+
+            # Write to a temporary file first so a concurrent reader never sees a partial file
+            temp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_file, "w") as f:
+                json.dump(data_content, f)
+            os.replace(temp_file, cache_file)
+
+        _metadata_file_cache[cache_key] = data_content
+
+        return _copy_records(data_content)
+
+    def get_file_with_retry(self, url):
+        return get_downloader().get(url)
+
+    def taxonomic_group_classes(self, metadata_cache):
+        '''
+        Builds the class to SGCN taxonomic group mapping (BCB-1556) from the Taxonomic Group Mappings metadata file.
+
+        :param metadata_cache: A dictionary of the metadata returned by cache_sgcn_metadata(return_data=True)
+        :return: List of dictionaries with taxoname (class name) and taxogroup (SGCN taxonomic group)
+        '''
+        return [
+            {'taxoname': mapping['name'], 'taxogroup': mapping['sgcntaxonomicgroup']}
+            for mapping in metadata_cache["Taxonomic Group Mappings"]
+            if mapping['rank'].lower() == "class"
+        ]
+
+    def publish_taxogroupings(self, class_list):
+        '''
+        Publishes the class to SGCN taxonomic group mapping to the cache_manager as a content addressed artifact so
+        stage 3 messages can refer to it by version instead of carrying the whole list.
+
+        :param class_list: Mapping list from taxonomic_group_classes
+        :return: Version id of the artifact (sha1 of its content)
+        '''
+        taxogroupings = _taxogroupings_dict(class_list)
+        version = _taxogroupings_version(taxogroupings)
+        self.cache_manager.add_to_cache(f"taxogroupings:{version}", taxogroupings)
+        _taxogroupings_cache[version] = taxogroupings
+
+        return version
+
+    def taxogroupings_version(self, class_list):
+        '''
+        :param class_list: Mapping list from taxonomic_group_classes
+        :return: Version id publish_taxogroupings gives the mapping, without publishing it
+        '''
+        return _taxogroupings_version(_taxogroupings_dict(class_list))
+
+    def get_taxogroupings(self, version=None, class_list=None):
+        '''
+        Returns the class to SGCN taxonomic group mapping as a dictionary, loading a published version from the
+        cache_manager once per process.
+
+        :param version: Version id from publish_taxogroupings
+        :param class_list: Mapping list carried on messages sent before mappings were published, used when there is
+        no version
+        :return: Dictionary of class name to SGCN taxonomic group
+        '''
+        if version is None:
+            return _taxogroupings_dict(class_list or [])
+
+        if version not in _taxogroupings_cache:
+            taxogroupings = self.cache_manager.get_from_cache(f"taxogroupings:{version}")
+            if taxogroupings is None:
+                raise ValueError(f"Taxonomic group mappings {version} have not been published")
+            _taxogroupings_cache[version] = taxogroupings
+
+        return _taxogroupings_cache[version]
+
     def get_sb_item_with_retry(self, sgcn_root_item):
+        cached = _sb_item_cache.get(sgcn_root_item)
+        if cached is not None and time.time() - cached[0] < SB_ITEM_TTL:
+            metrics.incr("cache.sciencebase_item.hits")
+            return cached[1]
+
+        metrics.incr("cache.sciencebase_item.misses")
         exception = None
         retries = 5
         start_time = time.time()
         for this_try in range(1,retries):
             try:
-                sgcn_collection = self.sb.get_item(sgcn_root_item)
+                metrics.incr("remote.sciencebase.calls")
+                with metrics.timer("remote.sciencebase.seconds"):
+                    sgcn_collection = self.sb.get_item(sgcn_root_item)
+                _sb_item_cache[sgcn_root_item] = (time.time(), sgcn_collection)
                 return sgcn_collection
             except Exception as e:
                 backoff = math.pow(2, this_try-1)
-                print('failure to fetch sgcn_root_item: {}. Will retry {} more times...Sleeping ({})'.format(sgcn_root_item, retries - this_try, backoff))
+                metrics.incr("remote.sciencebase.retries")
+                metrics.event(
+                    "remote.sciencebase.retry",
+                    item=sgcn_root_item,
+                    retries_left=retries - this_try,
+                    backoff=backoff,
+                    error=str(e)
+                )
                 time.sleep(backoff)
                 exception = e
         elapsed_time = "{:.2f}".format(time.time() - start_time)
         raise Exception("({} elapsed time) error trying to fetch sgcn_root_item: {} : {}".format(elapsed_time, sgcn_root_item, exception))
 
+    def build_metadata_index(self, metadata_cache):
+        '''
+        Builds a MetadataIndex from the dictionary returned by cache_sgcn_metadata(return_data=True). An existing index
+        is passed through unchanged so callers can build it once and hand it to every source item, and the index for a
+        metadata dictionary is only built once, so per-name calls to check_historic_list and check_itis_override with
+        the same dictionary reuse it. The metadata dictionary should not be changed after it has been indexed.
+
+        :param metadata_cache: A dictionary of the metadata used for processing species in the pipeline or a
+        MetadataIndex
+        :return: MetadataIndex
+        '''
+        if isinstance(metadata_cache, MetadataIndex):
+            return metadata_cache
+
+        cached = _metadata_indexes.get(id(metadata_cache))
+        if cached is not None and cached[0] is metadata_cache:
+            return cached[1]
+
+        metadata_index = MetadataIndex(metadata_cache)
+        if len(_metadata_indexes) >= METADATA_INDEXES_MAX:
+            _metadata_indexes.pop(next(iter(_metadata_indexes)))
+        _metadata_indexes[id(metadata_cache)] = (metadata_cache, metadata_index)
+
+        return metadata_index
+
     def check_historic_list(self, scientific_name, metadata_cache=None):
         '''
         This function takes a scientific name and checks to see if it was included in the 2005 SWAP list
 
         :param scientificname: Scientific name string
-        :param metadata_cache: A dictionary of the metadata used for prcessing species in the pipeline, optional
+        :param metadata_cache: A dictionary of the metadata used for prcessing species in the pipeline (or a
+        MetadataIndex built from it), optional
         :return: True if the name is in the historic list, otherwise False
         '''
         if metadata_cache:
-            return len([spec for spec in metadata_cache["Historic 2005 SWAP National List"] if spec["scientific_name"] == scientific_name]) > 0
+            return self.build_metadata_index(metadata_cache).is_historic(scientific_name)
 
         check_records = self.sql_metadata.get_select_records(
             "sgcn_meta",
@@ -221,14 +659,12 @@ class Sgcn:
         ITIS identifier to be used in lieu of name lookup.
 
         :param scientific_name: Scientific name string
-        :param metadata_cache: A dictionary of the metadata used for prcessing species in the pipeline, optional
+        :param metadata_cache: A dictionary of the metadata used for prcessing species in the pipeline (or a
+        MetadataIndex built from it), optional
         :return: ITIS TSN identifier in URL form
         '''
         if metadata_cache:
-            records = [spec for spec in metadata_cache["SGCN ITIS Overrides"] if spec["ScientificName_original"] == scientific_name]
-            if len(records):
-                return records[0]["taxonomicAuthorityID"]
-            return None
+            return self.build_metadata_index(metadata_cache).itis_override(scientific_name)
 
         check_records = self.sql_metadata.get_select_records(
             "sgcn_meta",
@@ -246,7 +682,8 @@ class Sgcn:
         '''
         After having some trouble crop up occasionally where reading files from ScienceBase came up with a urlopen
         error, this function takes another approach of simply trying to get all files and download them to a local
-        cache.
+        cache. Files are downloaded concurrently through the shared Downloader and are only fetched again when their
+        ScienceBase upload date (or ETag) changes.
 
         :return: List of files cached
         '''
@@ -258,29 +695,50 @@ class Sgcn:
             "file_download_errors": list()
         }
 
-        for item in processable_items:
-            file_name = item["source_file_url"].split("%2F")[-1]
-            file_path = f"{self.raw_data_path}/{file_name}"
+        jobs = [
+            {
+                "url": item["source_file_url"],
+                "file_path": f'{self.raw_data_path}/{item["source_file_url"].split("%2F")[-1]}',
+                "source_file_date": item["source_file_date"],
+                "sciencebase_item_id": item["sciencebase_item_id"]
+            }
+            for item in processable_items
+        ]
 
-            if os.path.isfile(file_path):
-                report["files_in_cache"].append(file_path)
+        for job, status, exception in get_downloader().download_many(jobs):
+            if exception is not None:
+                report["file_download_errors"].append(job["sciencebase_item_id"])
+            elif status == "written":
+                report["files_written"].append(job["file_path"])
             else:
-                try:
-                    item_file_content = requests.get(item["source_file_url"])
-                    report["files_written"].append(file_path)
-                    with open(file_path, "w") as f:
-                        f.write(item_file_content.text)
-                        f.close()
-                except:
-                    report["file_download_errors"].append(item["sciencebase_item_id"])
-                    pass
+                report["files_in_cache"].append(job["file_path"])
 
         return report
 
     def get_processable_items(self):
         '''
         Retrieves the items from the ScienceBase collection that have the necessary parameters for processing. It
-        checks a process log (not yet in place) to determine whether or not the Process File has already been processed.
+        checks the processing log to determine whether or not the Process File has already been processed.
+
+        :return: Summarized list of items with just the properties necessary to run the process
+        '''
+        ledger = None
+        if self.get_ledger() is not None:
+            sgcn_meta = self.cache_sgcn_metadata(return_data=True)
+            ledger = self.get_ledger(
+                self.build_metadata_index(sgcn_meta).version,
+                self.taxogroupings_version(self.taxonomic_group_classes(sgcn_meta))
+            )
+
+        return [
+            i for i in self.get_sgcn_source_items()
+            if self.check_source_url(i["source_file_url"], i["source_file_date"], ledger) is None
+        ]
+
+    def get_sgcn_source_items(self):
+        '''
+        Retrieves every item from the ScienceBase collection that has the necessary parameters for processing,
+        whether or not it has already been processed.
 
         :return: Summarized list of items with just the properties necessary to run the process
         '''
@@ -311,33 +769,41 @@ class Sgcn:
             if next((f for f in i["files"] if f["title"] == "Process File"), None) is not None
         ]
 
-        unprocessed_items = [i for i in processable_sgcn_items if self.check_source_url(i["source_file_url"]) is None]
+        return processable_sgcn_items
 
-        return unprocessed_items
-
-    def get_schema(self, schema):
-        schema_file = pkg_resources.resource_filename('pysgcn', f'resources/{schema}.json')
+    def get_ledger(self, metadata_version=None, taxogroupings_version=None):
+        '''
+        :param metadata_version: MetadataIndex.version of the metadata in use; needed to read or add ledger entries
+        :param taxogroupings_version: Version of the taxonomic group mappings in use; needed to read or add ledger
+        entries
+        :return: ProcessingLedger over the pipeline cache_manager, or None outside of the pipeline or when the
+        cache_manager is only a placeholder (e.g. the one used by validate_sgcn_input)
+        '''
+        if not hasattr(self.cache_manager, "get_from_cache"):
+            return None
 
-        with open(schema_file, "r") as f:
-            schema = json.load(f)
-            f.close()
+        return ProcessingLedger(self.cache_manager, metadata_version, taxogroupings_version)
 
-        return schema
+    def get_schema(self, schema):
+        return load_schema(schema)
 
-    def check_source_url(self, source_file_url):
+    def check_source_url(self, source_file_url, source_file_date=None, ledger=None):
         '''
-        This is intended to check a processing log that doesn't yet exist to see if an item's file has already been
-        processed. It should shift to using an API that takes the item and returns an existing processing provenance
-        record. The parameters used here are the source file URL and the source file date. We could probably get away
-        with just using the URL as that should be unique in the ScienceBase architecture today for any new file loaded
-        to the items. In future, though, we may have some other source platform that would need to combine a date on a
-        file with some other parameter.
-
-        :param item: Simplified SGCN source item dictionary
-        :return: Intended to return a process log record if an item has been processed; otherwise returns None
+        Checks the processing log to see if an item's file has already been processed. In the pipeline this is the
+        ProcessingLedger, keyed by the source file URL and the source file date so that a file re-uploaded to the
+        item is processed again, and by the metadata versions the ledger was built with. Setting SGCN_FULL_REBUILD
+        makes every file look unprocessed. Locally the sgcn table is checked by source file URL.
+
+        :param source_file_url: URL of the item's source file
+        :param source_file_date: Upload date of the item's source file (used in the pipeline)
+        :param ledger: ProcessingLedger from get_ledger with the current metadata versions (used in the pipeline)
+        :return: The process log record (ledger entry) if the file has been processed; otherwise returns None
         '''
-        if self.cache_manager: # in the pipeline we always process all files
-            return None
+        if self.cache_manager:
+            ledger = ledger or self.get_ledger()
+            if ledger is None or FULL_REBUILD or source_file_date is None:
+                return None
+            return ledger.get_entry(source_file_url, source_file_date)
 
         return self.sql_data.get_select_records(
             "sgcn",
@@ -352,6 +818,47 @@ class Sgcn:
         else:
             return f"Scientific Name:{scientific_name}"
 
+    def build_sppin_keys(self, clean_scientific_names, itis_override_ids):
+        '''
+        Vectorized form of build_sppin_key that works on whole columns of a source dataframe.
+
+        :param clean_scientific_names: Series of cleaned scientific name strings
+        :param itis_override_ids: Series of ITIS override identifiers in URL form (None where there is no override)
+        :return: Series of sppin_key strings aligned to the input
+        '''
+        has_override = itis_override_ids.notna()
+        tsn = itis_override_ids.astype(object).where(has_override, "").astype(str).str.split(":").str[-1]
+
+        return pd.Series(
+            np.where(
+                has_override,
+                "TSN:" + tsn,
+                # map(str) rather than astype(str), which leaves missing names as NaN in newer pandas instead of
+                # "nan" as build_sppin_key makes them
+                "Scientific Name:" + clean_scientific_names.map(str)
+            ),
+            index=clean_scientific_names.index,
+            dtype=object
+        )
+
+    def clean_scientific_name(self, scientific_name):
+        return get_pysppin_helper("common_utils").clean_scientific_name(scientific_name)
+
+    def clean_scientific_names(self, scientific_names):
+        '''
+        Applies the pysppin clean_scientific_name function to a column of names, running it only once for each
+        distinct value so the result is identical to cleaning every row.
+
+        :param scientific_names: Series of raw scientific name values
+        :return: Series of cleaned scientific name strings aligned to the input
+        '''
+        cleaned = {
+            name: self.clean_scientific_name(name)
+            for name in scientific_names.drop_duplicates()
+        }
+
+        return scientific_names.map(cleaned).astype(object)
+
     def process_sgcn_source_item(self, item, output_type="dict", metadata_cache=None):
         '''
         This function handles the process of pulling a source file from ScienceBase, reading the specified file via
@@ -361,23 +868,184 @@ class Sgcn:
 
         :param item: Dictionary containing the summarized item message created and queued in the
         get_processable_items function
-        :param output_type: Can be one of - dict, dataframe, or json - defaults to dict
-        :param metadata_cache: A dictionary of the metadata used for prcessing species in the pipeline, optional
+        :param output_type: Can be one of - dict, dataframe, json, or iter - defaults to dict. iter returns a
+        generator that reads the file in chunks and yields harmonized record dictionaries one at a time.
+        :param metadata_cache: A dictionary of the metadata used for prcessing species in the pipeline (or a
+        MetadataIndex built from it), optional
         :return: Returns a flattened data structure/table in one of a few specified formats
         '''
+        metadata_index = self.build_metadata_index(metadata_cache) if metadata_cache else None
+
+        if output_type == "iter":
+            if EXTRACT_ENGINE == "csv":
+                return (record for records in self.iter_source_records(item, metadata_index) for record in records)
+            return (
+                record
+                for df_chunk in self.iter_source_frames(item, metadata_index)
+                for record in df_chunk.to_dict("records")
+            )
+
+        # Harmonized data is kept in a columnar (Feather) file per source file version, so re-runs against unchanged
+        # ScienceBase files skip parsing and harmonization
+        columnar_file = self.columnar_cache_file(item, metadata_index) if metadata_index else None
+        df_src = self.read_columnar_cache(columnar_file, datetime.utcnow().isoformat()) if columnar_file else None
+
+        if df_src is None:
+            df_src = self.harmonize_source_item(item, metadata_index)
+            if columnar_file:
+                self.write_columnar_cache(df_src, columnar_file)
+
+        if output_type == "dataframe":
+            return df_src
+        elif output_type == "dict":
+            return df_src.to_dict("records")
+        elif output_type == "json":
+            return df_src.to_json(orient="records")
+
+    def harmonize_source_item(self, item, metadata_index=None):
+        '''
+        Reads a source file into a dataframe and harmonizes its columns for process_sgcn_source_item.
+
+        :param item: Dictionary containing the summarized item message created and queued in the
+        get_processable_items function
+        :param metadata_index: MetadataIndex for historic list and ITIS override lookups; when None these are looked
+        up in the local metadata database
+        :return: Harmonized dataframe
+        '''
+        df_src = next(self.read_source_file(item))
+
+        return self.harmonize_source_frame(df_src, item, metadata_index, datetime.utcnow().isoformat())
+
+    def iter_source_frames(self, item, metadata_index=None, chunksize=None, processing_metadata=None):
+        '''
+        Reads a source file in chunks and yields each chunk harmonized, so only one chunk of the file is held in
+        memory at a time. A columnar cache file for the item is read in slices instead when one exists, and otherwise
+        written from the chunks as they go by.
+
+        :param item: Dictionary containing the summarized item message created and queued in the
+        get_processable_items function
+        :param metadata_index: MetadataIndex for historic list and ITIS override lookups, optional
+        :param chunksize: Number of rows per chunk, defaults to SGCN_CHUNK_SIZE
+        :param processing_metadata: Dictionary that the detected encoding is added to, optional
+        :return: Generator of harmonized dataframes
+        '''
+        chunksize = chunksize or SOURCE_CHUNK_SIZE
+
+        columnar_file = self.columnar_cache_file(item, metadata_index) if metadata_index else None
+        if columnar_file:
+            cached_chunks = self.iter_columnar_cache(columnar_file, chunksize, datetime.utcnow().isoformat())
+            if cached_chunks is not None:
+                yield from cached_chunks
+                return
+
+        record_processed = datetime.utcnow().isoformat()
+        df_chunks = (
+            self.harmonize_source_frame(df_chunk, item, metadata_index, record_processed)
+            for df_chunk in self.read_source_file(item, chunksize, processing_metadata)
+        )
+
+        if columnar_file:
+            df_chunks = self.write_columnar_chunks(df_chunks, columnar_file)
+
+        yield from df_chunks
+
+    def iter_source_chunks(self, item, metadata_index=None, chunksize=None, processing_metadata=None):
+        '''
+        Yields the harmonized chunks of a source file from the configured extraction engine (SGCN_EXTRACT_ENGINE):
+        dataframes from pandas, or lists of record dictionaries from the csv engine.
+
+        :param item: Summarized item dictionary
+        :param metadata_index: MetadataIndex for historic list and ITIS override lookups, optional
+        :param chunksize: Number of rows per chunk, defaults to SGCN_CHUNK_SIZE
+        :param processing_metadata: Dictionary that details of how the file was read (its encoding) are added to
+        :return: Generator of dataframes or lists of record dictionaries
+        '''
+        if EXTRACT_ENGINE == "csv":
+            return self.iter_source_records(item, metadata_index, chunksize, processing_metadata)
+        return self.iter_source_frames(item, metadata_index, chunksize, processing_metadata)
+
+    def iter_source_records(self, item, metadata_index=None, chunksize=None, processing_metadata=None):
+        '''
+        Reads and harmonizes a source file with the pandas-free tsv_engine, applying the same rules as
+        harmonize_source_frame.
+
+        :param item: Summarized item dictionary
+        :param metadata_index: MetadataIndex for historic list and ITIS override lookups, optional
+        :param chunksize: Number of rows per chunk, defaults to SGCN_CHUNK_SIZE
+        :param processing_metadata: Dictionary that the detected encoding is added to, optional
+        :return: Generator of lists of harmonized record dictionaries
+        '''
+        data = self.read_source_bytes(item)
+        encoding = tsv_engine.detect_encoding(data)
+        if processing_metadata is not None:
+            processing_metadata["encoding"] = encoding
+
+        text = tsv_engine.decode_source(data, encoding)
+        record_processed = datetime.utcnow().isoformat()
+        clean_names = dict()
+
+        for records in tsv_engine.read_tsv_records(text, chunksize or SOURCE_CHUNK_SIZE):
+            yield tsv_engine.harmonize_records(self, records, item, metadata_index, record_processed, clean_names)
+
+    def source_file_access_path(self, item):
+        '''
+        :param item: Summarized item dictionary
+        :return: Path of the item's source file in the raw data cache if it is there, otherwise its URL
+        '''
         file_name = item["source_file_url"].split("%2F")[-1]
         file_path = f"{self.raw_data_path}/{file_name}"
 
         if os.path.isfile(file_path):
-            file_access_path = file_path
-        else:
-            file_access_path = item["source_file_url"]
+            return file_path
 
-        try:
-            df_src = pd.read_csv(file_access_path, delimiter="\t")
-        except UnicodeDecodeError:
-            df_src = pd.read_csv(file_access_path, delimiter="\t", encoding='latin1')
+        return item["source_file_url"]
+
+    def read_source_bytes(self, item):
+        '''
+        :param item: Summarized item dictionary
+        :return: Content of the item's source file
+        '''
+        file_access_path = self.source_file_access_path(item)
+
+        if os.path.isfile(file_access_path):
+            with open(file_access_path, "rb") as f:
+                return f.read()
+
+        return self.get_file_with_retry(file_access_path).content
+
+    def read_source_file(self, item, chunksize=None, processing_metadata=None):
+        '''
+        Reads a source file, from the raw data cache if it is there or otherwise from its URL, as tab delimited text.
+        The file is fetched once into memory, its encoding detected from the bytes (UTF-8, or latin1 for files that
+        aren't valid UTF-8), and parsed once from that buffer.
+
+        :param item: Summarized item dictionary
+        :param chunksize: Number of rows per chunk; None reads the whole file as one dataframe
+        :param processing_metadata: Dictionary that the detected encoding is added to, optional
+        :return: Generator of raw dataframes
+        '''
+        data = self.read_source_bytes(item)
+        encoding = tsv_engine.detect_encoding(data)
+        if processing_metadata is not None:
+            processing_metadata["encoding"] = encoding
+
+        if chunksize is None:
+            yield pd.read_csv(io.BytesIO(data), delimiter="\t", encoding=encoding)
+            return
 
+        yield from pd.read_csv(io.BytesIO(data), delimiter="\t", encoding=encoding, chunksize=chunksize)
+
+    def harmonize_source_frame(self, df_src, item, metadata_index, record_processed):
+        '''
+        Harmonizes the columns of a source dataframe (the whole file or one chunk of it).
+
+        :param df_src: Dataframe read from a source file
+        :param item: Summarized item dictionary
+        :param metadata_index: MetadataIndex for historic list and ITIS override lookups; when None these are looked
+        up in the local metadata database
+        :param record_processed: Processing date to set on every record
+        :return: Harmonized dataframe
+        '''
         # Make lower case columns to deal with slight variation in source files
         df_src.columns = map(str.lower, df_src.columns)
 
@@ -385,7 +1053,7 @@ class Sgcn:
         df_src["sciencebase_item_id"] = item["sciencebase_item_id"]
 
         # Include a processing date
-        df_src["record_processed"] = datetime.utcnow().isoformat()
+        df_src["record_processed"] = record_processed
 
         # Set the file date and url from the ScienceBase file to each record in the dataset for future reference
         df_src["source_file_date"] = item["source_file_date"]
@@ -412,31 +1080,184 @@ class Sgcn:
             df_src.rename(columns={"taxonomy group (use drop down box)": "taxonomic category"}, inplace=True)
 
         # Make sure blank common name and taxonomic category values are "", otherwise their value is NaN (invalid json)
-        df_src["common name"] = df_src.apply(lambda x: "" if isinstance(x["common name"], float) else x["common name"], axis=1)
-        df_src["taxonomic category"] = df_src.apply(lambda x: "" if isinstance(x["taxonomic category"], float) else x["taxonomic category"], axis=1)
+        df_src["common name"] = df_src["common name"].astype(object).fillna("")
+        df_src["taxonomic category"] = df_src["taxonomic category"].astype(object).fillna("")
+
+        # Clean up the scientific name string for lookup by applying the function from bis_utils. Names repeat heavily
+        # across a file, so the function is run once per distinct name and the result joined back onto the column.
+        df_src["clean_scientific_name"] = self.clean_scientific_names(df_src["scientific name"])
+
+        if metadata_index:
+            # Check the historic list and flag any species names that should be considered part of the 2005 National
+            # List
+            df_src["historic_list"] = df_src["scientific name"].isin(metadata_index.historic_names)
+
+            # Check to see if there is an explicit ITIS identifier that should be applied to the species name (ITIS
+            # Overrides). Names without an override come back from the join as NaN and are set to None.
+            itis_override_id = df_src["scientific name"].map(metadata_index.itis_overrides).astype(object)
+            df_src["itis_override_id"] = itis_override_id.where(itis_override_id.notna(), None)
+        else:
+            df_src["historic_list"] = df_src.apply(lambda x: self.check_historic_list(x["scientific name"]), axis=1)
+            df_src["itis_override_id"] = df_src.apply(lambda x: self.check_itis_override(x["scientific name"]), axis=1)
+
+        # Set up the search_key property for use in linking other discovered data from sppin processing
+        df_src["sppin_key"] = self.build_sppin_keys(df_src["clean_scientific_name"], df_src["itis_override_id"])
 
-        # Clean up the scientific name string for lookup by applying the function from bis_utils
-        df_src["clean_scientific_name"] = df_src.apply(
-            lambda x: common_utils.clean_scientific_name(x["scientific name"]),
-            axis=1)
+        return df_src
 
-        # Check the historic list and flag any species names that should be considered part of the 2005 National List
-        df_src["historic_list"] = df_src.apply(lambda x: self.check_historic_list(x["scientific name"], metadata_cache), axis=1)
+    def columnar_cache_file(self, item, metadata_index):
+        '''
+        :param item: Summarized item dictionary
+        :param metadata_index: MetadataIndex the data is harmonized with
+        :return: Path of the columnar cache file for this version of the item's source file and metadata
+        '''
+        cache_key = hashlib.sha1(
+            f'{item["source_file_url"]}|{item["source_file_date"]}|{metadata_index.version}'.encode('utf-8')
+        ).hexdigest()
 
-        # Check to see if there is an explicit ITIS identifier that should be applied to the species name (ITIS Overrides)
-        df_src["itis_override_id"] = df_src.apply(lambda x: self.check_itis_override(x["scientific name"], metadata_cache), axis=1)
+        return os.path.join(self.columnar_cache_path, f"{cache_key}.feather")
 
-        # Set up the search_key property for use in linking other discovered data from sppin processing
-        df_src["sppin_key"] = df_src.apply(
-            lambda x: self.build_sppin_key(x["clean_scientific_name"], x["itis_override_id"]), axis=1
+    def read_columnar_cache(self, columnar_file, record_processed):
+        '''
+        Reads a harmonized dataframe from the columnar cache through a memory map.
+
+        :param columnar_file: Path from columnar_cache_file
+        :param record_processed: Processing date to set on every record, replacing the one the file was written with
+        :return: Dataframe, or None if the file is not cached or pyarrow is not installed
+        '''
+        feather = _import_feather()
+        if feather is None or not os.path.isfile(columnar_file):
+            return None
+
+        return _columnar_frame(feather.read_table(columnar_file, memory_map=True), record_processed)
+
+    def iter_columnar_cache(self, columnar_file, chunksize, record_processed):
+        '''
+        Reads a harmonized dataframe from the columnar cache in slices of the memory mapped table.
+
+        :param columnar_file: Path from columnar_cache_file
+        :param chunksize: Number of rows per slice
+        :param record_processed: Processing date to set on every record, replacing the one the file was written with
+        :return: Generator of dataframes, or None if the file is not cached or pyarrow is not installed
+        '''
+        feather = _import_feather()
+        if feather is None or not os.path.isfile(columnar_file):
+            return None
+
+        table = feather.read_table(columnar_file, memory_map=True)
+
+        return (
+            _columnar_frame(table.slice(offset, chunksize), record_processed)
+            for offset in range(0, table.num_rows, chunksize)
         )
 
-        if output_type == "dataframe":
-            return df_src
-        elif output_type == "dict":
-            return df_src.to_dict("records")
-        elif output_type == "json":
-            return df_src.to_json(orient="records")
+    def fill_columnar_cache(self, item, metadata_index):
+        '''
+        Reads and harmonizes a source file into the columnar cache without keeping the data, so later reads of the
+        item come from the cache.
+
+        :param item: Summarized item dictionary
+        :param metadata_index: MetadataIndex the data is harmonized with
+        :return: True if the item is in the columnar cache
+        '''
+        if _import_arrow() is None:
+            return False
+
+        columnar_file = self.columnar_cache_file(item, metadata_index)
+        if not os.path.isfile(columnar_file):
+            for df_chunk in self.iter_source_frames(item, metadata_index):
+                pass
+
+        return os.path.isfile(columnar_file)
+
+    def write_columnar_cache(self, df_src, columnar_file):
+        '''
+        Writes a harmonized dataframe to the columnar cache as an uncompressed Feather (Arrow IPC) file so it can be
+        memory mapped on read. Dataframes Arrow cannot represent (e.g. mixed type columns) are simply not cached.
+
+        :param df_src: Harmonized dataframe
+        :param columnar_file: Path from columnar_cache_file
+        :return: True if the file was written
+        '''
+        feather = _import_feather()
+        if feather is None:
+            return False
+
+        temp_file = f"{columnar_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            feather.write_feather(df_src.reset_index(drop=True), temp_file, compression="uncompressed")
+            os.replace(temp_file, columnar_file)
+        except Exception:
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+            return False
+
+        return True
+
+    def write_columnar_chunks(self, df_chunks, columnar_file):
+        '''
+        Passes harmonized chunks through while writing them to the columnar cache as the record batches of one
+        uncompressed Arrow IPC (Feather) file. The file is only put in place once the last chunk has been written, so
+        a read that stops early, or chunks that don't fit the schema of the first chunk (e.g. a column that is empty
+        in the first chunk and text in a later one), leave no cache file.
+
+        :param df_chunks: Iterable of harmonized dataframes
+        :param columnar_file: Path from columnar_cache_file
+        :return: Generator of the same dataframes
+        '''
+        pa = _import_arrow()
+        if pa is None:
+            yield from df_chunks
+            return
+
+        temp_file = f"{columnar_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        writer = None
+        schema = None
+        writing = True
+        try:
+            for df_chunk in df_chunks:
+                if writing:
+                    try:
+                        table = pa.Table.from_pandas(df_chunk, schema=schema, preserve_index=False)
+                        if writer is None:
+                            schema = table.schema
+                            writer = pa.ipc.new_file(temp_file, schema)
+                        writer.write_table(table)
+                    except Exception:
+                        writing = False
+
+                yield df_chunk
+
+            if writing and writer is not None:
+                writer.close()
+                writer = None
+                os.replace(temp_file, columnar_file)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+
+    def extract_source_items(self, items, metadata_cache=None, max_workers=None):
+        '''
+        Runs process_sgcn_source_item for many state/year items in parallel worker processes. Reading and harmonizing
+        the source files is CPU bound, so this scales with the number of cores.
+
+        :param items: List of summarized item dictionaries from get_processable_items
+        :param metadata_cache: A dictionary of the metadata used for processing species in the pipeline (or a
+        MetadataIndex built from it), optional
+        :param max_workers: Number of worker processes, defaults to the number of CPUs
+        :return: Generator of (item, dataframe, error) tuples in the same order as items; dataframe is None and error
+        holds the error message when a file could not be processed
+        '''
+        metadata_index = self.build_metadata_index(metadata_cache) if metadata_cache else None
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_extract_source_item, self, item, metadata_index) for item in items]
+
+            for item, future in zip(items, futures):
+                df_src, error = future.result()
+                yield item, df_src, error
 
     def cache_item_data(self, item, send_record_to_mq=True, send_spp_to_mq=True):
         '''
@@ -456,22 +1277,10 @@ class Sgcn:
         dataset = self.process_sgcn_source_item(item)
 
         if send_record_to_mq:
-            for record in dataset:
-                self.sql_mq.insert_record(
-                    db_name="mq",
-                    table_name="mq_source_records",
-                    record=record,
-                    mq=True
-                )
+            self.queue_message("mq_source_records", dataset)
 
         if send_spp_to_mq:
-            for msg in self.sppin_messages(dataset=dataset):
-                self.sql_mq.insert_record(
-                    db_name="mq",
-                    table_name="mq_itis_check",
-                    record=msg,
-                    mq=True
-                )
+            self.queue_message("mq_itis_check", self.sppin_messages(dataset=dataset))
 
         return dataset
 
@@ -547,6 +1356,87 @@ class Sgcn:
 
         return message_body["sppin_key"], sppin_key_parts[0], sppin_key_parts[1], sppin_data
 
+    def check_sppin_keys(self, sppin_keys, sppin_collections=None, max_age_days=30):
+        '''
+        Batched version of the check in check_sppin_key: finds which of many sppin_keys already have a current record
+        in each of the specified Species Information containers using the sppin_index, a handful of queries per call.
+        The index covers records cached before it existed through SppinIndex.backfill.
+
+        :param sppin_keys: List of sppin_keys
+        :param sppin_collections: List of the SppIn collections to check
+        :param max_age_days: Records older than this are not considered current
+        :return: Dictionary of sppin_key to a dictionary of collection to the date of the current record, or None
+        '''
+        if sppin_collections is None:
+            sppin_collections = self.sppin_collections
+
+        return self.sppin_index.probe(sppin_keys, sppin_collections, max_age_days)
+
+    def drain_sppin_queue(self, message_queue, sppin_source, batch_size=100, max_age_days=30, max_workers=1):
+        '''
+        Processes every available message on a SppIn queue (e.g. mq_itis_check). Messages are leased in batches and
+        each batch is checked against the cache with a single check_sppin_keys call; messages for names that are
+        already cached are deleted without further lookups and the rest go through process_sppin_source_search_term.
+        Only one batch is leased at a time, so leases don't expire while earlier messages are still being looked up.
+        Messages are acked and released with their lease, so a message whose lease expired and was claimed by another
+        worker is left to that worker; a message that fails is released to be retried and, after the queue's
+        max_attempts, dead lettered.
+
+        :param message_queue: the name of the message queue to process
+        :param sppin_source: the species information source to operate against
+        :param batch_size: Number of messages to lease at a time
+        :param max_age_days: Cached records older than this are looked up again
+        :param max_workers: Number of threads looking up the messages in a batch
+        :return: Dictionary with counts of messages already cached, processed, and failed
+        '''
+        report = {"already_cached": 0, "processed": 0, "failed": 0}
+
+        def process_message(message):
+            try:
+                self.process_sppin_source_search_term(
+                    message_queue,
+                    sppin_source,
+                    message_id=message["id"],
+                    message_body=message["body"],
+                    lease_id=message["lease_id"]
+                )
+                return "processed"
+            except Exception as e:
+                # Retried on a later lease; messages that keep failing end up in mq_invalid_source
+                metrics.event(
+                    "drain_sppin_queue.error",
+                    queue=message_queue,
+                    sppin_key=message["body"].get("sppin_key"),
+                    error=str(e)
+                )
+                self.release_message(message_queue, message["id"], delay=60, lease_id=message["lease_id"])
+                return "failed"
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            messages = self.get_messages(message_queue, batch_size)
+            while messages:
+                current = self.check_sppin_keys(
+                    [m["body"]["sppin_key"] for m in messages if "sppin_key" in m["body"]],
+                    sppin_collections=[sppin_source],
+                    max_age_days=max_age_days
+                )
+
+                cached_ids = {
+                    m["id"] for m in messages
+                    if current.get(m["body"].get("sppin_key"), {}).get(sppin_source) is not None
+                }
+                if cached_ids:
+                    # A batch is claimed with one lease
+                    self.delete_message(message_queue, list(cached_ids), messages[0]["lease_id"])
+                    report["already_cached"] += len(cached_ids)
+
+                for outcome in executor.map(process_message, [m for m in messages if m["id"] not in cached_ids]):
+                    report[outcome] += 1
+
+                messages = self.get_messages(message_queue, batch_size)
+
+        return report
+
     def process_itis_result(self, itis_result):
         '''
         This function processes a set of results from ITIS to summarize data for use in SGCN, extract additional names
@@ -657,7 +1547,9 @@ class Sgcn:
 
         return worms_summary_msg, name_queue
 
-    def process_sppin_source_search_term(self, message_queue, sppin_source, message_id=None, message_body=None):
+    def process_sppin_source_search_term(
+        self, message_queue, sppin_source, message_id=None, message_body=None, lease_id=None
+    ):
         '''
         This function operates any of the basic pySppIn gatherers that use the sppin_key parameter to lookup by
         Scientific Name or ITIS TSN. It fires the check_sppin_key function to both parse the sppin_key parameter and
@@ -669,6 +1561,7 @@ class Sgcn:
         :param message_id: identifier for the message containing the search term (if None, the function will fire the
         get_message function to attempt to retrieve a message from the specified queue to process)
         :param message_body: body of the message containing the search term and other details
+        :param lease_id: Lease the message was claimed with; the message is only deleted if that lease still holds it
         :return: Text string indicating whether or not anything was found and cached or if a record already existed
         when the function ran
         '''
@@ -682,18 +1575,16 @@ class Sgcn:
 
             message_id = message["id"]
             message_body = message["body"]
+            lease_id = message["lease_id"]
 
-        try:
-            sppin_key, sppin_key_type, sppin_key_value, sppin_data = self.check_sppin_key(
-                message_body,
-                sppin_collections=[sppin_source]
-            )
-        except Exception as e:
-            return e
+        sppin_key, sppin_key_type, sppin_key_value, sppin_data = self.check_sppin_key(
+            message_body,
+            sppin_collections=[sppin_source]
+        )
 
         if sppin_data[sppin_source] is not None:
             try:
-                self.delete_message(message_queue, message_id)
+                self.delete_message(message_queue, message_id, lease_id)
             except:
                 pass
             return f"ALREADY CACHED: {sppin_key}"
@@ -711,7 +1602,7 @@ class Sgcn:
 
         # Run the different types of pysppin processors
         if sppin_source == "itis":
-            source_results = pysppin.itis.ItisApi().search(
+            source_results = get_pysppin_helper("itis_api").search(
                 sppin_key,
                 name_source=name_source,
                 source_date=source_date
@@ -720,7 +1611,7 @@ class Sgcn:
             taxa_summary_msg, name_queue, worms_queue = self.process_itis_result(source_results)
 
         elif sppin_source == "worms":
-            source_results = pysppin.worms.Worms().search(
+            source_results = get_pysppin_helper("worms").search(
                 sppin_key,
                 name_source="SGCN",
                 source_date=source_date
@@ -782,7 +1673,7 @@ class Sgcn:
 
         # Delete processed message
         try:
-            self.delete_message(message_queue, message_id)
+            self.delete_message(message_queue, message_id, lease_id)
         except:
             pass
 
@@ -796,35 +1687,68 @@ class Sgcn:
         :param record:
         :return: nothing
         '''
-        schema = self.get_schema("sgcn_source_records_schema")
-
-        for record in pysppin_utils.validate_data(record, schema):
-            if record["valid"]:
-                self.sql_data.insert_record("sgcn", "sgcn", record["record"], mq=False)
-            else:
-                self.queue_message(queue_name="mq_invalid_source", message=record["record"])
+        if self.validate_data(record):
+            self.sql_data.insert_record("sgcn", "sgcn", record, mq=False)
+        else:
+            self.queue_message(queue_name="mq_invalid_source", message=record)
 
     def queue_message(self, queue_name, message):
-        if isinstance(queue_name, str):
-            if isinstance(message, dict):
-                self.sql_mq.insert_record("mq", queue_name, message, mq=True)
-            elif isinstance(message, list):
-                for msg in message:
-                    self.sql_mq.insert_record("mq", queue_name, msg, mq=True)
-
-        elif isinstance(queue_name, list):
-            for q in queue_name:
-                if isinstance(message, dict):
-                    self.sql_mq.insert_record("mq", q, message, mq=True)
-                elif isinstance(message, list):
-                    for msg in message:
-                        self.sql_mq.insert_record("mq", q, msg, mq=True)
-
-    def get_message(self, queue_name):
-        return self.sql_mq.get_single_record("mq", queue_name)
-
-    def delete_message(self, queue_name, identifier):
-        return self.sql_mq.delete_record("mq", queue_name, identifier)
+        '''
+        Adds one or more messages to one or more queues in a single batch.
+
+        :param queue_name: Queue name or list of queue names
+        :param message: Message dictionary or list of message dictionaries
+        :return: Number of messages queued
+        '''
+        return self.work_queue.enqueue(queue_name, message)
+
+    def get_message(self, queue_name, visibility_timeout=None):
+        '''
+        Leases the next available message from a queue. The message is hidden from other consumers until it is deleted
+        with delete_message or the visibility timeout passes.
+
+        :param queue_name: Queue to get a message from
+        :param visibility_timeout: Seconds to hold the message, optional
+        :return: Message dictionary with id and body, or None if the queue has no available messages
+        '''
+        messages = self.work_queue.lease(queue_name, 1, visibility_timeout)
+        return messages[0] if messages else None
+
+    def get_messages(self, queue_name, max_messages=100, visibility_timeout=None):
+        '''
+        Leases a batch of available messages from a queue.
+
+        :param queue_name: Queue to get messages from
+        :param max_messages: Maximum number of messages to lease
+        :param visibility_timeout: Seconds to hold the messages, optional
+        :return: List of message dictionaries with id and body
+        '''
+        return self.work_queue.lease(queue_name, max_messages, visibility_timeout)
+
+    def delete_message(self, queue_name, identifier, lease_id=None):
+        '''
+        Acknowledges (removes) processed messages.
+
+        :param queue_name: Queue the message was leased from
+        :param identifier: Message id or list of message ids
+        :param lease_id: Lease the message was claimed with; when given, a message whose lease has expired and been
+        claimed by another consumer is left alone
+        :return: Number of messages removed
+        '''
+        return self.work_queue.ack(queue_name, identifier, lease_id)
+
+    def release_message(self, queue_name, identifier, delay=0, lease_id=None):
+        '''
+        Returns leased messages to the queue to be retried after delay seconds. Messages that keep failing are moved
+        to the mq_invalid_source dead letter queue.
+
+        :param queue_name: Queue the message was leased from
+        :param identifier: Message id or list of message ids
+        :param delay: Seconds before the message can be leased again
+        :param lease_id: Lease the message was claimed with; when given, a message whose lease has expired and been
+        claimed by another consumer is left alone
+        '''
+        return self.work_queue.nack(queue_name, identifier, delay, lease_id)
 
     def get_records_by_sppin_key(self, sppin_key, ids_only=False):
         records = self.sql_data.get_select_records(
@@ -867,6 +1791,124 @@ class Sgcn:
             identifiers=ids_to_update
         )
 
+    def bulk_update_taxa_summary_data(self, updates):
+        '''
+        Infuses taxonomic authority summary properties into master SGCN records for a batch of sppin_keys in one
+        transaction. The summaries are loaded into a temporary table and applied with a single UPDATE ... FROM joined
+        on sppin_key (on SQLite older than 3.33, with one prepared UPDATE per sppin_key). Columns the sgcn table
+        doesn't have yet are added first by add_sgcn_columns. As in update_taxa_summary_data, a WoRMS summary only
+        fills records that don't already have a taxonomic_authority_url. Where a batch holds several summaries for a key, they are merged column by column in
+        order: ITIS values override WoRMS values (the last ITIS value for a column wins), WoRMS values fill the
+        columns no ITIS summary has (the first WoRMS value for a column wins), and missing or None values never
+        replace a value. A key with any ITIS summary updates all of its records.
+
+        :param updates: List of (sppin_key, summary) tuples
+        :return: Number of SGCN records updated
+        '''
+        merged = dict()
+        for sppin_key, summary in updates:
+            is_worms = summary["taxonomic_authority_url"].split("/")[2].split(".")[1].lower() == "marinespecies"
+            itis_values, worms_values = merged.setdefault(sppin_key, (dict(), dict()))
+            values = {k: v for k, v in summary.items() if k != "sppin_key" and v is not None}
+            if is_worms:
+                for k, v in values.items():
+                    worms_values.setdefault(k, v)
+            else:
+                itis_values.update(values)
+
+        summaries = {
+            sppin_key: (not itis_values, {**worms_values, **itis_values})
+            for sppin_key, (itis_values, worms_values) in merged.items()
+        }
+
+        if not summaries:
+            return 0
+
+        columns = sorted({k for is_worms, summary in summaries.values() for k in summary if k != "sppin_key"})
+        self.add_sgcn_columns(columns)
+
+        rows = [
+            (sppin_key, int(is_worms), *[_sql_value(summary.get(c)) for c in columns])
+            for sppin_key, (is_worms, summary) in summaries.items()
+        ]
+
+        connection = sqlite3.connect(f"{self.source_data_path}/sgcn.db", timeout=30)
+        try:
+            with connection:
+                if SQLITE_UPDATE_FROM:
+                    column_list = ", ".join(f'"{c}"' for c in columns)
+                    connection.execute(
+                        f"CREATE TEMP TABLE taxa_summary_updates (sppin_key TEXT PRIMARY KEY, is_worms INTEGER, "
+                        f"{column_list})"
+                    )
+                    connection.executemany(
+                        f"INSERT INTO taxa_summary_updates (sppin_key, is_worms, {column_list}) "
+                        f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+                        rows
+                    )
+
+                    # Properties missing from a summary keep their current values
+                    assignments = ", ".join(f'"{c}" = COALESCE(u."{c}", sgcn."{c}")' for c in columns)
+                    cursor = connection.execute(
+                        f"UPDATE sgcn SET {assignments} FROM taxa_summary_updates u "
+                        f"WHERE u.sppin_key = sgcn.sppin_key "
+                        f"AND (u.is_worms = 0 OR sgcn.taxonomic_authority_url IS NULL)"
+                    )
+                    updated = cursor.rowcount
+
+                    connection.execute("DROP TABLE taxa_summary_updates")
+                else:
+                    assignments = ", ".join(f'"{c}" = COALESCE(?, "{c}")' for c in columns)
+                    cursor = connection.executemany(
+                        f"UPDATE sgcn SET {assignments} "
+                        f"WHERE sppin_key = ? AND (? = 0 OR taxonomic_authority_url IS NULL)",
+                        [(*values, sppin_key, is_worms) for sppin_key, is_worms, *values in rows]
+                    )
+                    updated = cursor.rowcount
+        finally:
+            connection.close()
+
+        return updated
+
+    def add_sgcn_columns(self, columns):
+        '''
+        Adds any of the given columns that the sgcn table doesn't have yet, in a transaction of its own so schema
+        changes are kept out of the taxa summary updates.
+
+        :param columns: Column names
+        :return: List of the columns that were added
+        '''
+        connection = sqlite3.connect(f"{self.source_data_path}/sgcn.db", timeout=30)
+        try:
+            existing_columns = {row[1] for row in connection.execute("PRAGMA table_info(sgcn)")}
+            added = [c for c in columns if c not in existing_columns]
+            if added:
+                with connection:
+                    for column in added:
+                        connection.execute(f'ALTER TABLE sgcn ADD COLUMN "{column}"')
+        finally:
+            connection.close()
+
+        return added
+
+    def infuse_taxa_summaries(self, batch_size=1000):
+        '''
+        Drains the mq_taxa_summary queue, infusing the summaries into the SGCN records a batch at a time with
+        bulk_update_taxa_summary_data.
+
+        :param batch_size: Number of messages to apply per transaction
+        :return: Number of SGCN records updated
+        '''
+        updated = 0
+
+        messages = self.get_messages("mq_taxa_summary", batch_size)
+        while messages:
+            updated += self.bulk_update_taxa_summary_data([(m["body"]["sppin_key"], m["body"]) for m in messages])
+            self.delete_message("mq_taxa_summary", [m["id"] for m in messages], messages[0]["lease_id"])
+            messages = self.get_messages("mq_taxa_summary", batch_size)
+
+        return updated
+
     def cache_sppin(self, sppin_source, sppin_data, cache_type="sqlite"):
         '''
         Caches sppin data into a data store. The cache_type parameter specifies where to send the data.
@@ -879,12 +1921,21 @@ class Sgcn:
         record
         '''
         if cache_type == "sqlite":
-            return self.sql_sppin.insert_record(
+            record_id = self.sql_sppin.insert_record(
                 "sppin",
                 sppin_source,
                 sppin_data
             )
 
+            if isinstance(sppin_data, dict) and sppin_data.get("sppin_key"):
+                self.sppin_index.add(
+                    sppin_source,
+                    sppin_data["sppin_key"],
+                    sppin_data.get("processing_metadata", {}).get("date_processed")
+                )
+
+            return record_id
+
         else:
             return None
 
@@ -898,37 +1949,120 @@ class Sgcn:
         :param record:
         :return: Boolean, True if the data matches the schema, False otherwise
         '''
-        schema = self.get_schema("sgcn_source_records_schema")
-        validation = pysppin_utils.validate_data(record, schema)
+        return get_record_validator("sgcn_source_records_schema").is_valid(record)
 
-        return validation[0]["valid"]
+    def validate_many(self, records):
+        '''
+        This function validates a batch of source records against the SGCN source record schema, compiled once per
+        process.
+
+        :param records: List of record dictionaries
+        :return: List of booleans aligned to the records, True where the record matches the schema
+        '''
+        return get_record_validator("sgcn_source_records_schema").validate_many(records)
 
     # The below methods replace the functionality of process_sppin_source_search_term for the pipeline
     def gather_taxa_summary(self, message):
         '''
         Attempt to create a taxaonomic summary from itis. If itis doesn't have a match, create a taxonomic summary from WoRMS. 
-        Return the taxonomic summary along with name processing information.
+        Return the taxonomic summary along with name processing information. When a run-level LookupPlanner has
+        been attached (taxa_summary_plan) and already resolved the message's sppin_key, its result is used; otherwise
+        concurrent lookups of the same sppin_key in this process are coalesced into one.
 
         :param message: message containing the search term and other details
         :return: Dictionary containing ITIS summary properties needed for this application and lists of messages for
         name processing in information gathering functions and WoRMS. Any of these can be None.
         '''
+        planned = None
+        if self.taxa_summary_plan is not None:
+            planned = self.taxa_summary_plan.get(message["sppin_key"])
+
+        if planned is not None:
+            taxa_summary_msg, name_queue = planned
+        else:
+            taxa_summary_msg, name_queue = taxa_single_flight.do(
+                message["sppin_key"],
+                lambda: self.lookup_taxa_summary(message)
+            )
+
+        return self.infuse_common_name(taxa_summary_msg, message), name_queue
+
+    def lookup_taxa_summary(self, message):
+        '''
+        Looks up the ITIS (falling back to WoRMS) taxonomic summary for a message's sppin_key. The result depends only on
+        the sppin_key, so it can be shared by every record with that key.
+
+        :param message: message containing the search term and other details
+        :return: Taxonomic summary dictionary (or None) and list of name messages for further processing
+        '''
         taxa_summary_msg, name_queue, worms_queue = self.search_itis(message)
 
         if worms_queue is not None:
-            worms_summary = self.search_worms(worms_queue)
-            if worms_summary[0] is not None:
-                # BCB-1569: This appears to be missing from all WoRMS entries
-                if 'commonname' not in worms_summary[0].keys() and 'common name' in message.keys():
-                    worms_summary[0]['commonname'] = message['common name']
+            return self.search_worms(worms_queue)
 
-            return worms_summary
-
-        if taxa_summary_msg is not None:
-            if 'commonname' not in taxa_summary_msg.keys() and 'common name' in message.keys():
-                taxa_summary_msg['commonname'] = message['common name']
         return taxa_summary_msg, name_queue
 
+    def infuse_common_name(self, taxa_summary_msg, message):
+        '''
+        Fills in the summary commonname from the source record when the taxonomic authority did not provide one. The
+        summary is copied first because it can be shared between records.
+
+        :param taxa_summary_msg: Taxonomic summary dictionary or None
+        :param message: Source record the summary is for
+        :return: Summary dictionary for this record or None
+        '''
+        if taxa_summary_msg is None:
+            return None
+
+        taxa_summary_msg = dict(taxa_summary_msg)
+        # BCB-1569: This appears to be missing from all WoRMS entries
+        if 'commonname' not in taxa_summary_msg.keys() and 'common name' in message.keys():
+            taxa_summary_msg['commonname'] = message['common name']
+
+        return taxa_summary_msg
+
+    def gather_taxa_summaries(self, messages, max_concurrency=8):
+        '''
+        Runs gather_taxa_summary for many messages concurrently, within the per-authority rate limits.
+
+        :param messages: List of messages containing the search term and other details
+        :param max_concurrency: Maximum number of lookups in flight at once
+        :return: List aligned to messages of gather_taxa_summary results (or the exception raised for that message)
+        '''
+        return TaxonomicLookupEngine(self, max_concurrency=max_concurrency).gather(messages)
+
+    def prefetch_itis(self, messages, chunk_size=25):
+        '''
+        Resolves the sppin_keys of many messages against ITIS with batched multi-name Solr queries and caches each
+        successful result under itis:<sppin_key>, so the per-record search_itis calls that follow are cache hits. Keys
+        that are already cached are skipped and keys without an exact ITIS match are left for search_itis.
+
+        :param messages: List of messages containing the search term and other details
+        :param chunk_size: Number of names per ITIS query
+        :return: Number of results cached
+        '''
+        if not self.cache_manager:
+            raise ValueError("A cache_manager must be provided for non local processing.")
+
+        uncached = [
+            message for message in messages
+            if not self.cache_manager.get_from_cache("itis:{}".format(message["sppin_key"]))
+        ]
+        if not uncached:
+            return 0
+
+        name_source, source_date = self.get_source_data(self.sppin_messages(dataset=uncached[:1])[0])
+        results = ItisBatchResolver(chunk_size=chunk_size).resolve(
+            [message["sppin_key"] for message in uncached],
+            name_source=name_source,
+            source_date=source_date
+        )
+
+        for sppin_key, itis_result in results.items():
+            self.cache_manager.add_to_cache("itis:{}".format(sppin_key), itis_result)
+
+        return len(results)
+
     def search_itis(self, message):
         '''
         Search the cache for an existing record from itis. If none exists search itis. Return the processed itis information.
@@ -938,7 +2072,7 @@ class Sgcn:
         name processing in information gathering functions and WoRMS. Any of these can be None.
         '''
         message_body = self.sppin_messages(dataset=[message])[0]
-        get_data = lambda sppin_key, name_source, source_date: pysppin.itis.ItisApi().search(
+        get_data = lambda sppin_key, name_source, source_date: get_pysppin_helper("itis_api").search(
             sppin_key,
             name_source=name_source,
             source_date=source_date
@@ -956,7 +2090,7 @@ class Sgcn:
         :param message: Message containing the search term and other details
         :return: Summary properties for processing in SGCN and a list of name messages for further processing
         '''
-        get_data = lambda sppin_key, name_source, source_date: pysppin.worms.Worms().search(
+        get_data = lambda sppin_key, name_source, source_date: get_pysppin_helper("worms").search(
             sppin_key,
             name_source="SGCN",
             source_date=source_date
@@ -983,25 +2117,25 @@ class Sgcn:
             source_results = self.create_or_return_cache('natureserve', name_queue, self.search_natureserve)
 
     def search_ecos(self, sppin_key, name_source, source_date):
-        print('Search ECOS')
+        metrics.event("remote.search", source="ecos", sppin_key=sppin_key)
         return pysppin.ecos.Tess().search(sppin_key)
 
     def search_iucn(self, sppin_key, name_source, source_date):
-        print('Search IUCN')
+        metrics.event("remote.search", source="iucn", sppin_key=sppin_key)
         return pysppin.iucn.Iucn().search_species(
             sppin_key,
             name_source=name_source
         )
 
     def search_natureserve(self, sppin_key, name_source, source_date):
-        print('Search NatureServe')
+        metrics.event("remote.search", source="natureserve", sppin_key=sppin_key)
         return pysppin.natureserve.Natureserve().search(
             sppin_key,
             name_source=name_source
         )
 
     def search_gbif(self, sppin_key, name_source, source_date):
-        print('Search GBIF')
+        metrics.event("remote.search", source="gbif", sppin_key=sppin_key)
         return pysppin.gbif.Gbif().summarize_us_species(
             sppin_key,
             name_source=name_source
@@ -1010,7 +2144,9 @@ class Sgcn:
     def create_or_return_cache(self, sppin_source, message, get_data):
         '''
         Search the cache for the data. If it doesn't exist retreive the data and store it in the cache.
-        Return the cached data.
+        Return the cached data. The in-process lookup_cache is checked before the cache_manager. Names that weren't
+        found are held there as negative entries for SGCN_NEGATIVE_TTL seconds, and lookups that errored for
+        SGCN_ERROR_TTL seconds.
 
         :param sppin_source: The information source (used to create the cache key)
         :param message: Message containing the search term and other details
@@ -1023,24 +2159,58 @@ class Sgcn:
             sppin_key = message["sppin_key"]
             key = "{}:{}".format(sppin_source, sppin_key)
 
+            source_results = lookup_cache.get(key)
+            if source_results is not LRUCache.MISSING:
+                metrics.incr(f"cache.{sppin_source}.lru_hits")
+                return source_results
+
             source_results = self.cache_manager.get_from_cache(key)
-            if not source_results:
+            if source_results:
+                metrics.incr(f"cache.{sppin_source}.hits")
+                lookup_cache.put(key, source_results)
+            else:
+                metrics.incr(f"cache.{sppin_source}.misses")
                 name_source, source_date = self.get_source_data(message)
-                source_results = get_data(sppin_key, name_source, source_date)
-                # THIS SLEEP IS IMPORTANT.  We MUST guarantee that we don't hit the
+                # THIS RATE LIMIT IS IMPORTANT.  We MUST guarantee that we don't hit the
                 # WoRMS site any more than twice per second or they will block us.
-                # We originally had this at 0.5 sec, but since our lambdas operate
-                # at a concurrency of 2, we have to increase this to 1.0
-                if sppin_source == "worms":
-                    time.sleep(1.000)
-                # Only cache results if they're successfully found
+                # Since our lambdas operate at a concurrency of 2, WoRMS defaults to
+                # 1 request per second per process (see lookup.AUTHORITY_RATES)
+                rate_limiter = get_rate_limiter(sppin_source)
+                if rate_limiter is not None:
+                    with metrics.timer(f"ratelimit.{sppin_source}.wait_seconds"):
+                        rate_limiter.acquire()
+                metrics.incr(f"remote.{sppin_source}.calls")
+                with metrics.timer(f"remote.{sppin_source}.seconds"):
+                    source_results = get_data(sppin_key, name_source, source_date)
+                # Only cache results if they're successfully found. Names that weren't found are kept in memory for
+                # a while (negative caching) so popular names are not retried for every record; errors are only kept
+                # for LOOKUP_ERROR_TTL so a transient failure doesn't hide the name for long.
                 if self.success(source_results):
                     self.cache_manager.add_to_cache(key, source_results)
+                    lookup_cache.put(key, source_results)
+                elif self.not_found(source_results):
+                    metrics.incr(f"remote.{sppin_source}.not_found")
+                    lookup_cache.put(key, source_results, negative=True)
+                else:
+                    metrics.incr(f"remote.{sppin_source}.errors")
+                    lookup_cache.put(key, source_results, negative=True, ttl=LOOKUP_ERROR_TTL)
 
             return source_results
         else:
             raise ValueError("A cache_manager must be provided for non local processing.")
 
+    def not_found(self, source_results):
+        '''
+        :param source_results: Results of a sppin source search
+        :return: True if the search completed and definitively found nothing (status "failure"), as opposed to an
+        error result or an empty response
+        '''
+        if not source_results or not isinstance(source_results.get('processing_metadata'), dict):
+            return False
+
+        status = source_results['processing_metadata'].get('status')
+        return isinstance(status, str) and status.lower() == "failure"
+
     def success(self, source_results):
         if not source_results:
             return False
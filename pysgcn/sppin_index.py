@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+_sppin_indexes = dict()
+_sppin_indexes_lock = threading.Lock()
+
+
+class SppinIndex:
+    '''
+    Index of when each sppin_key was last cached in each SppIn collection (itis, worms, gbif, ...), kept in a SQLite
+    file next to the SppIn cache with an index on (sppin_key, date). It answers freshness questions for many keys and
+    collections with a few IN (...) queries instead of one lookup per key per collection. Records cached in the SppIn
+    collections before the index existed are added to it once with backfill.
+    '''
+    def __init__(self, db_path, chunk_size=500):
+        self.db_path = db_path
+        # SQLite limits the number of bound parameters in a statement, so keys are probed in chunks
+        self.chunk_size = chunk_size
+
+        self._lock = threading.RLock()
+
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sppin_index (collection TEXT NOT NULL, sppin_key TEXT NOT NULL, "
+            "date TEXT NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS sppin_index_key_date ON sppin_index (sppin_key, date)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sppin_index_backfills (source TEXT NOT NULL, collection TEXT NOT NULL, "
+            "records INTEGER, backfilled TEXT, PRIMARY KEY (source, collection))"
+        )
+        self.connection.commit()
+
+    def add(self, collection, sppin_key, date=None):
+        '''
+        :param collection: SppIn collection the record was cached in
+        :param sppin_key: sppin_key of the cached record
+        :param date: ISO date the record was cached, defaults to now
+        '''
+        with self._lock:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO sppin_index (collection, sppin_key, date) VALUES (?, ?, ?)",
+                    (collection, sppin_key, date or datetime.utcnow().isoformat())
+                )
+
+    def backfill(self, db_path, collections):
+        '''
+        Adds the records already cached in the SppIn collection tables of a database (the sppin.db the pysppin Sql
+        helper writes, one table per collection) to the index. Each collection is only backfilled once from a given
+        database; later records are added by Sgcn.cache_sppin as they are cached.
+
+        Records are read from sppin_key and date_processed columns (flattened as processing_metadata_date_processed or
+        processing_metadata.date_processed, or date_inserted) where the table has them, or otherwise from the JSON
+        document in a body, record or data column. Records without a date are left out.
+
+        :param db_path: Path of the SQLite file holding the SppIn collections
+        :param collections: SppIn collection (table) names
+        :return: Number of records added to the index
+        '''
+        source = os.path.abspath(db_path)
+
+        with self._lock:
+            done = {
+                row[0] for row in self.connection.execute(
+                    "SELECT collection FROM sppin_index_backfills WHERE source = ?", (source,)
+                )
+            }
+            collections = [c for c in collections if c not in done]
+            if not collections:
+                return 0
+
+            records = {collection: list() for collection in collections}
+            if os.path.isfile(db_path):
+                sppin_db = sqlite3.connect(db_path)
+                try:
+                    for collection in collections:
+                        records[collection] = _cached_records(sppin_db, collection)
+                finally:
+                    sppin_db.close()
+
+            with self.connection:
+                for collection in collections:
+                    self.connection.executemany(
+                        "INSERT INTO sppin_index (collection, sppin_key, date) VALUES (?, ?, ?)",
+                        [(collection, sppin_key, date) for sppin_key, date in records[collection]]
+                    )
+                    self.connection.execute(
+                        "INSERT INTO sppin_index_backfills (source, collection, records, backfilled) "
+                        "VALUES (?, ?, ?, ?)",
+                        (source, collection, len(records[collection]), datetime.utcnow().isoformat())
+                    )
+
+        return sum(len(r) for r in records.values())
+
+    def probe(self, sppin_keys, collections, max_age_days=30):
+        '''
+        :param sppin_keys: sppin_keys to check
+        :param collections: SppIn collections to check
+        :param max_age_days: Records cached longer ago than this are not considered current
+        :return: Dictionary of sppin_key to a dictionary of collection to the date of the most recent current record,
+        or None where there is no current record
+        '''
+        sppin_keys = list(dict.fromkeys(sppin_keys))
+        collections = list(collections)
+        cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat()
+
+        results = {sppin_key: {collection: None for collection in collections} for sppin_key in sppin_keys}
+
+        collection_params = ",".join("?" * len(collections))
+        with self._lock:
+            for i in range(0, len(sppin_keys), self.chunk_size):
+                chunk = sppin_keys[i:i + self.chunk_size]
+                rows = self.connection.execute(
+                    f"SELECT sppin_key, collection, MAX(date) FROM sppin_index "
+                    f"WHERE sppin_key IN ({','.join('?' * len(chunk))}) AND collection IN ({collection_params}) "
+                    f"AND date >= ? GROUP BY sppin_key, collection",
+                    (*chunk, *collections, cutoff)
+                ).fetchall()
+
+                for sppin_key, collection, date in rows:
+                    results[sppin_key][collection] = date
+
+        return results
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+_DATE_COLUMNS = (
+    "processing_metadata_date_processed", "processing_metadata.date_processed", "date_processed", "date_inserted"
+)
+_DOCUMENT_COLUMNS = ("body", "record", "data")
+
+
+def _cached_records(sppin_db, collection):
+    # (sppin_key, date) pairs of the records in a SppIn collection table, see SppinIndex.backfill
+    exists = sppin_db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (collection,)
+    ).fetchone()
+    if not exists:
+        return list()
+
+    columns = [row[1] for row in sppin_db.execute(f'PRAGMA table_info("{collection}")')]
+    date_column = next((c for c in _DATE_COLUMNS if c in columns), None)
+
+    if "sppin_key" in columns and date_column is not None:
+        return [
+            (sppin_key, date) for sppin_key, date in
+            sppin_db.execute(f'SELECT sppin_key, "{date_column}" FROM "{collection}"')
+            if sppin_key and date
+        ]
+
+    document_column = next((c for c in _DOCUMENT_COLUMNS if c in columns), None)
+    if document_column is None:
+        return list()
+
+    records = list()
+    for (document,) in sppin_db.execute(f'SELECT "{document_column}" FROM "{collection}"'):
+        try:
+            document = json.loads(document)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(document, dict):
+            continue
+        date = (document.get("processing_metadata") or dict()).get("date_processed")
+        if document.get("sppin_key") and date:
+            records.append((document["sppin_key"], date))
+
+    return records
+
+
+def get_sppin_index(db_path):
+    '''
+    Returns the SppinIndex for a database file, one per process.
+
+    :param db_path: Path of the SQLite file
+    :return: SppinIndex
+    '''
+    key = (os.path.abspath(db_path), os.getpid())
+    with _sppin_indexes_lock:
+        if key not in _sppin_indexes:
+            os.makedirs(os.path.dirname(key[0]), exist_ok=True)
+            _sppin_indexes[key] = SppinIndex(db_path)
+        return _sppin_indexes[key]
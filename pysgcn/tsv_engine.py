@@ -0,0 +1,211 @@
+import codecs
+import csv
+import io
+import re
+
+# Cell values read as missing, as pandas.read_csv does by default
+NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA",
+    "NULL", "NaN", "None", "n/a", "nan", "null"
+}
+TRUE_VALUES = {"True", "TRUE", "true"}
+FALSE_VALUES = {"False", "FALSE", "false"}
+
+_INT_PATTERN = re.compile(r"^\s*[+-]?\d+\s*$")
+
+NAN = float("nan")
+
+
+def detect_encoding(data, prefix_size=65536):
+    '''
+    Works out the encoding of a source file from its bytes. A byte order mark or a prefix that isn't valid UTF-8
+    settles it from the prefix alone; otherwise the whole buffer is checked as UTF-8, since state files often only
+    have a few latin1 characters well into the file. Files that are not UTF-8 are read as latin1, which accepts any
+    bytes.
+
+    :param data: Bytes of a source file
+    :param prefix_size: Number of bytes to sniff
+    :return: Encoding name for decode or pandas.read_csv - utf-8-sig, utf-16, utf-8, or latin1
+    '''
+    if data.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16"
+
+    try:
+        # final=False so a multi-byte character cut off at the end of the prefix isn't treated as an error
+        codecs.getincrementaldecoder("utf-8")().decode(data[:prefix_size], final=False)
+    except UnicodeDecodeError:
+        return "latin1"
+
+    if len(data) > prefix_size:
+        try:
+            codecs.decode(data, "utf-8")
+        except UnicodeDecodeError:
+            return "latin1"
+
+    return "utf-8"
+
+
+def decode_source(data, encoding=None):
+    '''
+    Decodes source file bytes with their detected encoding.
+
+    :param data: Bytes of a source file
+    :param encoding: Encoding from detect_encoding, detected if not given
+    :return: Text
+    '''
+    return data.decode(encoding or detect_encoding(data))
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _convert_column(values):
+    '''
+    Types a column of raw strings (None for missing) the way pandas infers dtypes: integers (floats when values are
+    missing), floats, booleans (when nothing is missing), otherwise strings with NaN for missing values.
+    '''
+    present = [v for v in values if v is not None]
+    has_missing = len(present) < len(values)
+
+    if present and all(_INT_PATTERN.match(v) for v in present):
+        if has_missing:
+            return [NAN if v is None else float(v) for v in values]
+        return [int(v) for v in values]
+
+    if present:
+        floats = [_float(v) for v in present]
+        if all(f is not None for f in floats):
+            return [NAN if v is None else float(v) for v in values]
+
+    if present and not has_missing and all(v in TRUE_VALUES or v in FALSE_VALUES for v in present):
+        return [v in TRUE_VALUES for v in values]
+
+    return [NAN if v is None else v for v in values]
+
+
+def _unique_columns(header):
+    # Repeated column names get .1, .2, ... suffixes as in pandas
+    seen = dict()
+    columns = list()
+    for name in header:
+        if name in seen:
+            seen[name] += 1
+            columns.append(f"{name}.{seen[name]}")
+        else:
+            seen[name] = 0
+            columns.append(name)
+    return columns
+
+
+def read_tsv_records(text, chunksize=5000):
+    '''
+    Parses tab delimited text into typed record dictionaries without pandas. Column types are inferred for each chunk
+    of rows.
+
+    :param text: Source file text
+    :param chunksize: Number of rows per chunk
+    :return: Generator of lists of record dictionaries
+    '''
+    reader = csv.reader(io.StringIO(text), delimiter="\t")
+
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _unique_columns(header)
+
+    rows = list()
+    for row in reader:
+        if not row:
+            continue
+        rows.append(row)
+        if len(rows) == chunksize:
+            yield _typed_records(columns, rows)
+            rows = list()
+
+    if rows:
+        yield _typed_records(columns, rows)
+
+
+def _typed_records(columns, rows):
+    width = len(columns)
+    cells = [
+        [None if value in NA_VALUES else value for value in (row + [""] * (width - len(row)))[:width]]
+        for row in rows
+    ]
+
+    typed_columns = [_convert_column([row[i] for row in cells]) for i in range(width)]
+
+    return [dict(zip(columns, values)) for values in zip(*typed_columns)]
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def harmonize_records(sgcn, records, item, metadata_index, record_processed, clean_names=None):
+    '''
+    Applies the harmonization rules of Sgcn.harmonize_source_frame to a list of record dictionaries.
+
+    :param sgcn: Sgcn instance (for the local metadata lookups and sppin_key rules)
+    :param records: Record dictionaries from read_tsv_records
+    :param item: Summarized item dictionary
+    :param metadata_index: MetadataIndex for historic list and ITIS override lookups; when None these are looked up in
+    the local metadata database
+    :param record_processed: Processing date to set on every record
+    :param clean_names: Dictionary used to remember cleaned scientific names across chunks, optional
+    :return: List of harmonized record dictionaries
+    '''
+    clean_names = dict() if clean_names is None else clean_names
+    harmonized = list()
+
+    for source_record in records:
+        record = {key.lower(): value for key, value in source_record.items()}
+
+        record["sciencebase_item_id"] = item["sciencebase_item_id"]
+        record["record_processed"] = record_processed
+        record["source_file_date"] = item["source_file_date"]
+        record["source_file_url"] = item["source_file_url"]
+
+        if "state" not in record:
+            record["state"] = item["state"]
+
+        if "year" not in record:
+            record["year"] = item["year"]
+
+        record.pop("2005 swap", None)
+
+        for column in ("taxonomy group", "taxonomy group (use drop down box)"):
+            if column in record:
+                record = {
+                    ("taxonomic category" if key == column else key): value for key, value in record.items()
+                }
+
+        for column in ("common name", "taxonomic category"):
+            if _is_missing(record[column]):
+                record[column] = ""
+
+        scientific_name = record["scientific name"]
+        name_key = "nan" if _is_missing(scientific_name) else scientific_name
+        if name_key not in clean_names:
+            clean_names[name_key] = sgcn.clean_scientific_name(scientific_name)
+        record["clean_scientific_name"] = clean_names[name_key]
+
+        if metadata_index:
+            record["historic_list"] = metadata_index.is_historic(scientific_name)
+            record["itis_override_id"] = metadata_index.itis_override(scientific_name)
+        else:
+            record["historic_list"] = sgcn.check_historic_list(scientific_name)
+            record["itis_override_id"] = sgcn.check_itis_override(scientific_name)
+
+        record["sppin_key"] = sgcn.build_sppin_key(record["clean_scientific_name"], record["itis_override_id"])
+
+        harmonized.append(record)
+
+    return harmonized
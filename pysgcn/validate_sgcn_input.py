@@ -1,10 +1,12 @@
 from pysgcn import sgcn as pysgcn
 import math
-import json
-import hashlib
 
+import os
 import sys
 import requests
+from pysgcn.dedup import Deduplicator
+from pysgcn.hashing import record_ids
+from pysgcn.metrics import JsonLinesSink, metrics
 
 class Logger(object):
     def __init__(self):
@@ -30,23 +32,22 @@ def get_latest_sgcn_run_id():
     return id
 
 def get_total_records_processed_by_pipeline(pipeline_run):
-    print('Getting records processed by SGCN pipeline...')
     URL = "https://7y9ycz4ki4.execute-api.us-west-2.amazonaws.com/prod/runs/" + pipeline_run
 
     r = requests.get(url = URL) 
   
     data = r.json()
     if data['data']['error']:
-        print('Error found in pipeline processing: {}'.format(data['data']['error']))
+        metrics.event("validation.pipeline_error", pipeline_id=pipeline_run, error=data['data']['error'])
     return data['data']['documents_ingested']
 
 
 def get_total_input_items():
-    
-    print('Processing all SWAP files...')
     sgcn = pysgcn.Sgcn(operation_mode='pipeline', cache_manager="foo")
     sgcn_meta = sgcn.cache_sgcn_metadata(return_data=True)
-    items = sgcn.get_processable_items()
+    metadata_index = sgcn.build_metadata_index(sgcn_meta)
+    # Every input file is counted, whether or not the processing ledger has it as already processed
+    items = sgcn.get_sgcn_source_items()
     
     total_species_ct = 0
     bad_record_ct = 0
@@ -55,40 +56,58 @@ def get_total_input_items():
     states = dict()
     
     for item in items:
-        print('--> state: {} ({})'.format(item['state'], item['year']))
         state_ct = state_ct + 1
-        res = sgcn.process_sgcn_source_item(item, metadata_cache=sgcn_meta)
+        df_src = sgcn.process_sgcn_source_item(item, output_type="dataframe", metadata_cache=metadata_index)
+        ids = record_ids(df_src)
+        res = df_src.to_dict("records")
         species_ct = 0
         bad_state_ct = 0
         dupe_state_ct = 0
-        species_set = set()
-        for species in res:
+        dedup = Deduplicator()
+        valid_mask = sgcn.validate_many(res)
+        for species, valid, hsh in zip(res, valid_mask, ids):
             # Stuff that can be uncommented if we need to debug deeper into missing/invalid records.
             #if item['state'] == "West Virginia" and item['year'] == "2015":
             #    print('{}:{}:{}'.format(item['state'], item['year'], species['scientific name']))
                 #if species['scientific name'].lower() == "artibeus jamaicensis" :
                 #    print('{}'.format(json.dumps(species)))
-            valid = sgcn.validate_data(species)
-            # create a hash of the species record so we don't add duplicates from the same file
-            hsh = hashlib.sha1(repr(json.dumps(species, sort_keys=True)).encode('utf-8')).hexdigest()
-            
+
             if not isinstance(species['scientific name'], float) and "no scientific name" in species['scientific name'].lower():
-                print('    Potential Bad Record : {}'.format({species['scientific name'], species['common name']}))
+                metrics.incr("validation.potential_bad_records")
+                metrics.event(
+                    "validation.potential_bad_record",
+                    state=item['state'],
+                    year=item['year'],
+                    scientific_name=species['scientific name'],
+                    common_name=species['common name']
+                )
 
             # check for duplicates
-            if valid and hsh not in species_set:
-                species_set.add(hsh)
-            elif hsh in species_set:
-                print('    Duplicate Record: {}'.format({species['scientific name'], species['common name']}))
+            if not valid:
+                metrics.incr("validation.bad_records")
+                metrics.event(
+                    "validation.bad_record",
+                    state=item['state'],
+                    year=item['year'],
+                    scientific_name=species['scientific name'],
+                    common_name=species['common name']
+                )
+                bad_state_ct = bad_state_ct + 1
+            elif not dedup.add(hsh):
+                metrics.incr("validation.duplicate_records")
+                metrics.event(
+                    "validation.duplicate_record",
+                    state=item['state'],
+                    year=item['year'],
+                    scientific_name=species['scientific name'],
+                    common_name=species['common name']
+                )
                 dupe_state_ct = dupe_state_ct + 1
-            elif not valid:
-                print('    Bad Record : {}'.format({species['scientific name'], species['common name']}))
-                bad_state_ct = bad_state_ct + 1  
                 
             species_ct = species_ct + 1
 
         state_species_ct = species_ct - bad_state_ct - dupe_state_ct
-        print('    Species Ct: {}'.format(state_species_ct))
+        metrics.event("validation.state", state=item['state'], year=item['year'], species=state_species_ct)
         state_key = item['state'] + " (" + item['year'] + ")"
         states[state_key] = state_species_ct
         dupe_record_ct = dupe_record_ct + dupe_state_ct
@@ -96,23 +115,22 @@ def get_total_input_items():
         total_species_ct = total_species_ct + species_ct
         
      
-    print('\ntotal states processed = {}'.format(state_ct))
-    print('total species ct = {}'.format(total_species_ct))
-    print('total bad record ct = {}'.format(bad_record_ct))
-    print('total dupe record ct = {}'.format(dupe_record_ct))
     final_species_ct = total_species_ct - bad_record_ct - dupe_record_ct
-    print('final species ct = {}'.format(final_species_ct))
     total = dict()
     total['total_species_processed'] = total_species_ct
     total['bad_records'] = bad_record_ct
     total['duplicate_records'] = dupe_record_ct
     total['final_species_ct'] = final_species_ct
+    metrics.event("validation.input_totals", states_processed=state_ct, **total)
 
     return total, states
 
 def validate_latest_run(local=False):
     if local:
         sys.stdout = Logger()
+        # Report to the console and validation_output.txt unless SGCN_METRICS_SINK says otherwise
+        if not os.getenv("SGCN_METRICS_SINK"):
+            metrics.set_sink(JsonLinesSink())
 
     pipeline_id = get_latest_sgcn_run_id()
 
@@ -130,7 +148,7 @@ def validate_latest_run(local=False):
     totals = {**pipeline_totals, **state_totals}
     data['totals'] = totals
     data['states'] = states
-    print('\ntotal SGCN pipeline records ({}) = {}'.format(pipeline_id, total_processed))
+    metrics.event("validation.pipeline_totals", pipeline_id=pipeline_id, pipeline_total=total_processed)
     return data
 
 if __name__ == "__main__":
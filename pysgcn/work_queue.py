@@ -0,0 +1,312 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEAD_LETTER_QUEUE = "mq_invalid_source"
+
+_work_queues = dict()
+_work_queues_lock = threading.Lock()
+
+
+class WorkQueue:
+    '''
+    Local message queue for the SGCN processing stages (mq_sgcn_items, mq_source_records, mq_itis_check,
+    mq_worms_check, mq_taxa_summary, ...) backed by a single SQLite file in WAL mode. Messages are enqueued in batches
+    and consumers lease them: a lease claims up to N visible messages in one IMMEDIATE transaction and hides them for
+    visibility_timeout seconds, so several worker processes can drain the same queue without two of them getting the
+    same message. A message is removed when it is acked with its lease; a message that is nacked, or whose lease
+    expires, becomes visible again. After max_attempts leases a message is moved to the dead letter queue
+    (mq_invalid_source) along with the queue it came from and the reason it failed.
+    '''
+    def __init__(self, db_path, visibility_timeout=300, max_attempts=5, dead_letter_queue=DEAD_LETTER_QUEUE):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.dead_letter_queue = dead_letter_queue
+
+        self._lock = threading.RLock()
+
+        # Transactions are managed explicitly so leases can take the write lock up front with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "queue TEXT NOT NULL, "
+            "body TEXT NOT NULL, "
+            "enqueued REAL NOT NULL, "
+            "visible_at REAL NOT NULL, "
+            "lease_id TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS messages_queue_visible ON messages (queue, visible_at, id)"
+        )
+
+    def enqueue(self, queue_name, messages):
+        '''
+        :param queue_name: Queue name or list of queue names; every message is added to each queue
+        :param messages: Message dictionary or list of message dictionaries
+        :return: Number of messages added
+        '''
+        queue_names = [queue_name] if isinstance(queue_name, str) else list(queue_name)
+        if isinstance(messages, dict):
+            messages = [messages]
+
+        now = time.time()
+        rows = [(q, json.dumps(msg), now, now) for q in queue_names for msg in messages]
+        if not rows:
+            return 0
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.executemany(
+                    "INSERT INTO messages (queue, body, enqueued, visible_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+        return len(rows)
+
+    def lease(self, queue_name, max_messages=1, visibility_timeout=None):
+        '''
+        Claims up to max_messages visible messages from a queue, oldest first.
+
+        :param queue_name: Queue to lease from
+        :param max_messages: Maximum number of messages to claim
+        :param visibility_timeout: Seconds the messages stay hidden from other consumers (defaults to the queue's)
+        :return: List of leased messages as dictionaries with id, body, lease_id and attempts
+        '''
+        visibility_timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        lease_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.connection.execute(
+                    "SELECT id, body, attempts FROM messages WHERE queue = ? AND visible_at <= ? ORDER BY id LIMIT ?",
+                    (queue_name, now, max_messages)
+                ).fetchall()
+
+                self.connection.executemany(
+                    "UPDATE messages SET visible_at = ?, lease_id = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + visibility_timeout, lease_id, row[0]) for row in rows]
+                )
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+        leased = [
+            {"id": row[0], "body": json.loads(row[1]), "lease_id": lease_id, "attempts": row[2] + 1}
+            for row in rows
+        ]
+
+        # Messages that have already been tried max_attempts times are not handed out again
+        exhausted = [m for m in leased if m["attempts"] > self.max_attempts]
+        if exhausted:
+            self.dead_letter(queue_name, exhausted, reason="max_attempts")
+            leased = [m for m in leased if m["attempts"] <= self.max_attempts]
+
+        return leased
+
+    def ack(self, queue_name, message_ids, lease_id=None):
+        '''
+        Removes processed messages from a queue. With a lease_id only messages still held by that lease are removed,
+        so a consumer whose lease expired cannot remove a message another consumer has since claimed.
+
+        :param queue_name: Queue the messages were leased from
+        :param message_ids: Message id or list of message ids
+        :param lease_id: Lease the messages were claimed with, optional
+        :return: Number of messages removed
+        '''
+        message_ids = _as_list(message_ids)
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                if lease_id is None:
+                    cursor = self.connection.executemany(
+                        "DELETE FROM messages WHERE queue = ? AND id = ?",
+                        [(queue_name, i) for i in message_ids]
+                    )
+                else:
+                    cursor = self.connection.executemany(
+                        "DELETE FROM messages WHERE queue = ? AND id = ? AND lease_id = ?",
+                        [(queue_name, i, lease_id) for i in message_ids]
+                    )
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+        return cursor.rowcount
+
+    def nack(self, queue_name, message_ids, delay=0, lease_id=None):
+        '''
+        Releases leased messages so they can be leased again after delay seconds. With a lease_id only messages still
+        held by that lease are released.
+
+        :param queue_name: Queue the messages were leased from
+        :param message_ids: Message id or list of message ids
+        :param delay: Seconds before the messages become visible again
+        :param lease_id: Lease the messages were claimed with, optional
+        '''
+        visible_at = time.time() + delay
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                if lease_id is None:
+                    self.connection.executemany(
+                        "UPDATE messages SET visible_at = ?, lease_id = NULL WHERE queue = ? AND id = ?",
+                        [(visible_at, queue_name, i) for i in _as_list(message_ids)]
+                    )
+                else:
+                    self.connection.executemany(
+                        "UPDATE messages SET visible_at = ?, lease_id = NULL WHERE queue = ? AND id = ? "
+                        "AND lease_id = ?",
+                        [(visible_at, queue_name, i, lease_id) for i in _as_list(message_ids)]
+                    )
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def dead_letter(self, queue_name, messages, reason=None):
+        '''
+        Moves messages to the dead letter queue, wrapped with the queue they came from and the reason.
+
+        :param queue_name: Queue the messages were leased from
+        :param messages: Leased message dictionaries (id and body)
+        :param reason: Why the messages could not be processed
+        '''
+        now = time.time()
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.executemany(
+                    "INSERT INTO messages (queue, body, enqueued, visible_at) VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            self.dead_letter_queue,
+                            json.dumps({"source_queue": queue_name, "reason": reason, "body": m["body"]}),
+                            now,
+                            now
+                        )
+                        for m in messages
+                    ]
+                )
+                self.connection.executemany(
+                    "DELETE FROM messages WHERE queue = ? AND id = ?",
+                    [(queue_name, m["id"]) for m in messages]
+                )
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def import_queues(self, db_path):
+        '''
+        Moves the messages waiting in the mq_* tables of a database written by the pysppin Sql helper (the local
+        message queues before this WorkQueue, in <cache_root>/mq/mq.db) onto the queues of the same name. Each table
+        is only imported once; imports are recorded in the queue_imports table and the old database is left alone.
+
+        :param db_path: Path to the SQLite file to import from
+        :return: Number of messages queued
+        '''
+        if not os.path.isfile(db_path):
+            return 0
+
+        source = os.path.abspath(db_path)
+
+        with self._lock:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS queue_imports (source TEXT, queue TEXT, messages INTEGER, imported TEXT, "
+                "PRIMARY KEY (source, queue))"
+            )
+            imported = {
+                row[0] for row in
+                self.connection.execute("SELECT queue FROM queue_imports WHERE source = ?", (source,))
+            }
+
+            legacy = sqlite3.connect(db_path)
+            try:
+                queues = dict()
+                for (table_name,) in legacy.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'mq\\_%' ESCAPE '\\'"
+                ).fetchall():
+                    if table_name in imported:
+                        continue
+                    columns = [row[1] for row in legacy.execute(f'PRAGMA table_info("{table_name}")')]
+                    if "body" not in columns:
+                        continue
+                    order = "date_inserted" if "date_inserted" in columns else "rowid"
+                    queues[table_name] = [
+                        row[0] for row in legacy.execute(f'SELECT body FROM "{table_name}" ORDER BY {order}')
+                    ]
+            finally:
+                legacy.close()
+
+        count = 0
+        for queue_name, bodies in queues.items():
+            messages = [json.loads(body) if isinstance(body, str) else body for body in bodies if body is not None]
+            count += self.enqueue(queue_name, messages)
+            with self._lock:
+                self.connection.execute(
+                    "INSERT INTO queue_imports (source, queue, messages, imported) VALUES (?, ?, ?, datetime('now'))",
+                    (source, queue_name, len(messages))
+                )
+
+        return count
+
+    def count(self, queue_name, visible_only=False):
+        '''
+        :param queue_name: Queue to count
+        :param visible_only: Count only messages that are not currently leased
+        :return: Number of messages in the queue
+        '''
+        with self._lock:
+            if visible_only:
+                row = self.connection.execute(
+                    "SELECT COUNT(*) FROM messages WHERE queue = ? AND visible_at <= ?", (queue_name, time.time())
+                ).fetchone()
+            else:
+                row = self.connection.execute(
+                    "SELECT COUNT(*) FROM messages WHERE queue = ?", (queue_name,)
+                ).fetchone()
+
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+def _as_list(message_ids):
+    return list(message_ids) if isinstance(message_ids, (list, tuple, set)) else [message_ids]
+
+
+def get_work_queue(db_path, **kwargs):
+    '''
+    Returns the WorkQueue for a database file, one per process so that forked workers open their own connection.
+
+    :param db_path: Path of the SQLite file
+    :return: WorkQueue
+    '''
+    key = (os.path.abspath(db_path), os.getpid())
+    with _work_queues_lock:
+        if key not in _work_queues:
+            os.makedirs(os.path.dirname(key[0]), exist_ok=True)
+            _work_queues[key] = WorkQueue(db_path, **kwargs)
+        return _work_queues[key]
@@ -14,7 +14,11 @@ setup(
     install_requires=[
         'sciencebasepy',
         'pandas',
-        'requests'
+        'requests',
+        'jsonschema'
     ],
+    extras_require={
+        'columnar': ['pyarrow']
+    },
     zip_safe=False
 )
@@ -0,0 +1,88 @@
+import json
+import sqlite3
+
+from pysgcn import sgcn as pysgcn
+from pysgcn.cache import LRUCache, WriteBehindCache
+
+
+def test_buffered_values_are_copies(tmp_path):
+    cache = WriteBehindCache(str(tmp_path / "cache.db"), flush_size=10)
+    summary = {"commonnames": [{"name": "Bog Turtle"}]}
+    cache.add_to_cache("itis:a", summary)
+    summary["commonnames"].append({"name": "changed"})
+    cache.get_from_cache("itis:a")["commonnames"].clear()
+
+    assert cache.get_from_cache("itis:a") == {"commonnames": [{"name": "Bog Turtle"}]}
+    cache.flush()
+    assert cache.get_from_cache("itis:a") == {"commonnames": [{"name": "Bog Turtle"}]}
+    cache.close()
+
+
+def test_import_table(tmp_path):
+    legacy = sqlite3.connect(str(tmp_path / "sppin.db"))
+    legacy.execute("CREATE TABLE cache (key TEXT, value TEXT)")
+    legacy.executemany("INSERT INTO cache VALUES (?, ?)", [
+        ("final_res:a", json.dumps({"sppin_key": "a"})),
+        ("itis:b", json.dumps({"tsn": 1})),
+    ])
+    legacy.commit()
+    legacy.close()
+
+    cache = WriteBehindCache(str(tmp_path / "cache.db"), flush_size=10)
+    cache.add_to_cache("itis:b", {"tsn": 2})
+
+    assert cache.import_table(str(tmp_path / "sppin.db")) == 1
+    assert cache.import_table(str(tmp_path / "sppin.db")) == 0
+    assert cache.get_from_cache("final_res:a") == {"sppin_key": "a"}
+    # Values already in the new cache win
+    assert cache.get_from_cache("itis:b") == {"tsn": 2}
+    assert cache.import_table(str(tmp_path / "missing.db")) == 0
+    cache.close()
+
+
+def test_lru_cache_evicts_least_recently_used_and_expires_negative_entries():
+    cache = LRUCache(max_entries=2, max_bytes=None, negative_ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is LRUCache.MISSING
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+    cache.put("missing", {}, negative=True)
+    cache.put("errored", {}, negative=True, ttl=-1)
+    assert cache.get("missing") == {}
+    assert cache.get("errored") is LRUCache.MISSING
+    assert cache.stats()["negative_hits"] == 1
+
+
+def test_lookup_errors_are_only_cached_briefly(monkeypatch):
+    monkeypatch.setattr(pysgcn, "lookup_cache", LRUCache(negative_ttl=3600))
+    monkeypatch.setattr(pysgcn, "LOOKUP_ERROR_TTL", -1)
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.get_source_data = lambda message: ("test", "2020-01-01")
+
+    class CacheManager:
+        def get_from_cache(self, key):
+            return None
+
+        def add_to_cache(self, key, value):
+            raise AssertionError("only successful lookups are persisted")
+
+    sgcn.cache_manager = CacheManager()
+    calls = list()
+
+    def get_data(status):
+        def search(sppin_key, name_source, source_date):
+            calls.append(sppin_key)
+            return {"sppin_key": sppin_key, "processing_metadata": {"status": status}}
+        return search
+
+    for i in range(2):
+        sgcn.create_or_return_cache("worms", {"sppin_key": "Scientific Name:Missing"}, get_data("failure"))
+        sgcn.create_or_return_cache("worms", {"sppin_key": "Scientific Name:Errored"}, get_data("error"))
+
+    assert calls.count("Scientific Name:Missing") == 1
+    assert calls.count("Scientific Name:Errored") == 2
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from pysgcn import sgcn as pysgcn
+
+pytest.importorskip("pyarrow")
+
+METADATA = {
+    "Historic 2005 SWAP National List": [{"scientific_name": "Oculina robusta"}],
+    "SGCN ITIS Overrides": [
+        {"ScientificName_original": "Oculina robusta", "taxonomicAuthorityID": "http://itis.gov/tsn:53396"}
+    ]
+}
+
+
+@pytest.fixture
+def sgcn(tmp_path):
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.raw_data_path = ""
+    sgcn.columnar_cache_path = str(tmp_path / "columnar")
+    os.makedirs(sgcn.columnar_cache_path)
+    return sgcn
+
+
+@pytest.fixture
+def item(tmp_path):
+    source_file = tmp_path / "source.txt"
+    with open(source_file, "w") as f:
+        f.write("scientific name\tcommon name\ttaxonomic category\n")
+        for i in range(25):
+            f.write(f"Oculina robusta {i}\tIvory tree coral\tInvertebrates/Cnidarians\n")
+
+    return {
+        "sciencebase_item_id": "5e3c9d4ae4b0edb47be0ef7d",
+        "source_file_url": str(source_file),
+        "source_file_date": "2020-02-07T00:00:00Z",
+        "state": "Florida",
+        "year": "2015",
+    }
+
+
+def test_cached_frames_get_this_runs_record_processed(sgcn, item):
+    metadata_index = sgcn.build_metadata_index(METADATA)
+
+    first = list(sgcn.iter_source_frames(item, metadata_index, chunksize=10))
+    assert os.listdir(sgcn.columnar_cache_path)
+
+    second = list(sgcn.iter_source_frames(item, metadata_index, chunksize=10))
+    assert [len(df) for df in second] == [10, 10, 5]
+
+    first_processed = set(value for chunk in first for value in chunk["record_processed"])
+    second_processed = set(value for chunk in second for value in chunk["record_processed"])
+    assert len(first_processed) == len(second_processed) == 1
+    assert first_processed != second_processed
+
+    whole = sgcn.process_sgcn_source_item(item, output_type="dataframe", metadata_cache=metadata_index)
+    assert set(whole["record_processed"]) not in (first_processed, second_processed)
+    assert whole.drop(columns="record_processed").equals(
+        sgcn.process_sgcn_source_item(item, output_type="dataframe", metadata_cache=metadata_index)
+        .drop(columns="record_processed")
+    )
+
+
+def test_pipeline_columnar_cache_defaults_under_download_uri(tmp_path, monkeypatch):
+    monkeypatch.delenv("SGCN_COLUMNAR_CACHE", raising=False)
+    sgcn = pysgcn.Sgcn(operation_mode="pipeline", cache_root=str(tmp_path), cache_manager=dict())
+
+    assert sgcn.columnar_cache_path == os.path.join(str(tmp_path), "sgcn_columnar")
+    assert os.path.isdir(sgcn.columnar_cache_path)
@@ -0,0 +1,27 @@
+import hashlib
+
+from pysgcn.dedup import BloomFilter, Deduplicator
+
+
+def digest(i):
+    return hashlib.sha1(str(i).encode("utf-8")).hexdigest()
+
+
+def test_deduplicator_counts_unique_and_duplicate_hashes():
+    dedup = Deduplicator()
+    assert [dedup.add(h) for h in [digest(1), digest(2), digest(1), digest(1)]] == [True, True, False, False]
+    assert (dedup.unique, dedup.duplicates) == (2, 2)
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(digest(i))
+
+    assert all(digest(i) in bloom for i in range(1000))
+    false_positives = sum(digest(i) in bloom for i in range(1000, 11000))
+    assert false_positives < 300
+
+    dedup = Deduplicator(bloom_capacity=1000)
+    assert isinstance(dedup.seen, BloomFilter)
+    assert dedup.add(digest(1)) and not dedup.add(digest(1))
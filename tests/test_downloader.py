@@ -0,0 +1,62 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pysgcn.downloader import Downloader
+
+
+class SlowFileHandler(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(8 * 1024))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+
+        with SlowFileHandler.lock:
+            SlowFileHandler.active += 1
+            SlowFileHandler.peak = max(SlowFileHandler.peak, SlowFileHandler.active)
+        # The body trickles out after the headers, so the transfer outlasts the request
+        for i in range(8):
+            time.sleep(0.02)
+            self.wfile.write(b"x" * 1024)
+            self.wfile.flush()
+        with SlowFileHandler.lock:
+            SlowFileHandler.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    SlowFileHandler.active = 0
+    SlowFileHandler.peak = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowFileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_host_limit_covers_body_transfers(file_server, tmp_path):
+    downloader = Downloader(max_workers=8, per_host_limit=2)
+    jobs = [
+        {"url": f"{file_server}/file{i}", "file_path": str(tmp_path / f"file{i}"), "source_file_date": "2020"}
+        for i in range(8)
+    ]
+
+    results = downloader.download_many(jobs)
+
+    assert [status for job, status, exception in results] == ["written"] * 8
+    assert SlowFileHandler.peak <= 2
+    assert (tmp_path / "file0").stat().st_size == 8 * 1024
+
+    # The upload date matches the sidecar, so nothing is fetched again
+    assert [status for job, status, exception in downloader.download_many(jobs)] == ["in_cache"] * 8
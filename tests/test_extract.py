@@ -0,0 +1,47 @@
+import pickle
+
+from pysgcn import sgcn as pysgcn
+
+METADATA = {
+    "Historic 2005 SWAP National List": [{"scientific_name": "Oculina robusta 1"}],
+    "SGCN ITIS Overrides": []
+}
+
+
+def source_item(tmp_path, state, rows):
+    source_file = tmp_path / f"{state}.txt"
+    with open(source_file, "w") as f:
+        # A file without any of the expected columns can't be harmonized
+        f.write("scientific name\tcommon name\ttaxonomic category\n" if rows else "unexpected\n")
+        for i in range(rows):
+            f.write(f"Oculina robusta {i}\tIvory tree coral\tInvertebrates/Cnidarians\n")
+
+    return {
+        "sciencebase_item_id": state,
+        "source_file_url": str(source_file),
+        "source_file_date": "2020-02-07T00:00:00Z",
+        "state": state,
+        "year": "2015",
+    }
+
+
+def test_extract_source_items_keeps_item_order_and_returns_errors(tmp_path, monkeypatch):
+    monkeypatch.setenv("SGCN_COLUMNAR_CACHE", str(tmp_path / "columnar"))
+    sgcn = pysgcn.Sgcn(operation_mode="pipeline", cache_root=str(tmp_path), cache_manager=dict())
+
+    # Workers get their own ScienceBase session and no cache manager
+    copy = pickle.loads(pickle.dumps(sgcn))
+    assert copy.cache_manager is None and copy.sb is pysgcn.get_sb_session()
+
+    items = [
+        source_item(tmp_path, "Florida", 3),
+        source_item(tmp_path, "Broken", 0),
+        source_item(tmp_path, "Georgia", 2),
+    ]
+    results = list(sgcn.extract_source_items(items, metadata_cache=METADATA, max_workers=2))
+
+    assert [item["state"] for item, df, error in results] == ["Florida", "Broken", "Georgia"]
+    assert [len(df) if df is not None else None for item, df, error in results] == [3, None, 2]
+    assert results[0][2] is None and results[1][2]
+    assert list(results[0][1]["historic_list"]) == [False, True, False]
+    assert set(results[2][1]["state"]) == {"Georgia"}
@@ -0,0 +1,164 @@
+import io
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from pysgcn import sgcn as pysgcn
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "pipeline_data", "response_13.json")
+
+RECORD_PROCESSED = "2020-09-10T04:53:12.009168"
+
+METADATA = {
+    "Historic 2005 SWAP National List": [
+        {"scientific_name": "Oculina robusta"},
+        {"scientific_name": "Carcharias taurus"},
+        {"scientific_name": "12345"},
+    ],
+    "SGCN ITIS Overrides": [
+        {"ScientificName_original": "Chrysoma pauciflosculosa", "taxonomicAuthorityID": "http://itis.gov/tsn:37047"},
+        {"ScientificName_original": "Chrysoma pauciflosculosa", "taxonomicAuthorityID": "http://itis.gov/tsn:1"},
+        {"ScientificName_original": "Oculina robusta", "taxonomicAuthorityID": "http://itis.gov/tsn:53396"},
+    ]
+}
+
+
+def apply_rows(df_src, function):
+    # Stands in for df_src.apply(function, axis=1) on the pandas versions the row-wise code ran on. Rows are plain
+    # record dictionaries because newer pandas turns None into NaN when it builds mixed type rows.
+    return pd.Series([function(row) for row in df_src.to_dict("records")], index=df_src.index, dtype=object)
+
+
+def row_wise_harmonize(sgcn, df_src, item, metadata_cache, record_processed):
+    '''
+    The row-wise harmonization process_sgcn_source_item used before it was vectorized, kept as the reference.
+    '''
+    common_utils = pysgcn.get_pysppin_helper("common_utils")
+
+    def check_historic_list(scientific_name):
+        return len([
+            spec for spec in metadata_cache["Historic 2005 SWAP National List"]
+            if spec["scientific_name"] == scientific_name
+        ]) > 0
+
+    def check_itis_override(scientific_name):
+        records = [
+            spec for spec in metadata_cache["SGCN ITIS Overrides"]
+            if spec["ScientificName_original"] == scientific_name
+        ]
+        if len(records):
+            return records[0]["taxonomicAuthorityID"]
+        return None
+
+    df_src.columns = map(str.lower, df_src.columns)
+    df_src["sciencebase_item_id"] = item["sciencebase_item_id"]
+    df_src["record_processed"] = record_processed
+    df_src["source_file_date"] = item["source_file_date"]
+    df_src["source_file_url"] = item["source_file_url"]
+    if "state" not in df_src.columns:
+        df_src["state"] = item["state"]
+    if "year" not in df_src.columns:
+        df_src["year"] = item["year"]
+    if "2005 swap" in df_src.columns:
+        df_src.drop("2005 swap", axis=1, inplace=True)
+    if "taxonomy group" in df_src.columns:
+        df_src.rename(columns={"taxonomy group": "taxonomic category"}, inplace=True)
+    if "taxonomy group (use drop down box)" in df_src.columns:
+        df_src.rename(columns={"taxonomy group (use drop down box)": "taxonomic category"}, inplace=True)
+
+    df_src["common name"] = apply_rows(df_src, lambda x: "" if isinstance(x["common name"], float) else x["common name"])
+    df_src["taxonomic category"] = apply_rows(df_src, lambda x: "" if isinstance(x["taxonomic category"], float) else x["taxonomic category"])
+    df_src["clean_scientific_name"] = apply_rows(df_src, lambda x: common_utils.clean_scientific_name(x["scientific name"]))
+    df_src["historic_list"] = apply_rows(df_src, lambda x: check_historic_list(x["scientific name"]))
+    df_src["itis_override_id"] = apply_rows(df_src, lambda x: check_itis_override(x["scientific name"]))
+    df_src["sppin_key"] = apply_rows(df_src, lambda x: sgcn.build_sppin_key(x["clean_scientific_name"], x["itis_override_id"]))
+
+    return df_src
+
+
+@pytest.fixture
+def sgcn():
+    # Harmonization needs no ScienceBase connection
+    return pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+
+
+@pytest.fixture
+def item():
+    return {
+        "sciencebase_item_id": "https://www.sciencebase.gov/catalog/item/56d72436e4b015c306f457eb",
+        "state": "South Carolina",
+        "year": "2015",
+        "source_file_date": "2017-06-23T00:00:12.000Z",
+        "source_file_url": "https://www.sciencebase.gov/catalog/file/get/56d72436e4b015c306f457eb?f=__disk__79"
+    }
+
+
+def source_file():
+    '''
+    Tab delimited source file built from the records in the pipeline_data fixture, with missing names, common names
+    and categories, numeric names, names with ITIS overrides and historic list names mixed in.
+    '''
+    with open(FIXTURE) as f:
+        records = [r["data"] for r in json.load(f)["data"]][:400]
+
+    lines = ["Scientific Name\tCommon Name\tTaxonomy Group\t2005 SWAP"]
+    for i, record in enumerate(records):
+        common_name = "" if i % 7 == 0 else record["common name"]
+        category = "" if i % 11 == 0 else record["taxonomic category"]
+        lines.append(f'{record["scientific name"]}\t{common_name}\t{category}\tY')
+    lines.extend([
+        "\tNo scientific name\tBirds\tN",
+        "12345\tNumbered\tFish\tN",
+        "3.5\tDecimal\tFish\t",
+        "Chrysoma pauciflosculosa\tWoody Goldenrod\tPlants\tY",
+        "Oculina robusta spp.\t\t\tN",
+    ])
+
+    return "\n".join(lines) + "\n"
+
+
+def harmonize_both(sgcn, item, df_src):
+    expected = row_wise_harmonize(sgcn, df_src.copy(), item, METADATA, RECORD_PROCESSED)
+    actual = sgcn.harmonize_source_frame(
+        df_src.copy(), item, sgcn.build_metadata_index(METADATA), RECORD_PROCESSED
+    )
+    return expected, actual
+
+
+def test_harmonized_source_file_matches_row_wise_output(sgcn, item):
+    df_src = pd.read_csv(io.StringIO(source_file()), delimiter="\t")
+
+    expected, actual = harmonize_both(sgcn, item, df_src)
+
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert actual["itis_override_id"].notna().sum() == 3
+    assert actual["historic_list"].sum() > 0
+
+
+def test_missing_and_numeric_names_match_row_wise_output(sgcn, item):
+    df_src = pd.DataFrame({
+        "Scientific Name": [float("nan"), 12345, 3.5, "12345", None, "Oculina robusta", 12345, float("nan")],
+        "Common Name": ["a", float("nan"), "c", "d", "e", float("nan"), "g", "h"],
+        "Taxonomic Category": [float("nan"), "Fish", "Fish", "Fish", "Birds", "Other", "Fish", float("nan")],
+        "State": ["Florida"] * 8,
+    })
+
+    expected, actual = harmonize_both(sgcn, item, df_src)
+
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert actual["state"].tolist() == ["Florida"] * 8
+
+
+def test_file_without_overrides_matches_row_wise_output(sgcn, item):
+    df_src = pd.DataFrame({
+        "Scientific Name": ["Noturus gilberti", "Noturus gilberti", "Alasmidonta wrightiana"],
+        "Common Name": ["Orangefin Madtom", "Orangefin Madtom", float("nan")],
+        "Taxonomy Group (use drop down box)": ["Fish", "Fish", "Mollusks"],
+    })
+
+    expected, actual = harmonize_both(sgcn, item, df_src)
+
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert actual["itis_override_id"].isna().all()
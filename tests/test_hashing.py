@@ -0,0 +1,38 @@
+import hashlib
+import json
+
+import pandas as pd
+
+from pysgcn import hashing
+
+RECORD = {
+    "scientific name": "Oculina robusta",
+    "common name": "Ivory tree coral",
+    "taxonomic category": "Invertebrates/Cnidarians",
+    "state": "Florida",
+    "year": "2015",
+    "record_processed": "2020-02-07T00:00:00",
+}
+
+
+def test_legacy_is_the_default_and_matches_the_original_formula():
+    assert hashing.RECORD_ID_MODE == hashing.LEGACY
+    assert hashing.record_id(RECORD) == hashlib.sha1(
+        repr(json.dumps(RECORD, sort_keys=True)).encode('utf-8')
+    ).hexdigest()
+    assert hashing.legacy_record_id({"scientific name": "Oculina robusta", "state": "Florida", "year": "2015"}) == \
+        "8cf34b4261df37e0aab0636350efb353338d5207"
+    assert hashing.record_ids(pd.DataFrame([RECORD])) == [hashing.record_id(RECORD)]
+
+
+def test_canonical_ids_are_stable_across_field_order_and_reruns():
+    reordered = dict(reversed(list(RECORD.items())))
+    rerun = {**RECORD, "record_processed": "2021-01-01T00:00:00"}
+
+    ids = {hashing.record_id(r, mode=hashing.CANONICAL) for r in (RECORD, reordered, rerun)}
+    assert len(ids) == 1
+    assert hashing.record_id({**RECORD, "year": "2005"}, mode=hashing.CANONICAL) not in ids
+
+    df = pd.DataFrame([RECORD, reordered, rerun])
+    assert set(hashing.record_ids(df, mode=hashing.CANONICAL)) == ids
+    assert set(hashing.record_ids(df[list(reversed(df.columns))], mode=hashing.CANONICAL)) == ids
@@ -0,0 +1,136 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from pysgcn.itis_batch import ItisBatchResolver
+from pysgcn.lookup import LookupPlanner
+
+HIERARCHY = "$Plantae$Kingdom:Plantae$Class:Magnoliopsida$Species:{}$"
+
+DOCS = [
+    {
+        "tsn": "37047", "nameWInd": "Chrysoma pauciflosculosa", "nameWOInd": "Chrysoma pauciflosculosa",
+        "usage": "accepted", "rank": "Species", "acceptedTSN": [],
+        "hierarchySoFarWRanks": [HIERARCHY.format("Chrysoma pauciflosculosa")],
+        "vernacular": ["$woody goldenrod$English$N$152846$2011-01-18 00:00:00$"]
+    },
+    # A name with a valid record and an invalid homonym
+    {
+        "tsn": "159888", "nameWInd": "Carcharias taurus Rafinesque, 1810", "nameWOInd": "Carcharias taurus",
+        "usage": "valid", "rank": "Species", "acceptedTSN": [],
+        "hierarchySoFarWRanks": ["$Animalia$Kingdom:Animalia$Class:Chondrichthyes$Species:Carcharias taurus$"],
+        "vernacular": ["$sand tiger$English$N$1$2011-01-18 00:00:00$", "$requin taureau$French$N$2$$"]
+    },
+    {
+        "tsn": "159889", "nameWInd": "Carcharias taurus Garman", "nameWOInd": "Carcharias taurus",
+        "usage": "invalid", "rank": "Species", "acceptedTSN": ["159888"],
+        "hierarchySoFarWRanks": ["$Animalia$Kingdom:Animalia$Species:Carcharias taurus$"]
+    },
+    # An invalid name followed to its accepted TSN
+    {
+        "tsn": "500", "nameWInd": "Oldus namus", "nameWOInd": "Oldus namus", "usage": "invalid", "rank": "Species",
+        "acceptedTSN": ["501"], "hierarchySoFarWRanks": [HIERARCHY.format("Oldus namus")]
+    },
+    {
+        "tsn": "501", "nameWInd": "Newus namus", "nameWOInd": "Newus namus", "usage": "accepted", "rank": "Species",
+        "acceptedTSN": [], "hierarchySoFarWRanks": [HIERARCHY.format("Newus namus")]
+    },
+]
+
+
+class SolrHandler(BaseHTTPRequestHandler):
+    requests = list()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)["q"][0]
+        SolrHandler.requests.append(query)
+
+        docs = list()
+        for field, value in re.findall(r'(nameWOInd|tsn):("(?:[^"\\]|\\.)*"|\S+)', query):
+            value = value.strip('"')
+            docs.extend(doc for doc in DOCS if str(doc[field]) == value and doc not in docs)
+
+        body = json.dumps({"response": {"numFound": len(docs), "docs": docs}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def solr_url():
+    server = HTTPServer(("127.0.0.1", 0), SolrHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def resolver(solr_url):
+    SolrHandler.requests = list()
+    return ItisBatchResolver(base_url=solr_url, chunk_size=2)
+
+
+def test_exact_match_summary_matches_pysppin(resolver):
+    result = resolver.resolve(["Scientific Name:Chrysoma pauciflosculosa"])["Scientific Name:Chrysoma pauciflosculosa"]
+
+    assert result["processing_metadata"]["status"] == "success"
+    assert result["summary"] == {
+        "scientificname": "Chrysoma pauciflosculosa",
+        "taxonomicrank": "Species",
+        "taxonomic_authority_url":
+            "https://www.itis.gov/servlet/SingleRpt/SingleRpt?search_topic=TSN&search_value=37047",
+        "match_method": "Exact Match",
+        "commonname": "woody goldenrod"
+    }
+    assert {"rank": "Class", "name": "Magnoliopsida"} in result["data"][0]["biological_taxonomy"]
+
+
+def test_several_documents_are_found_multiple_matches(resolver):
+    result = resolver.resolve(["Scientific Name:Carcharias taurus"])["Scientific Name:Carcharias taurus"]
+
+    assert len(result["data"]) == 2
+    assert result["summary"]["match_method"] == "Found multiple matches"
+    assert result["summary"]["taxonomic_authority_url"].endswith("search_value=159888")
+    assert result["summary"]["commonname"] == "sand tiger"
+
+
+def test_invalid_name_follows_accepted_tsn(resolver):
+    result = resolver.resolve(["Scientific Name:Oldus namus"])["Scientific Name:Oldus namus"]
+
+    assert result["summary"]["match_method"] == "Followed Accepted TSN"
+    assert result["summary"]["scientificname"] == "Newus namus"
+    # No English vernacular is still reported, as None
+    assert result["summary"]["commonname"] is None
+    assert SolrHandler.requests[-1] == "tsn:501"
+
+
+def test_keys_are_batched_and_unmatched_keys_left_out(resolver):
+    results = resolver.resolve([
+        "Scientific Name:Chrysoma pauciflosculosa",
+        "TSN:159888",
+        "Scientific Name:Not a name",
+        "Scientific Name:Chrysoma pauciflosculosa"
+    ])
+
+    assert set(results) == {"Scientific Name:Chrysoma pauciflosculosa", "TSN:159888"}
+    assert results["TSN:159888"]["summary"]["match_method"] == "Exact Match"
+    # Three distinct keys in chunks of two
+    assert len(SolrHandler.requests) == 2
+    assert SolrHandler.requests[0] == 'nameWOInd:"Chrysoma pauciflosculosa" OR tsn:159888'
+
+
+def test_planner_does_not_batch_itis_by_default(monkeypatch):
+    monkeypatch.setattr("pysgcn.lookup.BATCH_ITIS", False)
+    assert LookupPlanner(sgcn=None).batch_itis is False
+    assert LookupPlanner(sgcn=None, batch_itis=True).batch_itis is True
@@ -0,0 +1,24 @@
+import builtins
+import sys
+
+import pytest
+
+from pysgcn.lazy import lazy_import
+
+
+def test_module_code_runs_on_first_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / "sgcn_lazy_example.py").write_text("import builtins\nbuiltins.sgcn_lazy_loads += 1\nVALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr("builtins.sgcn_lazy_loads", 0, raising=False)
+    monkeypatch.delitem(sys.modules, "sgcn_lazy_example", raising=False)
+
+    module = lazy_import("sgcn_lazy_example")
+    assert builtins.sgcn_lazy_loads == 0
+    assert lazy_import("sgcn_lazy_example") is module
+
+    assert module.VALUE == 42
+    assert module.VALUE == 42
+    assert builtins.sgcn_lazy_loads == 1
+
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import("sgcn_lazy_example_missing")
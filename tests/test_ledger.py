@@ -0,0 +1,62 @@
+from pysgcn import bis_pipeline
+from pysgcn import sgcn as pysgcn
+from pysgcn.ledger import ProcessingLedger
+
+ITEM = {
+    "sciencebase_item_id": "5e3c9d4ae4b0edb47be0ef7d",
+    "source_file_url": "https://www.sciencebase.gov/source.txt",
+    "source_file_date": "2020-02-07T00:00:00Z",
+    "state": "Florida",
+    "year": "2015",
+}
+
+
+class CacheManager:
+    def __init__(self):
+        self.cache = dict()
+
+    def get_from_cache(self, key):
+        return self.cache.get(key)
+
+    def add_to_cache(self, key, value):
+        self.cache.setdefault(key, value)
+
+
+def sgcn_for(cache_manager):
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.cache_manager = cache_manager
+    return sgcn
+
+
+def test_unchanged_files_are_carried_forward():
+    cache_manager = CacheManager()
+    sgcn = sgcn_for(cache_manager)
+    ledger = ProcessingLedger(cache_manager, "meta-1", "taxo-1")
+    sent = list()
+
+    assert not bis_pipeline.carry_forward(sgcn, ledger, ITEM, sent.append)
+
+    records = [{"row_id": row_id, "data": {"id": row_id}} for row_id in ["a", "b"]]
+    ledger.record_entry(ITEM, ["a", "b"])
+    # A run that stopped before stage 3 finished leaves records missing, so the file is processed again
+    ledger.store_record(records[0])
+    assert not bis_pipeline.carry_forward(sgcn, ledger, ITEM, sent.append)
+    ledger.store_record(records[1])
+
+    assert bis_pipeline.carry_forward(sgcn, ledger, ITEM, sent.append)
+    assert sent == records
+
+
+def test_changed_files_and_metadata_are_processed_again(monkeypatch):
+    cache_manager = CacheManager()
+    sgcn = sgcn_for(cache_manager)
+    ledger = ProcessingLedger(cache_manager, "meta-1", "taxo-1")
+    ledger.record_entry(ITEM, [])
+
+    assert sgcn.check_source_url(ITEM["source_file_url"], ITEM["source_file_date"], ledger)["state"] == "Florida"
+    assert sgcn.check_source_url(ITEM["source_file_url"], "2021-01-01T00:00:00Z", ledger) is None
+    for other in [ProcessingLedger(cache_manager, "meta-2", "taxo-1"), ProcessingLedger(cache_manager, "meta-1")]:
+        assert sgcn.check_source_url(ITEM["source_file_url"], ITEM["source_file_date"], other) is None
+
+    monkeypatch.setattr(pysgcn, "FULL_REBUILD", True)
+    assert sgcn.check_source_url(ITEM["source_file_url"], ITEM["source_file_date"], ledger) is None
@@ -0,0 +1,37 @@
+import os
+
+from pysgcn.local_executor import LocalPipelineExecutor
+
+
+def stage_1(path, ch_ledger, send_final_result, send_to_stage, previous_stage_result, cache_manager):
+    for i in range(previous_stage_result):
+        send_to_stage({"n": i}, 2)
+
+
+def stage_2(path, ch_ledger, send_final_result, send_to_stage, previous_stage_result, cache_manager):
+    send_final_result(previous_stage_result)
+
+
+def prepare_2(message):
+    if message["n"] == 3:
+        raise ValueError("unreadable")
+    return {**message, "pid": os.getpid()}
+
+
+def test_prepare_runs_in_worker_processes():
+    results = list()
+    executor = LocalPipelineExecutor(
+        stages={1: stage_1, 2: stage_2},
+        path=None,
+        ch_ledger=None,
+        cache_manager=None,
+        send_final_result=results.append,
+        prepare={2: prepare_2},
+        processes=2
+    )
+    executor.run(6)
+
+    assert sorted(r["n"] for r in results) == list(range(6))
+    assert all(r["pid"] != os.getpid() for r in results if r["n"] != 3)
+    # A failed prepare still sends the original message through the stage
+    assert [r for r in results if r["n"] == 3] == [{"n": 3}]
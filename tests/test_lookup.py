@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pandas as pd
+
+from pysgcn import sgcn as pysgcn
+from pysgcn.lookup import LookupPlanner, TaxonomicLookupEngine, TokenBucket
+
+
+def test_engine_keeps_order_bounds_concurrency_and_returns_errors():
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def lookup(message):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        if message == 3:
+            raise ValueError("lookup failed")
+        return message * 2
+
+    results = TaxonomicLookupEngine(None, max_concurrency=2, lookup=lookup).gather(list(range(8)))
+
+    assert [r for i, r in enumerate(results) if i != 3] == [0, 2, 4, 8, 10, 12, 14]
+    assert isinstance(results[3], ValueError)
+    assert in_flight[1] == 2
+    assert TaxonomicLookupEngine(None, lookup=lookup).gather([]) == []
+
+
+def test_planner_looks_each_sppin_key_up_once():
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    looked_up = list()
+
+    def lookup_taxa_summary(message):
+        looked_up.append(message["sppin_key"])
+        if message["sppin_key"] == "Scientific Name:Broken":
+            raise ValueError("lookup failed")
+        return {"scientificname": message["sppin_key"].split(":")[1]}, None
+
+    sgcn.lookup_taxa_summary = lookup_taxa_summary
+
+    planner = LookupPlanner(sgcn, max_concurrency=4, batch_itis=False)
+    planner.add([
+        {"sppin_key": "Scientific Name:A", "common name": "first"},
+        {"sppin_key": "Scientific Name:Broken", "common name": "broken"},
+    ])
+    planner.add_dataframe(pd.DataFrame([
+        {"sppin_key": "Scientific Name:A", "common name": "second"},
+        {"sppin_key": "Scientific Name:B", "common name": "third"},
+        {"sppin_key": "Scientific Name:B", "common name": "fourth"},
+    ]))
+
+    assert planner.record_count == 5
+    assert planner.resolve() == 2
+    assert sorted(looked_up) == ["Scientific Name:A", "Scientific Name:B", "Scientific Name:Broken"]
+    # Only the key whose lookup failed is tried again
+    assert planner.resolve() == 0
+    assert looked_up.count("Scientific Name:A") == 1
+    assert looked_up.count("Scientific Name:Broken") == 2
+
+    summary, name_queue = planner.summary_for({"sppin_key": "Scientific Name:B", "common name": "fourth"})
+    assert summary == {"scientificname": "B", "commonname": "fourth"}
+    assert planner.get("Scientific Name:A") == ({"scientificname": "A"}, None)
+    assert planner.summary_for({"sppin_key": "Scientific Name:Broken"}) is None
+
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for i in range(6):
+        bucket.acquire()
+
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,90 @@
+import pytest
+
+from pysgcn import sgcn as pysgcn
+
+FILES = [
+    {
+        "title": "Historic 2005 SWAP National List",
+        "url": "https://www.sciencebase.gov/historic.txt",
+        "dateUploaded": "2020-01-01T00:00:00Z",
+        "contentType": "text/plain"
+    },
+    {
+        "title": "SGCN ITIS Overrides",
+        "url": "https://www.sciencebase.gov/overrides.json",
+        "dateUploaded": "2020-01-01T00:00:00Z",
+        "contentType": "application/json"
+    },
+]
+
+
+class Response:
+    def __init__(self, url):
+        self.text = "Oculina robusta\nTyphlatya monae"
+        self.url = url
+
+    def json(self):
+        return [
+            {"ScientificName_original": "Oculina robusta", "taxonomicAuthorityID": "http://itis.gov/tsn:1"},
+            {"ScientificName_original": "Oculina robusta", "taxonomicAuthorityID": "http://itis.gov/tsn:2"},
+        ]
+
+
+@pytest.fixture
+def sgcn(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysgcn, "_metadata_file_cache", dict())
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.operation_mode = "pipeline"
+    sgcn.sgcn_root_item = "root"
+    sgcn.metadata_files_path = str(tmp_path)
+    sgcn.get_sb_item_with_retry = lambda item_id: {"files": FILES}
+    sgcn.downloads = list()
+
+    def get_file_with_retry(url):
+        sgcn.downloads.append(url)
+        return Response(url)
+
+    sgcn.get_file_with_retry = get_file_with_retry
+    return sgcn
+
+
+def test_metadata_files_are_downloaded_once_per_upload_date(sgcn, monkeypatch):
+    metadata = sgcn.cache_sgcn_metadata(return_data=True)
+    assert metadata["Historic 2005 SWAP National List"] == [
+        {"scientific_name": "Oculina robusta"}, {"scientific_name": "Typhlatya monae"}
+    ]
+    assert len(sgcn.downloads) == 2
+
+    # Read back from the file cache by a new process
+    monkeypatch.setattr(pysgcn, "_metadata_file_cache", dict())
+    assert sgcn.cache_sgcn_metadata(return_data=True) == metadata
+    assert len(sgcn.downloads) == 2
+
+    updated_files = [{**FILES[0], "dateUploaded": "2021-01-01T00:00:00Z"}, FILES[1]]
+    sgcn.get_sb_item_with_retry = lambda item_id: {"files": updated_files}
+    sgcn.cache_sgcn_metadata(return_data=True)
+    assert sgcn.downloads[2:] == [FILES[0]["url"]]
+
+
+def test_pipeline_mode_skips_sqlite_and_returns_copies(sgcn):
+    assert sgcn.cache_sgcn_metadata() == [f["title"] for f in FILES]
+
+    metadata = sgcn.cache_sgcn_metadata(return_data=True)
+    metadata["Historic 2005 SWAP National List"][0]["scientific_name"] = "changed"
+    metadata["Historic 2005 SWAP National List"].clear()
+
+    assert sgcn.get_metadata_file(FILES[0])[0] == {"scientific_name": "Oculina robusta"}
+
+
+def test_metadata_index(sgcn):
+    metadata = sgcn.cache_sgcn_metadata(return_data=True)
+    index = sgcn.build_metadata_index(metadata)
+
+    assert sgcn.build_metadata_index(index) is index
+    assert sgcn.build_metadata_index(metadata) is index
+    assert index.is_historic("Typhlatya monae")
+    assert not index.is_historic("Bog turtle")
+    # The first override listed for a name wins
+    assert index.itis_override("Oculina robusta") == "http://itis.gov/tsn:1"
+    assert index.itis_override("Typhlatya monae") is None
+    assert pysgcn.MetadataIndex(metadata).version == index.version
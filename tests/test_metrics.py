@@ -0,0 +1,28 @@
+import io
+import json
+
+from pysgcn.metrics import JsonLinesSink, Metrics, NullSink, sink_from_env
+
+
+def test_events_are_discarded_unless_a_sink_is_configured(monkeypatch, tmp_path):
+    monkeypatch.delenv("SGCN_METRICS_SINK", raising=False)
+    assert isinstance(sink_from_env(), NullSink)
+    assert isinstance(sink_from_env("stdout"), JsonLinesSink)
+    assert sink_from_env(str(tmp_path / "metrics.jsonl")).path == str(tmp_path / "metrics.jsonl")
+
+
+def test_counters_and_totals():
+    stream = io.StringIO()
+    metrics = Metrics(sink=JsonLinesSink(stream=stream))
+    for category in ["Birds", "Birds", "Fish"]:
+        metrics.incr(f"stage_3.taxonomic_categories.{category}")
+    with metrics.timer("stage_3.seconds"):
+        pass
+
+    report = metrics.emit_totals(run_id="test")
+    assert report["counters"] == {"stage_3.taxonomic_categories.Birds": 2, "stage_3.taxonomic_categories.Fish": 1}
+    assert report["histograms"]["stage_3.seconds"]["count"] == 1
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["event"] == "run_totals"
@@ -0,0 +1,35 @@
+from pysgcn import sgcn as pysgcn
+
+
+def test_get_sgcn_shares_instances_and_rebinds_the_cache_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysgcn, "_sgcn_registry", dict())
+    first_manager, second_manager = dict(), dict()
+
+    first = pysgcn.get_sgcn(operation_mode="pipeline", cache_root=str(tmp_path / "a"), cache_manager=first_manager)
+    second = pysgcn.get_sgcn(operation_mode="pipeline", cache_root=str(tmp_path / "a"), cache_manager=second_manager)
+    other = pysgcn.get_sgcn(operation_mode="pipeline", cache_root=str(tmp_path / "b"), cache_manager=first_manager)
+
+    assert first is second
+    assert first.cache_manager is second_manager
+    assert other is not first
+    assert first.sb is other.sb is pysgcn.get_sb_session()
+
+
+def test_sciencebase_items_are_reused_until_the_ttl_expires(monkeypatch):
+    monkeypatch.setattr(pysgcn, "_sb_item_cache", dict())
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    fetched = list()
+
+    class Session:
+        def get_item(self, item_id):
+            fetched.append(item_id)
+            return {"id": item_id, "fetch": len(fetched)}
+
+    sgcn.sb = Session()
+
+    assert sgcn.get_sb_item_with_retry("root") == {"id": "root", "fetch": 1}
+    assert sgcn.get_sb_item_with_retry("root") == {"id": "root", "fetch": 1}
+
+    monkeypatch.setattr(pysgcn, "SB_ITEM_TTL", 0)
+    assert sgcn.get_sb_item_with_retry("root") == {"id": "root", "fetch": 2}
+    assert fetched == ["root", "root"]
@@ -0,0 +1,41 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from pysgcn.sppin_index import SppinIndex
+
+
+def test_backfill_finds_records_cached_before_the_index(tmp_path):
+    recent = datetime.utcnow().isoformat()
+    old = (datetime.utcnow() - timedelta(days=90)).isoformat()
+
+    sppin_db = sqlite3.connect(str(tmp_path / "sppin.db"))
+    sppin_db.execute("CREATE TABLE itis (sppin_key TEXT, processing_metadata_date_processed TEXT)")
+    sppin_db.executemany("INSERT INTO itis VALUES (?, ?)", [
+        ("Scientific Name:Recent", recent),
+        ("Scientific Name:Old", old),
+    ])
+    sppin_db.execute("CREATE TABLE worms (id TEXT, body TEXT)")
+    sppin_db.execute("INSERT INTO worms VALUES (?, ?)", (
+        "1", json.dumps({"sppin_key": "Scientific Name:Marine", "processing_metadata": {"date_processed": recent}})
+    ))
+    sppin_db.commit()
+    sppin_db.close()
+
+    index = SppinIndex(str(tmp_path / "sppin_index.db"))
+    assert index.backfill(str(tmp_path / "sppin.db"), ["itis", "worms", "gbif"]) == 3
+    # Only done once per collection
+    assert index.backfill(str(tmp_path / "sppin.db"), ["itis", "worms", "gbif"]) == 0
+
+    current = index.probe(
+        ["Scientific Name:Recent", "Scientific Name:Old", "Scientific Name:Marine", "Scientific Name:New"],
+        ["itis", "worms"]
+    )
+    assert current["Scientific Name:Recent"] == {"itis": recent, "worms": None}
+    assert current["Scientific Name:Old"] == {"itis": None, "worms": None}
+    assert current["Scientific Name:Marine"] == {"itis": None, "worms": recent}
+    assert current["Scientific Name:New"] == {"itis": None, "worms": None}
+
+    index.add("itis", "Scientific Name:New")
+    assert index.probe(["Scientific Name:New"], ["itis"])["Scientific Name:New"]["itis"] is not None
+    index.close()
@@ -0,0 +1,56 @@
+import pytest
+
+from pysgcn import sgcn as pysgcn
+
+METADATA = {
+    "Historic 2005 SWAP National List": [{"scientific_name": "Oculina robusta 3"}],
+    "SGCN ITIS Overrides": [
+        {"ScientificName_original": "Oculina robusta 4", "taxonomicAuthorityID": "http://itis.gov/tsn:53396"}
+    ]
+}
+
+
+@pytest.fixture
+def sgcn(tmp_path):
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.raw_data_path = ""
+    sgcn.columnar_cache_path = str(tmp_path / "columnar")
+    return sgcn
+
+
+@pytest.fixture
+def item(tmp_path):
+    source_file = tmp_path / "source.txt"
+    with open(source_file, "w") as f:
+        f.write("scientific name\tcommon name\ttaxonomic category\n")
+        for i in range(12):
+            f.write(f"Oculina robusta {i}\tIvory tree coral\tInvertebrates/Cnidarians\n")
+
+    return {
+        "sciencebase_item_id": "5e3c9d4ae4b0edb47be0ef7d",
+        "source_file_url": str(source_file),
+        "source_file_date": "2020-02-07T00:00:00Z",
+        "state": "Florida",
+        "year": "2015",
+    }
+
+
+def without_record_processed(records):
+    return [{k: v for k, v in record.items() if k != "record_processed"} for record in records]
+
+
+def test_streamed_chunks_match_the_whole_file(sgcn, item, monkeypatch):
+    monkeypatch.setattr(pysgcn, "SOURCE_CHUNK_SIZE", 5)
+    metadata_index = sgcn.build_metadata_index(METADATA)
+
+    chunks = list(sgcn.iter_source_frames(item, metadata_index))
+    assert [len(df) for df in chunks] == [5, 5, 2]
+    # Every chunk of a run is stamped with the same processing date
+    assert len(set(value for df in chunks for value in df["record_processed"])) == 1
+
+    whole = sgcn.process_sgcn_source_item(item, output_type="dict", metadata_cache=metadata_index)
+    streamed = list(sgcn.process_sgcn_source_item(item, output_type="iter", metadata_cache=metadata_index))
+    assert without_record_processed(streamed) == without_record_processed(whole)
+
+    assert [r["historic_list"] for r in streamed[2:5]] == [False, True, False]
+    assert streamed[4]["sppin_key"] == "TSN:53396"
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from pysgcn import sgcn as pysgcn
+
+ITIS_URL = "https://services.itis.gov/?q=tsn:53396"
+WORMS_URL = "http://www.marinespecies.org/rest/AphiaRecordByAphiaID/1"
+
+
+@pytest.fixture(params=[True, False], ids=["update_from", "prepared_update"])
+def sgcn(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(pysgcn, "SQLITE_UPDATE_FROM", request.param)
+    if request.param and sqlite3.sqlite_version_info < (3, 33, 0):
+        pytest.skip("UPDATE ... FROM needs SQLite 3.33")
+
+    connection = sqlite3.connect(str(tmp_path / "sgcn.db"))
+    connection.execute("CREATE TABLE sgcn (id TEXT, sppin_key TEXT, taxonomic_authority_url TEXT, rank TEXT)")
+    connection.executemany("INSERT INTO sgcn VALUES (?, ?, ?, ?)", [
+        ("1", "Scientific Name:Land", None, None),
+        ("2", "Scientific Name:Land", None, None),
+        ("3", "Scientific Name:Sea", None, None),
+        ("4", "Scientific Name:Sea", ITIS_URL, "Species"),
+        ("5", "Scientific Name:Untouched", None, "Genus"),
+    ])
+    connection.commit()
+    connection.close()
+
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.source_data_path = str(tmp_path)
+    return sgcn
+
+
+def records(sgcn):
+    connection = sqlite3.connect(f"{sgcn.source_data_path}/sgcn.db")
+    connection.row_factory = sqlite3.Row
+    try:
+        return {r["id"]: dict(r) for r in connection.execute("SELECT * FROM sgcn")}
+    finally:
+        connection.close()
+
+
+def test_bulk_update_joins_summaries_on_sppin_key(sgcn):
+    updated = sgcn.bulk_update_taxa_summary_data([
+        ("Scientific Name:Land", {"taxonomic_authority_url": ITIS_URL, "rank": "Species", "commonname": None}),
+        ("Scientific Name:Sea", {"taxonomic_authority_url": WORMS_URL, "rank": "Species", "commonname": "Coral"}),
+    ])
+
+    result = records(sgcn)
+    assert updated == 3
+    assert [result[i]["taxonomic_authority_url"] for i in "12345"] == [ITIS_URL, ITIS_URL, WORMS_URL, ITIS_URL, None]
+    assert [result[i]["commonname"] for i in "12345"] == [None, None, "Coral", None, None]
+    assert result["5"]["rank"] == "Genus"
+
+
+def test_bulk_update_keeps_values_missing_from_a_summary(sgcn):
+    assert sgcn.add_sgcn_columns(["rank", "commonname"]) == ["commonname"]
+    assert sgcn.add_sgcn_columns(["rank", "commonname"]) == []
+
+    sgcn.bulk_update_taxa_summary_data([
+        ("Scientific Name:Land", {"taxonomic_authority_url": ITIS_URL, "commonname": "Beetle"}),
+    ])
+    sgcn.bulk_update_taxa_summary_data([
+        ("Scientific Name:Land", {"taxonomic_authority_url": ITIS_URL, "rank": "Species"}),
+    ])
+
+    result = records(sgcn)
+    assert (result["1"]["rank"], result["1"]["commonname"]) == ("Species", "Beetle")
+    assert sgcn.bulk_update_taxa_summary_data([]) == 0
@@ -0,0 +1,40 @@
+import pytest
+
+from pysgcn import sgcn as pysgcn
+
+CLASS_LIST = [
+    {"taxoname": "Aves", "taxogroup": "Birds"},
+    {"taxoname": "Anthozoa", "taxogroup": "Invertebrates/Cnidarians"},
+    {"taxoname": "Aves", "taxogroup": "Not used"},
+]
+
+
+class CacheManager:
+    def __init__(self):
+        self.cache = dict()
+
+    def get_from_cache(self, key):
+        return self.cache.get(key)
+
+    def add_to_cache(self, key, value):
+        self.cache.setdefault(key, value)
+
+
+def test_published_taxogroupings_are_read_back_by_version(monkeypatch):
+    monkeypatch.setattr(pysgcn, "_taxogroupings_cache", dict())
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.cache_manager = CacheManager()
+
+    version = sgcn.publish_taxogroupings(CLASS_LIST)
+    assert version == sgcn.taxogroupings_version(CLASS_LIST)
+    assert version != sgcn.taxogroupings_version(CLASS_LIST[1:])
+
+    # A stage 3 process that didn't publish the mappings loads them from the cache_manager
+    monkeypatch.setattr(pysgcn, "_taxogroupings_cache", dict())
+    expected = {"Aves": "Birds", "Anthozoa": "Invertebrates/Cnidarians"}
+    assert sgcn.get_taxogroupings(version) == expected
+    # Messages queued before the mappings were published carry the list itself
+    assert sgcn.get_taxogroupings(None, CLASS_LIST) == expected
+
+    with pytest.raises(ValueError):
+        sgcn.get_taxogroupings(sgcn.taxogroupings_version(CLASS_LIST[1:]))
@@ -0,0 +1,90 @@
+import math
+
+import pytest
+
+from pysgcn import sgcn as pysgcn
+from pysgcn import tsv_engine
+from test_harmonize import METADATA, source_file
+
+EDGE_CASES = "\n".join([
+    "Scientific Name\tCommon Name\tTaxonomic Category\tState\tYear",
+    "Noturus gilberti\tOrangefin Madtom\tFish\tVirginia\t2015",
+    "Noturus gilberti\tOrangefin Madtom\tFish\tVirginia\t2015",
+    "NA\tnull\t\tVirginia\t2015",
+    "12345\t\tFish\tVirginia\t2015",
+    "3.5\tDecimal\tFish\tVirginia\t2015",
+    "Oculina robusta\tIvory tree coral\tInvertebrates/Cnidarians\tVirginia\t2015",
+]) + "\n"
+
+
+@pytest.fixture
+def sgcn(tmp_path):
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    sgcn.raw_data_path = ""
+    sgcn.columnar_cache_path = str(tmp_path / "columnar")
+    return sgcn
+
+
+def source_item(tmp_path, text):
+    source = tmp_path / "source.txt"
+    source.write_text(text, encoding="utf-8")
+    return {
+        "sciencebase_item_id": "https://www.sciencebase.gov/catalog/item/56d72436e4b015c306f457eb",
+        "state": "South Carolina",
+        "year": "2015",
+        "source_file_date": "2017-06-23T00:00:12.000Z",
+        "source_file_url": str(source),
+    }
+
+
+def normalized(records):
+    # NaN never equals itself, so missing values are compared as None
+    return [
+        {
+            k: None if isinstance(v, float) and math.isnan(v) else v
+            for k, v in record.items() if k != "record_processed"
+        }
+        for record in records
+    ]
+
+
+@pytest.mark.parametrize("text", [source_file(), EDGE_CASES], ids=["pipeline_data", "edge_cases"])
+def test_csv_engine_matches_pandas_engine(sgcn, tmp_path, text):
+    item = source_item(tmp_path, text)
+    metadata_index = sgcn.build_metadata_index(METADATA)
+
+    frames = list(sgcn.iter_source_frames(item, metadata_index, chunksize=100))
+    records = list(sgcn.iter_source_records(item, metadata_index, chunksize=100))
+
+    assert [len(chunk) for chunk in records] == [len(df) for df in frames]
+    expected = normalized(record for df in frames for record in df.to_dict("records"))
+    assert normalized(record for chunk in records for record in chunk) == expected
+
+
+@pytest.mark.parametrize("data, encoding", [
+    (b"\xef\xbb\xbfScientific Name\n", "utf-8-sig"),
+    ("Scientific Name\n".encode("utf-16"), "utf-16"),
+    ("Scientific Name\nPicoides borealis\tPic à face blanche\n".encode("utf-8"), "utf-8"),
+    ("Scientific Name\nPicoides borealis\tPic à face blanche\n".encode("latin1"), "latin1"),
+    # A latin1 character well past the sniffed prefix
+    (b"Scientific Name\n" + b"a" * 100 + "é\n".encode("latin1"), "latin1"),
+    # A UTF-8 character cut in two at the end of the prefix
+    (b"a" * 15 + "é".encode("utf-8"), "utf-8"),
+])
+def test_detect_encoding(data, encoding):
+    assert tsv_engine.detect_encoding(data, prefix_size=16) == encoding
+    assert tsv_engine.decode_source(data, encoding) == data.decode(encoding)
+
+
+def test_latin1_source_files_are_read_by_both_engines(sgcn, tmp_path):
+    item = source_item(tmp_path, "")
+    with open(item["source_file_url"], "wb") as f:
+        f.write(EDGE_CASES.replace("Madtom", "Madtom é").encode("latin1"))
+    metadata_index = sgcn.build_metadata_index(METADATA)
+    processing_metadata = dict()
+
+    frames = list(sgcn.iter_source_frames(item, metadata_index, 100, processing_metadata))
+    records = list(sgcn.iter_source_records(item, metadata_index, 100))
+
+    assert processing_metadata["encoding"] == "latin1"
+    assert frames[0]["common name"][0] == records[0][0]["common name"] == "Orangefin Madtom é"
@@ -0,0 +1,36 @@
+from pysgcn import sgcn as pysgcn
+
+RECORD = {
+    "scientific name": "Oculina robusta",
+    "common name": "Ivory tree coral",
+    "taxonomic category": "Invertebrates/Cnidarians",
+    "state": "Florida",
+    "sciencebase_item_id": "5e3c9d4ae4b0edb47be0ef7d",
+    "record_processed": "2020-02-07T00:00:00",
+    "source_file_date": "2020-02-07T00:00:00Z",
+    "source_file_url": "https://www.sciencebase.gov/file",
+    "year": "2015",
+    "clean_scientific_name": "Oculina robusta",
+    "historic_list": False,
+    "itis_override_id": None,
+    "sppin_key": "Scientific Name:Oculina robusta",
+}
+
+
+def test_validate_many_matches_record_by_record_validation():
+    sgcn = pysgcn.Sgcn.__new__(pysgcn.Sgcn)
+    records = [
+        RECORD,
+        {**RECORD, "itis_override_id": "http://itis.gov/tsn:53396"},
+        {**RECORD, "historic_list": "no"},
+        {k: v for k, v in RECORD.items() if k != "sppin_key"},
+        {**RECORD, "extra": "not allowed"},
+        {**RECORD, "scientific name": float("nan")},
+    ]
+
+    assert sgcn.validate_many(records) == [True, True, False, False, False, False]
+    assert sgcn.validate_many(records) == [sgcn.validate_data(r) for r in records]
+    assert sgcn.validate_many([]) == []
+    # The schema is loaded and compiled once per process
+    validator = pysgcn.get_record_validator("sgcn_source_records_schema")
+    assert pysgcn.get_record_validator("sgcn_source_records_schema") is validator
@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+import pytest
+
+from pysgcn.sgcn import Sgcn
+from pysgcn.work_queue import DEAD_LETTER_QUEUE, WorkQueue
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "work_queue.db"), max_attempts=2)
+    yield work_queue
+    work_queue.close()
+
+
+def test_lease_hides_messages_until_acked(work_queue):
+    work_queue.enqueue(["mq_a", "mq_b"], [{"n": 1}, {"n": 2}])
+
+    leased = work_queue.lease("mq_a", 10)
+    assert [m["body"] for m in leased] == [{"n": 1}, {"n": 2}]
+    assert work_queue.lease("mq_a", 10) == []
+    assert work_queue.count("mq_b") == 2
+
+    assert work_queue.ack("mq_a", [m["id"] for m in leased], leased[0]["lease_id"]) == 2
+    assert work_queue.count("mq_a") == 0
+
+
+def test_expired_lease_cannot_ack_or_nack(work_queue):
+    work_queue.enqueue("mq_a", {"n": 1})
+
+    expired = work_queue.lease("mq_a", 1, visibility_timeout=0)[0]
+    current = work_queue.lease("mq_a", 1)[0]
+    assert current["id"] == expired["id"]
+
+    assert work_queue.ack("mq_a", expired["id"], expired["lease_id"]) == 0
+    work_queue.nack("mq_a", expired["id"], lease_id=expired["lease_id"])
+    assert work_queue.lease("mq_a", 1) == []
+
+    assert work_queue.ack("mq_a", current["id"], current["lease_id"]) == 1
+
+
+def test_nacked_messages_are_dead_lettered_after_max_attempts(work_queue):
+    work_queue.enqueue("mq_a", {"n": 1})
+
+    for attempt in range(2):
+        message = work_queue.lease("mq_a", 1)[0]
+        assert message["attempts"] == attempt + 1
+        work_queue.nack("mq_a", message["id"], lease_id=message["lease_id"])
+
+    assert work_queue.lease("mq_a", 1) == []
+    assert work_queue.count("mq_a") == 0
+    dead = work_queue.lease(DEAD_LETTER_QUEUE, 1)[0]
+    assert dead["body"] == {"source_queue": "mq_a", "reason": "max_attempts", "body": {"n": 1}}
+
+
+def test_import_queues(work_queue, tmp_path):
+    legacy = sqlite3.connect(str(tmp_path / "mq.db"))
+    legacy.execute("CREATE TABLE mq_itis_check (id TEXT, date_inserted TEXT, body TEXT)")
+    legacy.executemany("INSERT INTO mq_itis_check VALUES (?, ?, ?)", [
+        ("b", "2020-01-02", json.dumps({"sppin_key": "Scientific Name:B"})),
+        ("a", "2020-01-01", json.dumps({"sppin_key": "Scientific Name:A"})),
+    ])
+    legacy.execute("CREATE TABLE other (body TEXT)")
+    legacy.commit()
+    legacy.close()
+
+    assert work_queue.import_queues(str(tmp_path / "mq.db")) == 2
+    assert work_queue.import_queues(str(tmp_path / "mq.db")) == 0
+    assert [m["body"]["sppin_key"] for m in work_queue.lease("mq_itis_check", 10)] == [
+        "Scientific Name:A", "Scientific Name:B"
+    ]
+    assert work_queue.count("other") == 0
+
+
+def test_drain_sppin_queue(work_queue):
+    sgcn = Sgcn.__new__(Sgcn)
+    sgcn.work_queue = work_queue
+    sgcn.sppin_collections = ["itis"]
+
+    names = ["cached", "probe_cached", "broken"]
+    work_queue.enqueue("mq_itis_check", [
+        {"source": {"type": "List of Scientific Names", "name_source": "test"}, "sppin_key": f"Scientific Name:{n}"}
+        for n in names
+    ])
+
+    def check_sppin_keys(sppin_keys, sppin_collections=None, max_age_days=30):
+        return {k: {"itis": {} if k.endswith("probe_cached") else None} for k in sppin_keys}
+
+    def check_sppin_key(message_body, sppin_collections=None):
+        sppin_key = message_body["sppin_key"]
+        if sppin_key.endswith("broken"):
+            raise ValueError("lookup failed")
+        return sppin_key, "Scientific Name", sppin_key.split(":")[1], {"itis": {}}
+
+    sgcn.check_sppin_keys = check_sppin_keys
+    sgcn.check_sppin_key = check_sppin_key
+
+    assert sgcn.drain_sppin_queue("mq_itis_check", "itis") == {"already_cached": 1, "processed": 1, "failed": 1}
+
+    # The failed message was released to be retried later rather than deleted
+    assert work_queue.count("mq_itis_check") == 1
+    assert work_queue.count("mq_itis_check", visible_only=True) == 0